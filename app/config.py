@@ -10,12 +10,101 @@ class Config:
     YANDEX_MUSIC_TOKEN: str = os.getenv("YANDEX_MUSIC_TOKEN", "").strip()
     DOWNLOAD_DIR: Path = Path(os.getenv("DOWNLOAD_DIR", "/tmp/media_downloads"))
     
-    # Telegram file size limit (50 MB for bots)
-    MAX_FILE_SIZE: int = 50 * 1024 * 1024
+    # Self-hosted Telegram Bot API server (https://github.com/tdlib/telegram-bot-api),
+    # e.g. http://localhost:8081. Empty = api.telegram.org
+    TELEGRAM_API_URL: str = os.getenv("TELEGRAM_API_URL", "").strip().rstrip("/")
+    # Server runs with --local and shares DOWNLOAD_DIR with the bot
+    TELEGRAM_API_LOCAL: bool = bool(TELEGRAM_API_URL) and os.getenv("TELEGRAM_API_LOCAL", "1") == "1"
+    
+    # Telegram file size limit (50 MB for bots, up to 2000 MB with a local Bot API server)
+    MAX_FILE_SIZE_LIMIT_MB: int = 2000 if TELEGRAM_API_LOCAL else 50
+    MAX_FILE_SIZE: int = min(
+        int(os.getenv("MAX_FILE_SIZE_MB", str(MAX_FILE_SIZE_LIMIT_MB))),
+        MAX_FILE_SIZE_LIMIT_MB
+    ) * 1024 * 1024
+    
+    # getFile download limit: 20 MB on the cloud Bot API, none beyond MAX_FILE_SIZE locally
+    TELEGRAM_DOWNLOAD_LIMIT: int = MAX_FILE_SIZE if TELEGRAM_API_LOCAL else 20 * 1024 * 1024
+    
+    # Most we fetch for audio that gets re-encoded to fit MAX_FILE_SIZE (long DJ sets)
+    MAX_SOURCE_SIZE: int = max(int(os.getenv("MAX_SOURCE_SIZE_MB", "500")) * 1024 * 1024, MAX_FILE_SIZE)
     
     # Owner for error notifications
     OWNER_ID: int = 1716175980
     
+    # Telegram send limits (messages per second / per minute for groups)
+    TG_GLOBAL_RATE: float = float(os.getenv("TG_GLOBAL_RATE", "30"))
+    TG_CHAT_RATE: float = float(os.getenv("TG_CHAT_RATE", "1"))
+    TG_CHAT_BURST: int = int(os.getenv("TG_CHAT_BURST", "3"))
+    TG_GROUP_RATE: int = int(os.getenv("TG_GROUP_RATE", "20"))
+    
+    # Upload pipeline
+    UPLOAD_CONCURRENCY: int = int(os.getenv("UPLOAD_CONCURRENCY", "4"))
+    UPLOAD_MAX_ATTEMPTS: int = int(os.getenv("UPLOAD_MAX_ATTEMPTS", "5"))
+    
+    # Executor for Pillow/mutagen work: "thread" or "process"; 0 workers = CPU count
+    CPU_EXECUTOR: str = os.getenv("CPU_EXECUTOR", "thread").strip().lower()
+    CPU_WORKERS: int = int(os.getenv("CPU_WORKERS", "0"))
+    
+    # HLS/DASH segments fetched in parallel per download, and across all downloads
+    YTDLP_CONCURRENT_FRAGMENTS: int = int(os.getenv("YTDLP_CONCURRENT_FRAGMENTS", "4"))
+    YTDLP_FRAGMENT_CONNECTIONS: int = int(os.getenv("YTDLP_FRAGMENT_CONNECTIONS", "16"))
+    
+    # TikTok: start yt-dlp alongside TikWM when it hasn't answered within this many
+    # seconds (initial value; then TikWM's p90 latency, capped at the max)
+    TIKTOK_HEDGE_DELAY: float = float(os.getenv("TIKTOK_HEDGE_DELAY", "1.5"))
+    TIKTOK_HEDGE_MAX_DELAY: float = float(os.getenv("TIKTOK_HEDGE_MAX_DELAY", "5"))
+    
+    # Per-backend circuit breakers: open after this many consecutive failures,
+    # fail fast for BREAKER_RESET seconds, then let one probe request through
+    BREAKER_FAILURES: int = int(os.getenv("BREAKER_FAILURES", "5"))
+    BREAKER_RESET: int = int(os.getenv("BREAKER_RESET", "60"))
+    # Timeouts adapt to p99 latency x this, never above the built-in values
+    TIMEOUT_MULTIPLIER: float = float(os.getenv("TIMEOUT_MULTIPLIER", "3"))
+    
+    # Per yt-dlp/ffmpeg process group limits; 0 disables
+    PROCESS_MAX_RSS_MB: int = int(os.getenv("PROCESS_MAX_RSS_MB", "1024"))
+    PROCESS_CPU_SECONDS: int = int(os.getenv("PROCESS_CPU_SECONDS", "900"))
+    
+    # DOWNLOAD_DIR janitor (seconds / MB). Running jobs expire after JOB_TTL, files
+    # waiting in MP3 tools after MP3TOOLS_TTL, untracked leftovers after ORPHAN_TTL.
+    JANITOR_INTERVAL: int = int(os.getenv("JANITOR_INTERVAL", "60"))
+    JOB_TTL: int = int(os.getenv("JOB_TTL", "3600"))
+    MP3TOOLS_TTL: int = int(os.getenv("MP3TOOLS_TTL", "7200"))
+    ORPHAN_TTL: int = int(os.getenv("ORPHAN_TTL", "900"))
+    # High-water marks: size cap for DOWNLOAD_DIR (0 = none) and free space to keep on its disk
+    DOWNLOAD_DIR_MAX_MB: int = int(os.getenv("DOWNLOAD_DIR_MAX_MB", "0"))
+    DISK_MIN_FREE_MB: int = int(os.getenv("DISK_MIN_FREE_MB", "1024"))
+    
+    # Memory budget for rendered cover thumbnails
+    THUMB_CACHE_MB: int = int(os.getenv("THUMB_CACHE_MB", "16"))
+    
+    # SoundCloud web client_id for api-v2 search (scraped automatically when empty)
+    SOUNDCLOUD_CLIENT_ID: str = os.getenv("SOUNDCLOUD_CLIENT_ID", "").strip()
+    
+    # SoundCloud search results cache
+    SEARCH_CACHE_TTL: int = int(os.getenv("SEARCH_CACHE_TTL", "600"))
+    SEARCH_CACHE_SIZE: int = int(os.getenv("SEARCH_CACHE_SIZE", "1000"))
+    
+    # How long permanent failures are remembered per URL (seconds)
+    NEGATIVE_TTL_PRIVATE: int = int(os.getenv("NEGATIVE_TTL_PRIVATE", "3600"))
+    NEGATIVE_TTL_NOT_FOUND: int = int(os.getenv("NEGATIVE_TTL_NOT_FOUND", "21600"))
+    NEGATIVE_TTL_LOGIN: int = int(os.getenv("NEGATIVE_TTL_LOGIN", "1800"))
+    NEGATIVE_CACHE_SIZE: int = int(os.getenv("NEGATIVE_CACHE_SIZE", "5000"))
+    
+    # Media URLs extracted from Pinterest pin pages (pinimg CDN links don't expire)
+    PINTEREST_CACHE_TTL: int = int(os.getenv("PINTEREST_CACHE_TTL", "86400"))
+    PINTEREST_CACHE_SIZE: int = int(os.getenv("PINTEREST_CACHE_SIZE", "5000"))
+    # Board links: pins fetched at once, and at most this many pins per board
+    PINTEREST_BOARD_CONCURRENCY: int = int(os.getenv("PINTEREST_BOARD_CONCURRENCY", "4"))
+    PINTEREST_BOARD_MAX_PINS: int = int(os.getenv("PINTEREST_BOARD_MAX_PINS", "100"))
+    
+    # Wait for typing to pause before running an inline search
+    INLINE_DEBOUNCE: float = float(os.getenv("INLINE_DEBOUNCE", "0.4"))
+    
+    # Minimum seconds between progress message edits
+    PROGRESS_UPDATE_INTERVAL: float = float(os.getenv("PROGRESS_UPDATE_INTERVAL", "3"))
+    
     # Healthcheck
     HEALTH_PORT: int = int(os.getenv("HEALTH_PORT", "8080"))
     
@@ -1,13 +1,38 @@
 """SQLite database for user settings and download history."""
 import sqlite3
 import asyncio
+import hashlib
+import json
+from collections import OrderedDict
 from pathlib import Path
 from datetime import datetime, timedelta
 from typing import Optional
 from dataclasses import dataclass
+from urllib.parse import urlsplit
 
 DB_PATH = Path(__file__).parent.parent / "data" / "bot.db"
 
+# Hot media_cache rows (and known misses) kept in memory in front of SQLite
+FILE_CACHE_LRU_SIZE = 4096
+
+
+def canonicalize_url(url: str) -> str:
+    """
+    Cache key form of a media URL: https, lowercase host without www./m./country
+    prefixes, no query, fragment or trailing slash. Every supported platform
+    carries the media id in the path, so tracking params only split the cache.
+    """
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or "").lower()
+    for prefix in ("www.", "m."):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+    # ru.pinterest.com, de.pinterest.com, ... are the same pin
+    if ".pinterest." in host and len(host.split(".", 1)[0]) == 2:
+        host = host.split(".", 1)[1]
+    path = parts.path.rstrip("/") or "/"
+    return f"https://{host}{path}"
+
 
 @dataclass
 class DownloadRecord:
@@ -24,6 +49,9 @@ class Database:
     def __init__(self):
         self._conn: Optional[sqlite3.Connection] = None
         self._lock = asyncio.Lock()
+        # "url_hash:variant" -> cached row, or None for a known miss
+        self._file_lru: OrderedDict[str, Optional[dict]] = OrderedDict()
+        self._legacy_cache: Optional[bool] = None
     
     def _get_conn(self) -> sqlite3.Connection:
         if self._conn is None:
@@ -63,18 +91,69 @@ class Database:
             CREATE INDEX IF NOT EXISTS idx_downloads_user ON downloads(user_id);
             CREATE INDEX IF NOT EXISTS idx_downloads_date ON downloads(downloaded_at);
             
-            CREATE TABLE IF NOT EXISTS file_cache (
-                url_hash TEXT PRIMARY KEY,
-                file_id TEXT NOT NULL,
+            -- variant: what was requested (audio / video / auto);
+            -- file_type: what was sent (audio / video / photo), file_ids: JSON list in send order
+            CREATE TABLE IF NOT EXISTS media_cache (
+                url_hash TEXT NOT NULL,
+                variant TEXT NOT NULL,
                 file_type TEXT NOT NULL,
+                file_ids TEXT NOT NULL,
                 title TEXT,
                 artist TEXT,
                 duration INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (url_hash, variant)
             );
         """)
         conn.commit()
     
+    def _has_legacy_cache(self, conn: sqlite3.Connection) -> bool:
+        """
+        The pre-media_cache file_cache table, keyed by md5 of the raw URL. Its rows
+        can't be re-keyed (the URL itself was never stored), so it is kept read-only
+        and consulted on misses; hits are copied into media_cache under the canonical key.
+        """
+        if self._legacy_cache is None:
+            self._legacy_cache = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'file_cache'"
+            ).fetchone() is not None
+        return self._legacy_cache
+    
+    def _legacy_lookup(self, conn: sqlite3.Connection, urls: list[str], variant: str) -> dict[str, dict]:
+        """Rows of file_cache for the raw URLs, promoted into media_cache. Caller holds the lock."""
+        if not urls or not self._has_legacy_cache(conn):
+            return {}
+        raw_hashes = {hashlib.md5(url.encode()).hexdigest(): url for url in urls}
+        placeholders = ",".join("?" * len(raw_hashes))
+        rows = conn.execute(
+            f"SELECT url_hash, file_id, file_type, title, artist, duration FROM file_cache "
+            f"WHERE url_hash IN ({placeholders})",
+            tuple(raw_hashes)
+        ).fetchall()
+        
+        found = {}
+        for row in rows:
+            # Old rows weren't keyed by what was requested: only reuse a matching kind
+            if variant != "auto" and row["file_type"] != variant:
+                continue
+            url = raw_hashes[row["url_hash"]]
+            found[url] = {
+                "file_type": row["file_type"],
+                "file_ids": [row["file_id"]],
+                "file_id": row["file_id"],
+                "title": row["title"],
+                "artist": row["artist"],
+                "duration": row["duration"]
+            }
+            conn.execute("""
+                INSERT OR IGNORE INTO media_cache (url_hash, variant, file_type, file_ids, title, artist, duration)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (self._url_hash(url), variant, row["file_type"], json.dumps([row["file_id"]]),
+                  row["title"], row["artist"], row["duration"]))
+        if found:
+            conn.commit()
+        return found
+    
     # ============ USER SETTINGS ============
     
     async def get_user_lang(self, user_id: int) -> str:
@@ -211,43 +290,109 @@ class Database:
     
     # ============ FILE CACHE ============
     
-    async def get_cached_file(self, url: str) -> Optional[dict]:
-        """Get cached file_id for URL."""
-        import hashlib
-        url_hash = hashlib.md5(url.encode()).hexdigest()
+    @staticmethod
+    def _url_hash(url: str) -> str:
+        return hashlib.md5(canonicalize_url(url).encode()).hexdigest()
+    
+    def _lru_get(self, key: str) -> tuple[bool, Optional[dict]]:
+        """(known, row) from the in-memory front cache."""
+        if key not in self._file_lru:
+            return False, None
+        self._file_lru.move_to_end(key)
+        return True, self._file_lru[key]
+    
+    def _lru_put(self, key: str, row: Optional[dict]) -> None:
+        self._file_lru[key] = row
+        self._file_lru.move_to_end(key)
+        while len(self._file_lru) > FILE_CACHE_LRU_SIZE:
+            self._file_lru.popitem(last=False)
+    
+    async def get_cached_file(self, url: str, variant: str) -> Optional[dict]:
+        """Get cached file_id(s) for URL as requested in `variant` (audio / video / auto)."""
+        return (await self.get_cached_files([url], variant)).get(url)
+    
+    async def get_cached_files(self, urls: list[str], variant: str = "audio") -> dict[str, dict]:
+        """
+        Get cached file_ids for many URLs. Hot entries come from memory; the rest
+        are fetched with a single IN (...) query under one lock. Returns {url: cached}
+        where cached has file_type, file_ids, file_id (the first one), title, artist, duration.
+        """
+        found: dict[str, dict] = {}
+        missing: dict[str, list[str]] = {}
+        for url in urls:
+            url_hash = self._url_hash(url)
+            known, row = self._lru_get(f"{url_hash}:{variant}")
+            if not known:
+                missing.setdefault(url_hash, []).append(url)
+            elif row:
+                found[url] = row
         
+        if not missing:
+            return found
+        
+        placeholders = ",".join("?" * len(missing))
         async with self._lock:
             conn = self._get_conn()
-            row = conn.execute(
-                "SELECT file_id, file_type, title, artist, duration FROM file_cache WHERE url_hash = ?",
-                (url_hash,)
-            ).fetchone()
-            
+            rows = conn.execute(
+                f"SELECT url_hash, file_type, file_ids, title, artist, duration FROM media_cache "
+                f"WHERE variant = ? AND url_hash IN ({placeholders})",
+                (variant, *missing)
+            ).fetchall()
+            loaded_hashes = {row["url_hash"] for row in rows}
+            legacy = self._legacy_lookup(
+                conn,
+                [url for url_hash, hash_urls in missing.items() if url_hash not in loaded_hashes for url in hash_urls],
+                variant
+            )
+        
+        loaded = {}
+        for row in rows:
+            file_ids = json.loads(row["file_ids"])
+            loaded[row["url_hash"]] = {
+                "file_type": row["file_type"],
+                "file_ids": file_ids,
+                "file_id": file_ids[0] if file_ids else None,
+                "title": row["title"],
+                "artist": row["artist"],
+                "duration": row["duration"]
+            }
+        for url, row in legacy.items():
+            loaded.setdefault(self._url_hash(url), row)
+        for url_hash, hash_urls in missing.items():
+            row = loaded.get(url_hash)
+            self._lru_put(f"{url_hash}:{variant}", row)
             if row:
-                return {
-                    "file_id": row["file_id"],
-                    "file_type": row["file_type"],
-                    "title": row["title"],
-                    "artist": row["artist"],
-                    "duration": row["duration"]
-                }
-            return None
-    
-    async def cache_file(self, url: str, file_id: str, file_type: str, title: str = "", artist: str = "", duration: int = 0):
-        """Cache file_id for URL."""
-        import hashlib
-        url_hash = hashlib.md5(url.encode()).hexdigest()
+                for url in hash_urls:
+                    found[url] = row
+        return found
+    
+    async def cache_file(
+        self,
+        url: str,
+        variant: str,
+        file_type: str,
+        file_ids: list[str],
+        title: str = "",
+        artist: str = "",
+        duration: int = 0
+    ):
+        """Cache the file_id(s) sent for URL in `variant`; media groups keep their order."""
+        if not file_ids:
+            return
+        url_hash = self._url_hash(url)
         
         async with self._lock:
             conn = self._get_conn()
             conn.execute("""
-                INSERT INTO file_cache (url_hash, file_id, file_type, title, artist, duration)
-                VALUES (?, ?, ?, ?, ?, ?)
-                ON CONFLICT(url_hash) DO UPDATE SET
-                    file_id = excluded.file_id,
-                    file_type = excluded.file_type
-            """, (url_hash, file_id, file_type, title, artist, duration))
+                INSERT INTO media_cache (url_hash, variant, file_type, file_ids, title, artist, duration)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(url_hash, variant) DO UPDATE SET
+                    file_type = excluded.file_type,
+                    file_ids = excluded.file_ids
+            """, (url_hash, variant, file_type, json.dumps(file_ids), title, artist, duration))
             conn.commit()
+            # Invalidate: the row may have been a known miss or older file_ids
+            self._file_lru.pop(f"{url_hash}:{variant}", None)
 
 
 # Global instance
@@ -1,17 +1,21 @@
 import re
-import uuid
 import logging
 import traceback
+from contextlib import aclosing
+from typing import Optional, Union
 from aiogram import Router, F
-from aiogram.types import Message, FSInputFile, CallbackQuery, InputMediaPhoto
+from aiogram.types import Message, BufferedInputFile, CallbackQuery, InputMediaPhoto, InputMediaVideo
 from aiogram.enums import ChatAction
+from aiogram.exceptions import TelegramRetryAfter
 from aiogram.filters.callback_data import CallbackData
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
 from app.services.router import router as download_router
-from app.services.base import BaseDownloader
-from app.services.mp3tools import mp3tools
-from app.handlers.mp3tools import _file_storage, get_mp3tools_keyboard
+from app.services.base import BaseDownloader, MediaResult
+from app.services.pinterest import PinterestDownloader, pin_url
+from app.services.uploader import uploader, input_file
+from app.services.progress import ProgressReporter, render_progress
+from app.handlers.mp3tools import store_file, get_mp3tools_keyboard
 from app.i18n import t
 from app.database import db
 from app.config import config
@@ -54,6 +58,9 @@ def get_url_pattern() -> str:
         r"vm\.tiktok\.com/[\w]+|"
         r"vt\.tiktok\.com/[\w]+|"
         r"(?:[a-z]{2}\.)?(?:www\.)?pinterest\.(?:com|co\.uk|de|fr|es|it|ca|au|jp|kr)/pin/[\w-]+|"
+        r"(?:[a-z]{2}\.)?(?:www\.)?pinterest\.(?:com|co\.uk|de|fr|es|it|ca|au|jp|kr)"
+        r"/(?!(?:pin|search|ideas|today|explore|settings|business|_)/)[\w.-]+"
+        r"/(?!(?:_saved|_created|pins|boards|followers|following)(?![\w%-]))[\w%-]+/?(?=$|[\s?#.,;:!)\]'\"])|"
         r"pin\.it/[\w]+"
         r")"
     )
@@ -108,8 +115,11 @@ async def handle_media_link(message: Message) -> None:
         await process_download(message, url, "video", platform="tiktok", user_id=user_id)
         return
     
-    # Pinterest - auto download (video or photo)
+    # Pinterest - auto download (video or photo); boards pin by pin
     if platform == "pinterest":
+        if PinterestDownloader.is_board(url):
+            await process_board(message, url, user_id)
+            return
         await process_download(message, url, "auto", platform="pinterest", user_id=user_id)
         return
 
@@ -128,21 +138,60 @@ async def handle_media_type_callback(callback: CallbackQuery, callback_data: Med
     await process_download(callback.message, url, callback_data.action, user_id=callback.from_user.id)
 
 
+async def send_cached(message: Message, cached: dict) -> None:
+    """Re-send previously uploaded media by file_id, without touching the origin."""
+    chat_id = message.chat.id
+    file_ids = cached["file_ids"]
+    
+    if cached["file_type"] == "audio":
+        await uploader.send(chat_id, lambda: message.answer_audio(
+            audio=file_ids[0],
+            title=cached["title"],
+            performer=cached["artist"],
+            duration=cached["duration"]
+        ))
+    elif cached["file_type"] == "photo":
+        caption = f"📷 {sanitize_title(cached['title'])}"
+        if len(file_ids) == 1:
+            await uploader.send(chat_id, lambda: message.answer_photo(photo=file_ids[0], caption=caption))
+        else:
+            media_group = [
+                InputMediaPhoto(media=file_id, caption=caption if i == 0 else None)
+                for i, file_id in enumerate(file_ids)
+            ]
+            await uploader.send(
+                chat_id,
+                lambda: message.answer_media_group(media=media_group),
+                weight=len(media_group)
+            )
+    else:
+        await uploader.send(chat_id, lambda: message.answer_video(video=file_ids[0]))
+
+
+async def report_failure(message: Message, status_msg: Message, result: MediaResult, user_id: int, url: str) -> None:
+    error_msg = result.error or "Unknown error"
+    if result.unavailable:
+        # Fast fail from an open breaker; the owner heard about the failures that opened it
+        await status_msg.edit_text(f"⏳ {error_msg[:200]}")
+        logger.info(f"Breaker open: {error_msg} | URL: {url}")
+        return
+    await status_msg.edit_text(f"❌ {error_msg[:200]}")
+    if result.negative_cached:
+        # Owner already heard about this URL when it first failed
+        logger.info(f"Negative cache hit: {error_msg} | URL: {url}")
+        return
+    await notify_owner(message.bot, error_msg, user_id, url)
+    logger.error(f"Download failed: {error_msg} | URL: {url}")
+
+
 async def process_download(message: Message, url: str, media_type: str, platform: str = "", user_id: int = 0) -> None:
     """Download and send media."""
     # Check cache first
-    cached = await db.get_cached_file(url)
-    if cached and cached["file_type"] == media_type:
+    chat_id = message.chat.id
+    cached = await db.get_cached_file(url, media_type)
+    if cached:
         try:
-            if media_type == "audio":
-                await message.answer_audio(
-                    audio=cached["file_id"],
-                    title=cached["title"],
-                    performer=cached["artist"],
-                    duration=cached["duration"]
-                )
-            else:
-                await message.answer_video(video=cached["file_id"])
+            await send_cached(message, cached)
             await db.add_download(user_id, platform or "unknown", url, cached["title"], cached["artist"])
             return
         except Exception:
@@ -150,81 +199,55 @@ async def process_download(message: Message, url: str, media_type: str, platform
     
     # Platform emoji
     platform_emoji = {"soundcloud": "🟠", "tiktok": "🎵", "pinterest": "📌"}.get(platform, "📥")
-    status_msg = await message.answer(f"{platform_emoji} <b>Загрузка...</b>\n\n▓░░░░░░░░░ 0%", parse_mode="HTML")
-    
-    async def update_progress(percent: int):
-        try:
-            filled = int(percent / 10)
-            bar = "▓" * filled + "░" * (10 - filled)
-            await status_msg.edit_text(f"{platform_emoji} <b>Загрузка...</b>\n\n{bar} {percent}%", parse_mode="HTML")
-        except Exception:
-            pass
-    
-    await update_progress(10)
+    header = f"{platform_emoji} <b>Загрузка...</b>"
+    status_msg = await message.answer(render_progress(header, 0, None), parse_mode="HTML")
     
     action = ChatAction.UPLOAD_VOICE if media_type == "audio" else ChatAction.UPLOAD_VIDEO
     await message.bot.send_chat_action(chat_id=message.chat.id, action=action)
     
-    await update_progress(20)
-    
-    result = await download_router.download(url, media_type)
-    
-    await update_progress(60)
+    reporter = ProgressReporter(status_msg, header)
+    try:
+        result = await download_router.download(url, media_type, progress=reporter)
+    finally:
+        await reporter.close()
     
     if not result.success:
-        error_msg = result.error or "Unknown error"
-        await status_msg.edit_text(f"❌ {error_msg[:200]}")
-        await notify_owner(message.bot, error_msg, user_id, url)
-        logger.error(f"Download failed: {error_msg} | URL: {url}")
+        await report_failure(message, status_msg, result, user_id, url)
         return
     
-    await update_progress(70)
-    
     # Save to history
     await db.add_download(user_id, platform or "unknown", url, result.title, result.author)
     
     try:
-        await update_progress(80)
         await message.bot.send_chat_action(chat_id=message.chat.id, action=ChatAction.UPLOAD_DOCUMENT)
         
         if result.media_type == "audio":
             ext = result.file_path.suffix or ".mp3"
             safe_title = sanitize_title(result.title)
             safe_author = sanitize_title(result.author, 40)
-            audio_file = FSInputFile(
-                path=result.file_path,
-                filename=f"{safe_author} - {safe_title}{ext}"
-            )
+            audio_file = input_file(result.file_path, f"{safe_author} - {safe_title}{ext}")
             
-            # Get resized thumbnail for Telegram (320x320 JPEG)
-            thumb_data = await mp3tools.get_thumbnail_for_telegram(result.file_path) if platform in AUDIO_EDIT_PLATFORMS else None
-            thumbnail = None
-            thumb_path = None
-            if thumb_data:
-                thumb_path = result.file_path.parent / f"{result.file_path.stem}_thumb.jpg"
-                thumb_path.write_bytes(thumb_data)
-                thumbnail = FSInputFile(path=thumb_path)
+            # Resized cover (320x320 JPEG), prepared by the downloader
+            thumbnail = BufferedInputFile(result.thumbnail, filename="thumb.jpg") if result.thumbnail else None
             
-            sent_msg = await message.answer_audio(
+            sent_msg = await uploader.send(chat_id, lambda: message.answer_audio(
                 audio=audio_file,
                 title=result.title,
                 performer=result.author,
                 duration=result.duration,
                 thumbnail=thumbnail
-            )
+            ))
             
             # Cache file_id for instant future sends
             if sent_msg.audio:
-                await db.cache_file(url, sent_msg.audio.file_id, "audio", result.title, result.author, result.duration or 0)
-            
-            # Cleanup thumbnail
-            if thumb_path and thumb_path.exists():
-                thumb_path.unlink()
+                await db.cache_file(
+                    url, media_type, "audio", [sent_msg.audio.file_id],
+                    result.title, result.author, result.duration or 0
+                )
             
             # For audio platforms: offer MP3 Tools
             if platform in AUDIO_EDIT_PLATFORMS:
-                file_id = uuid.uuid4().hex[:8]
-                _file_storage[file_id] = result.file_path
+                file_id = store_file(result.file_path)
                 
                 await status_msg.edit_text(
                     t(user_id, "edit_prompt"),
@@ -237,39 +260,58 @@ async def process_download(message: Message, url: str, media_type: str, platform
             
             if len(all_photos) == 1:
                 # Single photo
-                photo_file = FSInputFile(path=all_photos[0])
-                await message.answer_photo(photo=photo_file, caption=f"📷 {sanitize_title(result.title)}")
+                photo_file = input_file(all_photos[0])
+                sent_msgs = [await uploader.send(chat_id, lambda: message.answer_photo(
+                    photo=photo_file,
+                    caption=f"📷 {sanitize_title(result.title)}"
+                ))]
             else:
                 # Multiple photos - send as media group
                 media_group = []
                 for i, photo_path in enumerate(all_photos[:10]):  # Telegram limit: 10 media per group
                     media = InputMediaPhoto(
-                        media=FSInputFile(path=photo_path),
+                        media=input_file(photo_path),
                         caption=f"📷 {sanitize_title(result.title)}" if i == 0 else None
                     )
                     media_group.append(media)
                 
-                await message.answer_media_group(media=media_group)
+                sent_msgs = await uploader.send(
+                    chat_id,
+                    lambda: message.answer_media_group(media=media_group),
+                    weight=len(media_group)
+                )
+            
+            # Cache the group's file_ids in order: repeat slideshows skip the origin entirely
+            photo_ids = [m.photo[-1].file_id for m in sent_msgs if m.photo]
+            if len(photo_ids) == len(sent_msgs):
+                await db.cache_file(url, media_type, "photo", photo_ids, result.title, result.author)
             
             # Cleanup all photo files
             for photo_path in all_photos:
                 await BaseDownloader.cleanup(photo_path)
         else:
             safe_title = sanitize_title(result.title)
-            video_file = FSInputFile(
-                path=result.file_path,
-                filename=f"{safe_title}.mp4"
-            )
-            sent_msg = await message.answer_video(
+            video_file = input_file(result.file_path, f"{safe_title}.mp4")
+            sent_msg = await uploader.send(chat_id, lambda: message.answer_video(
                 video=video_file
-            )
+            ))
             
             # Cache video file_id
             if sent_msg.video:
-                await db.cache_file(url, sent_msg.video.file_id, "video", result.title, result.author, result.duration or 0)
+                await db.cache_file(
+                    url, media_type, "video", [sent_msg.video.file_id],
+                    result.title, result.author, result.duration or 0
+                )
         
         await status_msg.delete()
         
+    except TelegramRetryAfter as e:
+        # Still flood-limited after all retries: not a download failure
+        logger.warning(f"Upload gave up after flood wait {e.retry_after}s | URL: {url}")
+        try:
+            await status_msg.edit_text(t(user_id, "rate_limit"))
+        except Exception:
+            pass
     except Exception as e:
         error_msg = str(e)
         await status_msg.edit_text(f"❌ {error_msg[:100]}")
@@ -279,3 +321,128 @@ async def process_download(message: Message, url: str, media_type: str, platform
         # Cleanup only if the file is not handed over to MP3 tools.
         if platform not in AUDIO_EDIT_PLATFORMS:
             await BaseDownloader.cleanup(result.file_path)
+
+
+# (pin url, "photo" / "video", file_id or downloaded result, title)
+BoardItem = tuple[str, str, Union[str, MediaResult], str]
+
+
+async def send_board_group(message: Message, items: list[BoardItem], caption: Optional[str]) -> list[Message]:
+    """Up to 10 pins as one media group (a single pin as a plain photo / video)."""
+    chat_id = message.chat.id
+    refs = [
+        media if isinstance(media, str) else input_file(media.file_path)
+        for _, _, media, _ in items
+    ]
+    
+    if len(items) == 1:
+        if items[0][1] == "photo":
+            return [await uploader.send(chat_id, lambda: message.answer_photo(photo=refs[0], caption=caption))]
+        return [await uploader.send(chat_id, lambda: message.answer_video(video=refs[0], caption=caption))]
+    
+    media_group = [
+        (InputMediaPhoto if kind == "photo" else InputMediaVideo)(media=ref, caption=caption if i == 0 else None)
+        for i, ((_, kind, _, _), ref) in enumerate(zip(items, refs))
+    ]
+    return await uploader.send(
+        chat_id,
+        lambda: message.answer_media_group(media=media_group),
+        weight=len(media_group)
+    )
+
+
+async def process_board(message: Message, url: str, user_id: int) -> None:
+    """
+    Pinterest board: pins uploaded before are re-sent by file_id, the rest are
+    downloaded concurrently and sent 10 per media group as they complete.
+    Every newly uploaded pin is cached under its own pin URL, so overlapping
+    boards and later single-pin links reuse it.
+    """
+    header = "📌 <b>Загрузка...</b>"
+    status_msg = await message.answer(render_progress(header, 0, None), parse_mode="HTML")
+    
+    pins, board_name, failure = await download_router.board_pins(url)
+    if failure:
+        await report_failure(message, status_msg, failure, user_id, url)
+        return
+    
+    await db.add_download(user_id, "pinterest", url, board_name, "Pinterest")
+    
+    cached = await db.get_cached_files([pin_url(pin_id) for pin_id, _ in pins], "auto")
+    batch: list[BoardItem] = []
+    missing = []
+    for pin_id, media in pins:
+        hit = cached.get(pin_url(pin_id))
+        if hit:
+            batch.append((pin_url(pin_id), hit["file_type"], hit["file_id"], hit["title"]))
+        else:
+            missing.append((pin_id, media))
+    
+    caption = f"📌 {sanitize_title(board_name)}"
+    failed = 0
+    
+    async def flush(items: list[BoardItem]) -> None:
+        nonlocal caption
+        try:
+            sent_msgs = await send_board_group(message, items, caption)
+            caption = None
+            for (item_url, kind, media, title), sent in zip(items, sent_msgs):
+                if isinstance(media, MediaResult):
+                    file_id = sent.photo[-1].file_id if sent.photo else sent.video.file_id if sent.video else None
+                    if file_id:
+                        await db.cache_file(item_url, "auto", kind, [file_id], title, "Pinterest")
+        finally:
+            for _, _, media, _ in items:
+                if isinstance(media, MediaResult):
+                    await BaseDownloader.cleanup(media.file_path)
+    
+    reporter = ProgressReporter(status_msg, header)
+    try:
+        while len(batch) >= 10:
+            await flush(batch[:10])
+            batch = batch[10:]
+        
+        downloader = download_router.get_downloader(url)
+        async with aclosing(downloader.download_pins(missing)) as results:
+            done = 0
+            async for pin_id, result in results:
+                done += 1
+                reporter(done, len(missing))
+                if not result.success:
+                    failed += 1
+                    logger.warning(f"Board pin {pin_id} failed: {result.error}")
+                    continue
+                batch.append((pin_url(pin_id), result.media_type, result, result.title))
+                if len(batch) == 10:
+                    items, batch = batch, []
+                    await flush(items)
+        
+        if batch:
+            items, batch = batch, []
+            await flush(items)
+        
+        await reporter.close()
+        if failed:
+            await status_msg.edit_text(f"{t(user_id, 'board_partial')}: {failed}/{len(pins)}")
+        else:
+            await status_msg.delete()
+        
+    except TelegramRetryAfter as e:
+        logger.warning(f"Upload gave up after flood wait {e.retry_after}s | URL: {url}")
+        await reporter.close()
+        try:
+            await status_msg.edit_text(t(user_id, "rate_limit"))
+        except Exception:
+            pass
+    except Exception as e:
+        error_msg = str(e)
+        await reporter.close()
+        await status_msg.edit_text(f"❌ {error_msg[:100]}")
+        await notify_owner(message.bot, f"{error_msg}\n\n{traceback.format_exc()}", user_id, url)
+        logger.error(f"Board send failed: {error_msg} | URL: {url}")
+    finally:
+        await reporter.close()
+        # Downloaded but never sent
+        for _, _, media, _ in batch:
+            if isinstance(media, MediaResult):
+                await BaseDownloader.cleanup(media.file_path)
@@ -1,10 +1,12 @@
 """History and stats handlers."""
-from aiogram import Router
+from aiogram import Router, F
 from aiogram.types import Message
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 
 from app.i18n import t
 from app.database import db
+from app.config import config
+from app.services.negative_cache import negative_cache
 
 router = Router(name="history")
 
@@ -54,3 +56,12 @@ async def cmd_stats(message: Message) -> None:
             text += f"• {title} — {artist} ({count})\n"
     
     await message.answer(text, parse_mode="HTML")
+
+
+@router.message(Command("purge_failed"), F.from_user.id == config.OWNER_ID)
+async def cmd_purge_failed(message: Message, command: CommandObject) -> None:
+    """Owner only: forget cached permanent failures (all, or one URL)."""
+    url = (command.args or "").strip() or None
+    removed = negative_cache.purge(url)
+    target = f"<code>{url[:100]}</code>" if url else "all URLs"
+    await message.answer(f"🧹 Negative cache: removed <b>{removed}</b> ({target})", parse_mode="HTML")
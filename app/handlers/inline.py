@@ -1,4 +1,5 @@
 """Inline mode handler - @bot query in any chat."""
+import asyncio
 import hashlib
 from aiogram import Router
 from aiogram.types import (
@@ -8,15 +9,24 @@ from aiogram.types import (
 
 from app.handlers.search import search_soundcloud
 from app.database import db
+from app.config import config
 
 router = Router(name="inline")
 
+PAGE_SIZE = 8
+MAX_RESULTS = 48
+
+# Latest inline query id and running search per user
+_latest_query: dict[int, str] = {}
+_searches: dict[int, asyncio.Task] = {}
+
 
 @router.inline_query()
 async def handle_inline_query(inline_query: InlineQuery) -> None:
     """Handle inline queries - search SoundCloud."""
     query = inline_query.query.strip()
-    
+    user_id = inline_query.from_user.id
+
     if len(query) < 2:
         await inline_query.answer(
             [],
@@ -25,19 +35,46 @@ async def handle_inline_query(inline_query: InlineQuery) -> None:
             cache_time=5
         )
         return
-    
+
+    # A newer keystroke supersedes whatever this user had running
+    _latest_query[user_id] = inline_query.id
+    previous = _searches.pop(user_id, None)
+    if previous:
+        previous.cancel()
+
+    # Debounce: only search once typing pauses
+    await asyncio.sleep(config.INLINE_DEBOUNCE)
+    if _latest_query.get(user_id) != inline_query.id:
+        return
+
+    try:
+        offset = max(0, int(inline_query.offset or 0))
+    except ValueError:
+        offset = 0
+
+    search = asyncio.create_task(search_soundcloud(query, limit=offset + PAGE_SIZE, timeout=10))
+    _searches[user_id] = search
+
     try:
-        results = await search_soundcloud(query, limit=8, timeout=10)
-        
+        try:
+            results = await search
+        except asyncio.CancelledError:
+            if search.cancelled() and _latest_query.get(user_id) != inline_query.id:
+                return  # Superseded by a newer query
+            raise
+
+        page = results[offset:offset + PAGE_SIZE]
+        cached_files = await db.get_cached_files([r['url'] for r in page])
+
         articles = []
-        for r in results:
+        for r in page:
             dur = r.get('duration') or 0
             duration = f"{int(dur) // 60}:{int(dur) % 60:02d}" if dur else "?"
             result_id = hashlib.md5(r['url'].encode()).hexdigest()[:16]
-            
+
             # Check if we have cached audio
-            cached = await db.get_cached_file(r['url'])
-            
+            cached = cached_files.get(r['url'])
+
             if cached and cached.get('file_id'):
                 # Send cached audio directly! 🎵
                 articles.append(
@@ -60,8 +97,24 @@ async def handle_inline_query(inline_query: InlineQuery) -> None:
                         thumbnail_url="https://a-v2.sndcdn.com/assets/images/sc-icons/favicon-2cadd14bdb.ico"
                     )
                 )
-        
-        await inline_query.answer(articles, cache_time=30, is_personal=True)
-        
+
+        # More pages only if this one came back full
+        next_offset = offset + PAGE_SIZE
+        has_more = len(results) >= next_offset and next_offset < MAX_RESULTS
+
+        await inline_query.answer(
+            articles,
+            cache_time=30,
+            is_personal=True,
+            next_offset=str(next_offset) if has_more else ""
+        )
+
+    except asyncio.CancelledError:
+        raise
     except Exception:
         await inline_query.answer([], cache_time=5)
+    finally:
+        if _searches.get(user_id) is search:
+            del _searches[user_id]
+        if _latest_query.get(user_id) == inline_query.id:
+            del _latest_query[user_id]
@@ -1,8 +1,13 @@
+import asyncio
+import logging
 import uuid
+from dataclasses import dataclass, field
+from io import BytesIO
 from pathlib import Path
+from typing import Optional, Union
 
-from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery, FSInputFile, BufferedInputFile
+from aiogram import Bot, Router, F
+from aiogram.types import Message, CallbackQuery, BufferedInputFile, Document, InputMediaAudio
 from aiogram.filters import Command
 from aiogram.filters.callback_data import CallbackData
 from aiogram.fsm.context import FSMContext
@@ -10,9 +15,14 @@ from aiogram.fsm.state import State, StatesGroup
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
 from app.config import config
-from app.services.mp3tools import mp3tools, MP3Tags
+from app.services.base import new_job_dir, remove_job_files
+from app.services.janitor import janitor
+from app.services.mp3tools import mp3tools, MP3Tags, MP3EditSession
+from app.services.uploader import uploader, input_file
+from app.services.thumbnails import get_thumbnail
 from app.i18n import t
 
+logger = logging.getLogger(__name__)
 
 router = Router(name="mp3tools")
 
@@ -29,9 +39,85 @@ class MP3States(StatesGroup):
     waiting_for_art = State()
 
 
+class MP3BatchStates(StatesGroup):
+    waiting_for_files = State()
+    waiting_for_cover = State()
+    waiting_for_template = State()
+
+
+MAX_BATCH_FILES = 50
+
+
+@dataclass
+class BatchJob:
+    # (message_id, path, fallback title); message order = track order
+    files: list[tuple[int, Path, Optional[str]]] = field(default_factory=list)
+    cover: Optional[bytes] = None
+    # Files still downloading; they already count against MAX_BATCH_FILES
+    pending: int = 0
+    settled: asyncio.Event = field(default_factory=asyncio.Event)
+
+
+# Per-user batch in progress. Album messages arrive as concurrent updates,
+# so files are collected here rather than in FSM data.
+_batches: dict[int, BatchJob] = {}
+
+
 # Storage for file paths (in production use Redis)
 _file_storage: dict[str, Path] = {}
 
+# Parsed tags with pending edits, written once on save
+_sessions: dict[str, MP3EditSession] = {}
+
+
+async def fetch_telegram_file(
+    bot: Bot,
+    file_id: str,
+    file_size: Optional[int],
+    destination: Union[Path, BytesIO]
+) -> bool:
+    """
+    Download a Telegram file, streamed in chunks straight into `destination`.
+    The size is checked before anything is fetched; False if it is over the getFile limit.
+    """
+    if file_size and file_size > config.TELEGRAM_DOWNLOAD_LIMIT:
+        return False
+    file = await bot.get_file(file_id)
+    if file.file_size and file.file_size > config.TELEGRAM_DOWNLOAD_LIMIT:
+        return False
+    await bot.download_file(file.file_path, destination)
+    return True
+
+
+def store_file(file_path: Path) -> str:
+    """Park a file for MP3 tools. If the user never saves or cancels, the janitor drops it."""
+    file_id = uuid.uuid4().hex[:8]
+    _file_storage[file_id] = file_path
+    janitor.claim(file_path, config.MP3TOOLS_TTL, on_expire=lambda: forget_file(file_id), evictable=True)
+    return file_id
+
+
+def forget_file(file_id: str) -> None:
+    _file_storage.pop(file_id, None)
+    _sessions.pop(file_id, None)
+
+
+async def get_session(file_id: str) -> Optional[MP3EditSession]:
+    """Edit session for a stored file, parsed on first use."""
+    file_path = _file_storage.get(file_id)
+    if not file_path or not file_path.exists():
+        return None
+    
+    session = _sessions.get(file_id)
+    if session is None:
+        try:
+            session = await mp3tools.open_session(file_path)
+        except Exception as e:
+            logger.warning(f"Could not read tags of {file_path.name}: {e}")
+            return None
+        _sessions[file_id] = session
+    return session
+
 
 def get_mp3tools_keyboard(file_id: str, user_id: int = 0) -> InlineKeyboardBuilder:
     """Keyboard after SoundCloud download."""
@@ -66,21 +152,26 @@ async def handle_mp3_upload(message: Message, state: FSMContext) -> None:
         await message.answer(t(user_id, "mp3tools_send_file"))
         return
     
+    if message.audio.file_size and message.audio.file_size > config.TELEGRAM_DOWNLOAD_LIMIT:
+        await message.answer(t(user_id, "file_too_big"))
+        return
+    
     status = await message.answer(t(user_id, "loading"))
     
     # Download file
-    file_id = uuid.uuid4().hex[:8]
-    file_path = config.DOWNLOAD_DIR / f"mp3tools_{file_id}.mp3"
-    config.DOWNLOAD_DIR.mkdir(parents=True, exist_ok=True)
+    file_path = new_job_dir() / "track.mp3"
     
-    file = await message.bot.get_file(message.audio.file_id)
-    await message.bot.download_file(file.file_path, file_path)
+    if not await fetch_telegram_file(message.bot, message.audio.file_id, message.audio.file_size, file_path):
+        remove_job_files(file_path)
+        await status.edit_text(t(user_id, "file_too_big"))
+        return
     
-    _file_storage[file_id] = file_path
+    file_id = store_file(file_path)
     await state.clear()
     
     # Get current tags
-    tags = await mp3tools.get_tags(file_path)
+    session = await get_session(file_id)
+    tags = session.get_tags() if session else MP3Tags()
     
     await status.edit_text(
         f"{tags.title or 'Track'} — {tags.artist or 'Artist'}",
@@ -92,6 +183,7 @@ async def handle_mp3_upload(message: Message, state: FSMContext) -> None:
 async def cmd_cancel(message: Message, state: FSMContext) -> None:
     """Cancel current operation."""
     await state.clear()
+    discard_batch(message.from_user.id)
     await message.answer(t(message.from_user.id, "cancelled"))
 
 
@@ -108,11 +200,12 @@ async def handle_back(callback: CallbackQuery, callback_data: MP3ToolsCallback,
         await callback.answer(t(user_id, "file_not_found"), show_alert=True)
         return
     
-    if not file_path.exists():
+    session = await get_session(callback_data.file_id)
+    if not session:
         await callback.answer(t(user_id, "file_deleted"), show_alert=True)
         return
     
-    tags = await mp3tools.get_tags(file_path)
+    tags = session.get_tags()
     
     await callback.answer()
     
@@ -177,28 +270,22 @@ async def handle_artist_input(message: Message, state: FSMContext) -> None:
     title = data.get("title")
     artist = message.text.strip()
     
-    file_path = _file_storage.get(file_id)
+    session = await get_session(file_id)
     
-    if not file_path or not file_path.exists():
+    if not session:
         await state.clear()
         await message.answer(t(user_id, "file_not_found"))
         return
     
-    tags = MP3Tags(title=title, artist=artist)
-    success = await mp3tools.set_tags(file_path, tags)
+    # Kept in memory until "Done"
+    session.set_tags(MP3Tags(title=title, artist=artist))
     
     await state.clear()
     
-    if success:
-        await message.answer(
-            f"{t(user_id, 'tags_saved')} {title} — {artist}",
-            reply_markup=get_mp3tools_keyboard(file_id, user_id).as_markup()
-        )
-    else:
-        await message.answer(
-            t(user_id, "error"),
-            reply_markup=get_mp3tools_keyboard(file_id, user_id).as_markup()
-        )
+    await message.answer(
+        f"{t(user_id, 'tags_saved')} {title} — {artist}",
+        reply_markup=get_mp3tools_keyboard(file_id, user_id).as_markup()
+    )
 
 
 # ============ ALBUM ART ============
@@ -207,16 +294,16 @@ async def handle_artist_input(message: Message, state: FSMContext) -> None:
 async def handle_album_art(callback: CallbackQuery, callback_data: MP3ToolsCallback, state: FSMContext) -> None:
     """Show album art options."""
     user_id = callback.from_user.id
-    file_path = _file_storage.get(callback_data.file_id)
+    session = await get_session(callback_data.file_id)
     
-    if not file_path or not file_path.exists():
+    if not session:
         await callback.answer(t(user_id, "file_not_found"), show_alert=True)
         return
     
     await state.set_state(MP3States.waiting_for_art)
     await state.update_data(file_id=callback_data.file_id)
     
-    art_data = await mp3tools.get_album_art(file_path)
+    art_data = session.get_album_art()
     
     await callback.answer()
     
@@ -240,28 +327,24 @@ async def handle_art_upload(message: Message, state: FSMContext) -> None:
     user_id = message.from_user.id
     data = await state.get_data()
     file_id = data.get("file_id")
-    file_path = _file_storage.get(file_id)
+    session = await get_session(file_id)
     
-    if not file_path or not file_path.exists():
+    if not session:
         await state.clear()
         await message.answer(t(user_id, "file_not_found"))
         return
     
     photo = message.photo[-1]
-    file = await message.bot.get_file(photo.file_id)
-    
-    from io import BytesIO
     photo_bytes = BytesIO()
-    await message.bot.download_file(file.file_path, photo_bytes)
+    if not await fetch_telegram_file(message.bot, photo.file_id, photo.file_size, photo_bytes):
+        await message.answer(t(user_id, "file_too_big"))
+        return
     
-    success = await mp3tools.set_album_art(file_path, photo_bytes.getvalue())
+    session.set_album_art(photo_bytes.getvalue())
     
     await state.clear()
     
-    if success:
-        await message.answer(t(user_id, "cover_updated"), reply_markup=get_mp3tools_keyboard(file_id, user_id).as_markup())
-    else:
-        await message.answer(t(user_id, "error"), reply_markup=get_mp3tools_keyboard(file_id, user_id).as_markup())
+    await message.answer(t(user_id, "cover_updated"), reply_markup=get_mp3tools_keyboard(file_id, user_id).as_markup())
 
 
 @router.message(MP3States.waiting_for_art, Command("delete_art"))
@@ -270,21 +353,18 @@ async def handle_delete_art(message: Message, state: FSMContext) -> None:
     user_id = message.from_user.id
     data = await state.get_data()
     file_id = data.get("file_id")
-    file_path = _file_storage.get(file_id)
+    session = await get_session(file_id)
     
-    if not file_path or not file_path.exists():
+    if not session:
         await state.clear()
         await message.answer(t(user_id, "file_not_found"))
         return
     
-    success = await mp3tools.delete_album_art(file_path)
+    session.delete_album_art()
     
     await state.clear()
     
-    if success:
-        await message.answer(t(user_id, "cover_updated"), reply_markup=get_mp3tools_keyboard(file_id, user_id).as_markup())
-    else:
-        await message.answer(t(user_id, "error"), reply_markup=get_mp3tools_keyboard(file_id, user_id).as_markup())
+    await message.answer(t(user_id, "cover_updated"), reply_markup=get_mp3tools_keyboard(file_id, user_id).as_markup())
 
 
 # ============ SAVE & CANCEL ============
@@ -293,56 +373,261 @@ async def handle_delete_art(message: Message, state: FSMContext) -> None:
 async def handle_save(callback: CallbackQuery, callback_data: MP3ToolsCallback) -> None:
     """Save and send the edited MP3."""
     user_id = callback.from_user.id
+    session = await get_session(callback_data.file_id)
     file_path = _file_storage.pop(callback_data.file_id, None)
+    _sessions.pop(callback_data.file_id, None)
     
-    if not file_path or not file_path.exists():
+    if not session or not file_path:
         await callback.answer(t(user_id, "file_not_found"), show_alert=True)
         return
     
     await callback.answer()
     await callback.message.edit_text(t(user_id, "sending"))
     
-    thumb_path = None
     try:
-        tags = await mp3tools.get_tags(file_path)
-        thumb_data = await mp3tools.get_thumbnail_for_telegram(file_path)
+        # All edits of this session land in a single write
+        if not await mp3tools.commit(session):
+            raise RuntimeError("failed to save tags")
+        tags = session.get_tags()
+        thumb_data = await mp3tools.get_session_thumbnail(session)
         
-        audio_file = FSInputFile(
-            path=file_path,
-            filename=f"{tags.artist or 'Unknown'} - {tags.title or 'Unknown'}.mp3"
-        )
+        audio_file = input_file(file_path, f"{tags.artist or 'Unknown'} - {tags.title or 'Unknown'}.mp3")
         
-        # Save resized thumbnail to temp file
-        thumbnail = None
-        if thumb_data:
-            thumb_path = file_path.parent / f"{callback_data.file_id}_thumb.jpg"
-            thumb_path.write_bytes(thumb_data)
-            thumbnail = FSInputFile(path=thumb_path)
+        thumbnail = BufferedInputFile(thumb_data, filename="thumb.jpg") if thumb_data else None
         
-        await callback.message.answer_audio(
+        await uploader.send(callback.message.chat.id, lambda: callback.message.answer_audio(
             audio=audio_file,
             title=tags.title,
             performer=tags.artist,
             thumbnail=thumbnail
-        )
+        ))
         await callback.message.delete()
     except Exception as e:
         await callback.message.edit_text(f"❌ Ошибка: {str(e)[:100]}")
     finally:
-        if file_path.exists():
-            file_path.unlink()
-        if thumb_path and thumb_path.exists():
-            thumb_path.unlink()
+        remove_job_files(file_path)
 
 
 @router.callback_query(MP3ToolsCallback.filter(F.action == "cancel"))
 async def handle_cancel(callback: CallbackQuery, callback_data: MP3ToolsCallback, state: FSMContext) -> None:
     """Cancel and cleanup."""
     file_path = _file_storage.pop(callback_data.file_id, None)
+    _sessions.pop(callback_data.file_id, None)
     
-    if file_path and file_path.exists():
-        file_path.unlink()
+    remove_job_files(file_path)
     
     await state.clear()
     await callback.answer()
     await callback.message.delete()
+
+
+# ============ BATCH ============
+
+def discard_batch(user_id: int, job: Optional[BatchJob] = None) -> None:
+    """Drop a user's batch (only if it is still `job`, when given) and its downloaded files."""
+    current = _batches.get(user_id)
+    if current is None or (job is not None and current is not job):
+        return
+    del _batches[user_id]
+    for _, file_path, _ in current.files:
+        remove_job_files(file_path)
+
+
+def is_mp3_document(document: Document) -> bool:
+    """MP3 sent as a file rather than as audio."""
+    return document.mime_type == "audio/mpeg" or (document.file_name or "").lower().endswith(".mp3")
+
+
+@router.message(Command("mp3batch"))
+async def cmd_mp3batch(message: Message, state: FSMContext) -> None:
+    """Start batch mode - collect many MP3 files."""
+    user_id = message.from_user.id
+    discard_batch(user_id)
+    _batches[user_id] = BatchJob()
+    await state.set_state(MP3BatchStates.waiting_for_files)
+    await message.answer(t(user_id, "batch_send"), parse_mode="HTML")
+
+
+@router.message(MP3BatchStates.waiting_for_files, F.audio | F.document)
+async def handle_batch_file(message: Message) -> None:
+    """Collect one file of the batch (no reply per file). MP3s sent as files count too."""
+    user_id = message.from_user.id
+    job = _batches.get(user_id)
+    if job is None:
+        return
+    if message.document and not is_mp3_document(message.document):
+        await message.answer(t(user_id, "mp3tools_send_file"))
+        return
+    if len(job.files) + job.pending >= MAX_BATCH_FILES:
+        await message.answer(t(user_id, "batch_too_many"))
+        return
+    
+    audio = message.audio or message.document
+    if audio.file_size and audio.file_size > config.TELEGRAM_DOWNLOAD_LIMIT:
+        await message.answer(t(user_id, "file_too_big"))
+        return
+    
+    file_path = new_job_dir() / "track.mp3"
+    
+    job.pending += 1
+    job.settled.clear()
+    try:
+        fetched = await fetch_telegram_file(message.bot, audio.file_id, audio.file_size, file_path)
+    except BaseException:
+        remove_job_files(file_path)
+        raise
+    finally:
+        job.pending -= 1
+        if not job.pending:
+            job.settled.set()
+    
+    if not fetched:
+        remove_job_files(file_path)
+        await message.answer(t(user_id, "file_too_big"))
+        return
+    if _batches.get(user_id) is not job:
+        # Cancelled or replaced by a new /mp3batch while downloading
+        remove_job_files(file_path)
+        return
+    # Abandoned batches are discarded whole by the janitor
+    janitor.claim(file_path, config.MP3TOOLS_TTL, on_expire=lambda: discard_batch(user_id, job), evictable=True)
+    
+    default_title = getattr(audio, "title", None) or (Path(audio.file_name).stem if audio.file_name else None)
+    job.files.append((message.message_id, file_path, default_title))
+
+
+@router.message(MP3BatchStates.waiting_for_files, Command("done"))
+async def handle_batch_done(message: Message, state: FSMContext) -> None:
+    """All files received - ask for a cover."""
+    user_id = message.from_user.id
+    job = _batches.get(user_id)
+    if not job or not (job.files or job.pending):
+        await message.answer(t(user_id, "batch_empty"))
+        return
+    
+    await state.set_state(MP3BatchStates.waiting_for_cover)
+    await message.answer(t(user_id, "batch_cover"))
+
+
+@router.message(MP3BatchStates.waiting_for_cover, F.photo)
+async def handle_batch_cover(message: Message, state: FSMContext) -> None:
+    """Store the shared cover, ask for the tag template."""
+    user_id = message.from_user.id
+    job = _batches.get(user_id)
+    if not job:
+        await state.clear()
+        await message.answer(t(user_id, "file_not_found"))
+        return
+    
+    photo = message.photo[-1]
+    photo_bytes = BytesIO()
+    if not await fetch_telegram_file(message.bot, photo.file_id, photo.file_size, photo_bytes):
+        await message.answer(t(user_id, "file_too_big"))
+        return
+    job.cover = photo_bytes.getvalue()
+    
+    await state.set_state(MP3BatchStates.waiting_for_template)
+    await message.answer(t(user_id, "batch_template"), parse_mode="HTML")
+
+
+@router.message(MP3BatchStates.waiting_for_cover, Command("skip"))
+async def handle_batch_skip_cover(message: Message, state: FSMContext) -> None:
+    await state.set_state(MP3BatchStates.waiting_for_template)
+    await message.answer(t(message.from_user.id, "batch_template"), parse_mode="HTML")
+
+
+@router.message(MP3BatchStates.waiting_for_template, Command("skip"))
+async def handle_batch_skip_template(message: Message, state: FSMContext) -> None:
+    await run_batch(message, state, MP3Tags())
+
+
+@router.message(MP3BatchStates.waiting_for_template, F.text)
+async def handle_batch_template(message: Message, state: FSMContext) -> None:
+    if message.text.startswith("/"):
+        await state.clear()
+        discard_batch(message.from_user.id)
+        await message.answer(t(message.from_user.id, "cancelled"))
+        return
+    template = mp3tools.parse_tags_template(message.text)
+    if template.track:
+        # Each file gets its own number; one value for all would override that
+        await message.answer(t(message.from_user.id, "batch_no_track"))
+        return
+    await run_batch(message, state, template)
+
+
+async def run_batch(message: Message, state: FSMContext, template: MP3Tags) -> None:
+    """Tag every file in parallel and send them back as media groups."""
+    user_id = message.from_user.id
+    await state.clear()
+    job = _batches.get(user_id)
+    if job and job.pending:
+        # Files of an album may still be downloading after /done
+        await job.settled.wait()
+    if job is None or _batches.get(user_id) is not job:
+        await message.answer(t(user_id, "batch_empty"))
+        return
+    # Files that finish downloading from here on find no batch and are dropped
+    del _batches[user_id]
+    if not job.files:
+        await message.answer(t(user_id, "batch_empty"))
+        return
+    
+    status = await message.answer(t(user_id, "batch_processing"))
+    files = sorted(job.files, key=lambda f: f[0])
+    total = len(files)
+    
+    try:
+        items = []
+        for number, (_, file_path, default_title) in enumerate(files, 1):
+            tags = MP3Tags(**vars(template))
+            tags.track = f"{number}/{total}"
+            items.append((file_path, tags, default_title))
+        
+        results, thumb_data = await asyncio.gather(
+            mp3tools.tag_many(items, job.cover),
+            get_thumbnail(job.cover) if job.cover else asyncio.sleep(0)
+        )
+        
+        media = []
+        for (file_path, _, _), tags in zip(items, results):
+            if tags is None:
+                continue
+            media.append(InputMediaAudio(
+                media=input_file(file_path, f"{tags.artist or 'Unknown'} - {tags.title or 'Unknown'}.mp3"),
+                title=tags.title,
+                performer=tags.artist,
+                thumbnail=BufferedInputFile(thumb_data, filename="thumb.jpg") if thumb_data else None
+            ))
+        
+        # Files whose tags could not be written are left out, but not silently
+        failed = len(items) - len(media)
+        failed_note = f"{t(user_id, 'batch_untagged')}: {failed}/{total}"
+        if not media:
+            await status.edit_text(failed_note)
+            return
+        
+        # Telegram media groups hold 2-10 items
+        chat_id = message.chat.id
+        for i in range(0, len(media), 10):
+            chunk = media[i:i + 10]
+            if len(chunk) == 1:
+                item = chunk[0]
+                await uploader.send(chat_id, lambda: message.answer_audio(
+                    audio=item.media,
+                    title=item.title,
+                    performer=item.performer,
+                    thumbnail=item.thumbnail
+                ))
+            else:
+                await uploader.send(chat_id, lambda: message.answer_media_group(media=chunk), weight=len(chunk))
+        
+        if failed:
+            await status.edit_text(failed_note)
+        else:
+            await status.delete()
+    except Exception as e:
+        await status.edit_text(f"❌ Ошибка: {str(e)[:100]}")
+    finally:
+        for _, file_path, _ in files:
+            remove_job_files(file_path)
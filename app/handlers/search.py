@@ -2,6 +2,8 @@
 import asyncio
 import json
 import hashlib
+import logging
+import time
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command
@@ -13,6 +15,12 @@ from aiogram.fsm.state import State, StatesGroup
 from app.i18n import t
 from app.database import db
 from app.services.ytdlp_wrapper import get_ytdlp_path
+from app.services.processes import process_supervisor
+from app.services.resilience import BackendUnavailable, resilience
+from app.services.search_cache import search_cache
+from app.services.soundcloud_api import soundcloud_api
+
+logger = logging.getLogger(__name__)
 
 router = Router(name="search")
 
@@ -29,6 +37,29 @@ class SearchCallback(CallbackData, prefix="src"):
 
 
 async def search_soundcloud(query: str, limit: int = 10, timeout: int = 15) -> list[dict]:
+    """Search SoundCloud; repeated, concurrent and prefix-related queries share results."""
+    return await search_cache.get_or_fetch(
+        query, limit, lambda q, n: _search_uncached(q, n, timeout)
+    )
+
+
+async def _search_uncached(query: str, limit: int, timeout: int) -> list[dict]:
+    """
+    Direct api-v2 search; yt-dlp scsearch only if the API path fails.
+    Both adapt their timeout to recent latency, at most `timeout`; while the
+    API keeps failing its breaker skips it and goes to yt-dlp straight away.
+    """
+    try:
+        async with resilience.guard("soundcloud_api", timeout) as api_timeout:
+            return await soundcloud_api.search(query, limit=limit, timeout=api_timeout)
+    except BackendUnavailable:
+        pass
+    except Exception as e:
+        logger.warning(f"SoundCloud API search failed, falling back to yt-dlp: {e}")
+    return await _search_ytdlp(query, limit, resilience.timeout("soundcloud_search", timeout))
+
+
+async def _search_ytdlp(query: str, limit: int, timeout: float) -> list[dict]:
     """Search SoundCloud using yt-dlp with timeout."""
     cmd = [
         get_ytdlp_path(),
@@ -38,17 +69,15 @@ async def search_soundcloud(query: str, limit: int = 10, timeout: int = 15) -> l
         f"scsearch{limit}:{query}"
     ]
     
-    process = await asyncio.create_subprocess_exec(
-        *cmd,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE
-    )
-    
+    # A timed-out or superseded (cancelled) search is killed and reaped on exit
+    start = time.monotonic()
     try:
-        stdout, _ = await asyncio.wait_for(process.communicate(), timeout=timeout)
+        async with process_supervisor.spawn(*cmd, name="yt-dlp search") as child:
+            stdout, _ = await asyncio.wait_for(child.proc.communicate(), timeout=timeout)
     except asyncio.TimeoutError:
-        process.kill()
         return []
+    if child.proc.returncode == 0:
+        resilience.record("soundcloud_search", time.monotonic() - start)
     
     results = []
     for line in stdout.decode().strip().split('\n'):
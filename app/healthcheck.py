@@ -5,6 +5,15 @@ from datetime import datetime
 
 from app.config import config
 from app.database import db
+from app.services.executor import cpu_executor
+from app.services.negative_cache import negative_cache
+from app.services.pin_cache import pin_cache
+from app.services.processes import process_supervisor
+from app.services.janitor import janitor
+from app.services.ytdlp_wrapper import fragment_budget
+from app.services.latency import latency
+from app.services.resilience import resilience
+from app.services.search_cache import search_cache
 
 start_time = datetime.now()
 
@@ -19,7 +28,16 @@ async def health_handler(request):
         "uptime_seconds": int(uptime.total_seconds()),
         "total_users": stats["total_users"],
         "total_downloads": stats["total_downloads"],
-        "today_downloads": stats["today_downloads"]
+        "today_downloads": stats["today_downloads"],
+        "cpu_executor": cpu_executor.stats(),
+        "search_cache": search_cache.stats(),
+        "negative_cache": negative_cache.stats(),
+        "pin_cache": pin_cache.stats(),
+        "processes": process_supervisor.stats(),
+        "janitor": janitor.stats(),
+        "fragment_budget": fragment_budget.stats(),
+        "latency": latency.stats(),
+        "resilience": resilience.stats()
     })
 
 
@@ -28,6 +28,7 @@ TRANSLATIONS = {
             "▸ <b>Команды:</b>\n"
             "  /search — поиск на SoundCloud\n"
             "  /mp3tools — редактор MP3 тегов\n"
+            "  /mp3batch — теги и обложка для многих файлов\n"
             "  /history — история загрузок\n"
             "  /lang — сменить язык\n\n"
             "▸ <b>Поддерживаемые ссылки:</b>\n"
@@ -44,10 +45,12 @@ TRANSLATIONS = {
         "format_choice": "🎵 или 🎬 ?",
         "link_expired": "Ссылка устарела",
         "edit_prompt": "✏️ Редактировать?",
+        "board_partial": "⚠️ Не все пины удалось скачать",
         
         # MP3 Tools
         "mp3tools_send": "🎵 Кидай MP3",
         "mp3tools_send_file": "❌ Отправь MP3 файл",
+        "file_too_big": "❌ Файл слишком большой",
         "loading": "⏳",
         "sending": "⏳",
         
@@ -70,6 +73,26 @@ TRANSLATIONS = {
         "send_new_cover": "Кидай новую обложку",
         "cover_updated": "✅",
         
+        # Batch MP3 Tools
+        "batch_send": (
+            "🎵 <b>Пакетный режим</b>\n\n"
+            "Кидай MP3 файлы (можно альбомом), затем /done"
+        ),
+        "batch_empty": "❌ Сначала отправь MP3 файлы",
+        "batch_too_many": "❌ Слишком много файлов",
+        "batch_cover": "🖼 Кидай обложку для всех файлов или /skip",
+        "batch_template": (
+            "✏️ Теги для всех файлов, по одному на строку:\n\n"
+            "<code>album: Название альбома\n"
+            "artist: Исполнитель\n"
+            "genre: Жанр\n"
+            "date: 2024</code>\n\n"
+            "Номера треков ставятся по порядку файлов. /skip — без тегов"
+        ),
+        "batch_processing": "⏳ Обрабатываю файлы...",
+        "batch_no_track": "❌ Номера треков ставятся сами, убери строку track",
+        "batch_untagged": "⚠️ Не удалось обработать файлов",
+        
         # Errors
         "file_not_found": "Файл не найден",
         "file_deleted": "Файл удалён",
@@ -114,6 +137,7 @@ TRANSLATIONS = {
             "▸ <b>Commands:</b>\n"
             "  /search — search on SoundCloud\n"
             "  /mp3tools — MP3 tag editor\n"
+            "  /mp3batch — tag and cover many files at once\n"
             "  /history — download history\n"
             "  /lang — change language\n\n"
             "▸ <b>Supported links:</b>\n"
@@ -130,10 +154,12 @@ TRANSLATIONS = {
         "format_choice": "🎵 or 🎬 ?",
         "link_expired": "Link expired",
         "edit_prompt": "✏️ Edit?",
+        "board_partial": "⚠️ Some pins could not be downloaded",
         
         # MP3 Tools
         "mp3tools_send": "🎵 Send MP3",
         "mp3tools_send_file": "❌ Send an MP3 file",
+        "file_too_big": "❌ File is too big",
         "loading": "⏳",
         "sending": "⏳",
         
@@ -156,6 +182,26 @@ TRANSLATIONS = {
         "send_new_cover": "Send new cover",
         "cover_updated": "✅",
         
+        # Batch MP3 Tools
+        "batch_send": (
+            "🎵 <b>Batch mode</b>\n\n"
+            "Send MP3 files (an album works), then /done"
+        ),
+        "batch_empty": "❌ Send MP3 files first",
+        "batch_too_many": "❌ Too many files",
+        "batch_cover": "🖼 Send a cover for all files or /skip",
+        "batch_template": (
+            "✏️ Tags for all files, one per line:\n\n"
+            "<code>album: Album name\n"
+            "artist: Artist\n"
+            "genre: Genre\n"
+            "date: 2024</code>\n\n"
+            "Track numbers follow the file order. /skip — no tags"
+        ),
+        "batch_processing": "⏳ Processing files...",
+        "batch_no_track": "❌ Track numbers are set per file, remove the track line",
+        "batch_untagged": "⚠️ Files that could not be tagged",
+        
         # Errors
         "file_not_found": "File not found",
         "file_deleted": "File deleted",
@@ -1,8 +1,72 @@
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Optional
 import re
+import shutil
+import uuid
+
+from app.config import config
+from app.services.janitor import janitor, job_dir_of, JOBS_DIR
+
+# Called by downloaders as bytes arrive: (downloaded_bytes, total_bytes or None)
+ProgressCallback = Callable[[int, Optional[int]], None]
+
+CHUNK_SIZE = 64 * 1024
+
+SIZE_LIMIT_ERROR = f"File exceeds {config.MAX_FILE_SIZE // (1024 * 1024)} MB limit"
+SOURCE_SIZE_PREFIX = "Source exceeds"
+
+
+def source_size_error(limit: int) -> str:
+    """Rejection of a source over `limit`, naming that limit rather than the upload one."""
+    if limit == config.MAX_FILE_SIZE:
+        return SIZE_LIMIT_ERROR
+    return f"{SOURCE_SIZE_PREFIX} {limit // (1024 * 1024)} MB limit"
+
+
+SOURCE_SIZE_ERROR = source_size_error(config.MAX_SOURCE_SIZE)
+
+# Permanent failures: retrying the same URL soon won't help
+PRIVATE_ERROR = "Content is private"
+NOT_FOUND_ERROR = "Content not found"
+LOGIN_ERROR = "Login required"
+
+# The backend answered, the content just can't be served: not a sign of an outage
+CONTENT_ERRORS = (PRIVATE_ERROR, NOT_FOUND_ERROR, LOGIN_ERROR, SIZE_LIMIT_ERROR, SOURCE_SIZE_ERROR)
+
+
+def is_content_error(error: str) -> bool:
+    """CONTENT_ERRORS, plus source-size rejections at a caller's own limit."""
+    return error in CONTENT_ERRORS or error.startswith(SOURCE_SIZE_PREFIX)
+
+
+def new_job_dir() -> Path:
+    """
+    Private scratch directory for one job, claimed from the janitor until
+    remove_job_files() deletes it whole.
+    """
+    if janitor.low_on_space():
+        janitor.wake()
+    job_dir = JOBS_DIR / uuid.uuid4().hex
+    job_dir.mkdir(parents=True)
+    janitor.claim(job_dir)
+    return job_dir
+
+
+def remove_job_files(path: Optional[Path]) -> None:
+    """
+    Delete a job's output: the whole job directory (partial downloads, thumbnails,
+    intermediates) when `path` is one or lives in one, else just the file.
+    """
+    if not path:
+        return
+    job_dir = job_dir_of(path)
+    if job_dir:
+        janitor.release(job_dir)
+        shutil.rmtree(job_dir, ignore_errors=True)
+    else:
+        path.unlink(missing_ok=True)
 
 
 @dataclass
@@ -15,6 +79,10 @@ class MediaResult:
     media_type: str = "audio"
     error: Optional[str] = None
     extra_files: Optional[list[Path]] = None
+    audio_profile: Optional[str] = None  # Encoding used, e.g. "mp3 V0" or "mp3 192k"
+    thumbnail: Optional[bytes] = None  # 320x320 JPEG for Telegram, made from the cover art
+    negative_cached: bool = False  # Failure replayed from the negative cache, nothing was fetched
+    unavailable: bool = False  # Rejected by an open circuit breaker, nothing was fetched
 
 
 class BaseDownloader(ABC):
@@ -26,13 +94,42 @@ class BaseDownloader(ABC):
         return bool(re.match(cls.URL_PATTERN, url.strip()))
     
     @abstractmethod
-    async def download(self, url: str, media_type: str = "audio") -> MediaResult:
+    async def download(
+        self,
+        url: str,
+        media_type: str = "audio",
+        progress: Optional[ProgressCallback] = None
+    ) -> MediaResult:
         pass
     
+    @staticmethod
+    async def stream_to_file(resp, file_path: Path, progress: Optional[ProgressCallback] = None) -> Optional[str]:
+        """
+        Write an aiohttp response body to file_path chunk by chunk.
+        Returns an error message, or None on success.
+        """
+        total = resp.content_length
+        if total and total > config.MAX_FILE_SIZE:
+            return SIZE_LIMIT_ERROR
+        
+        downloaded = 0
+        with open(file_path, "wb") as f:
+            async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+                downloaded += len(chunk)
+                if downloaded > config.MAX_FILE_SIZE:
+                    break
+                f.write(chunk)
+                if progress:
+                    progress(downloaded, total)
+        
+        if downloaded > config.MAX_FILE_SIZE:
+            file_path.unlink(missing_ok=True)
+            return SIZE_LIMIT_ERROR
+        return None
+    
     @staticmethod
     async def cleanup(file_path: Optional[Path]) -> None:
         try:
-            if file_path and file_path.exists():
-                file_path.unlink()
+            remove_job_files(file_path)
         except Exception:
             pass
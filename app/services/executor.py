@@ -0,0 +1,110 @@
+"""Dedicated executor for CPU-bound media post-processing (Pillow, mutagen)."""
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Optional, TypeVar
+
+from app.config import config
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+SLOW_TASK_SECONDS = 2.0
+
+
+def _timed(func: Callable[..., T], *args: Any) -> tuple[T, float, float]:
+    """Run func in the worker and report (result, start wall time, run seconds)."""
+    started = time.time()
+    result = func(*args)
+    return result, started, time.time() - started
+
+
+class CPUExecutor:
+    """
+    Keeps media work off asyncio's default executor, so a burst of cover edits
+    can't starve other `to_thread` users (DNS, file I/O, ...).
+
+    `run()` always uses the sized thread pool: mutagen sessions live in this process.
+    `run_isolated()` uses a process pool when CPU_EXECUTOR=process (Pillow's
+    Python-side work is GIL-bound); its func and args must be picklable.
+    """
+
+    def __init__(self, kind: str, workers: int):
+        self.kind = kind
+        self.workers = workers
+        self._threads: Optional[ThreadPoolExecutor] = None
+        self._processes: Optional[ProcessPoolExecutor] = None
+
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.total_wait = 0.0
+        self.total_run = 0.0
+        self.max_run = 0.0
+
+    def _thread_pool(self) -> ThreadPoolExecutor:
+        if self._threads is None:
+            self._threads = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="cpu")
+        return self._threads
+
+    def _process_pool(self) -> ProcessPoolExecutor:
+        if self._processes is None:
+            self._processes = ProcessPoolExecutor(max_workers=self.workers)
+        return self._processes
+
+    async def _submit(self, pool: Executor, func: Callable[..., T], *args: Any) -> T:
+        loop = asyncio.get_running_loop()
+        submitted = time.time()
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            result, started, run_time = await loop.run_in_executor(pool, partial(_timed, func, *args))
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.in_flight -= 1
+
+        self.completed += 1
+        self.total_wait += max(0.0, started - submitted)
+        self.total_run += run_time
+        self.max_run = max(self.max_run, run_time)
+        if run_time > SLOW_TASK_SECONDS:
+            logger.warning(f"Slow CPU task {getattr(func, '__name__', func)}: {run_time:.2f}s")
+        return result
+
+    async def run(self, func: Callable[..., T], *args: Any) -> T:
+        return await self._submit(self._thread_pool(), func, *args)
+
+    async def run_isolated(self, func: Callable[..., T], *args: Any) -> T:
+        pool = self._process_pool() if self.kind == "process" else self._thread_pool()
+        return await self._submit(pool, func, *args)
+
+    def stats(self) -> dict:
+        done = self.completed or 1
+        return {
+            "kind": self.kind,
+            "workers": self.workers,
+            "in_flight": self.in_flight,
+            "queued": max(0, self.in_flight - self.workers),
+            "max_in_flight": self.max_in_flight,
+            "completed": self.completed,
+            "failed": self.failed,
+            "avg_wait_ms": round(self.total_wait / done * 1000, 1),
+            "avg_run_ms": round(self.total_run / done * 1000, 1),
+            "max_run_ms": round(self.max_run * 1000, 1),
+        }
+
+    def shutdown(self) -> None:
+        if self._threads:
+            self._threads.shutdown(wait=False, cancel_futures=True)
+        if self._processes:
+            self._processes.shutdown(wait=False, cancel_futures=True)
+
+
+cpu_executor = CPUExecutor(config.CPU_EXECUTOR, config.CPU_WORKERS or os.cpu_count() or 2)
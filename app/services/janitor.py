@@ -0,0 +1,246 @@
+"""Background janitor for DOWNLOAD_DIR: job ownership, TTL sweeps and a disk budget."""
+import asyncio
+import logging
+import os
+import re
+import shutil
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Optional
+
+from app.config import config
+
+logger = logging.getLogger(__name__)
+
+# Every download writes into its own directory under here
+JOBS_DIR = config.DOWNLOAD_DIR / "jobs"
+
+MB = 1024 * 1024
+
+# Files the bot wrote to the top of DOWNLOAD_DIR before per-job directories:
+# "<uuid8>_<title>.<ext>" (yt-dlp, TikTok, Pinterest, plus .part / .fit leftovers),
+# MP3 tools uploads and batches, Yandex Music tracks. Anything else there is not ours.
+LEGACY_FILE_PATTERN = re.compile(
+    r"^(?:[0-9a-f]{8}_.+|mp3tools_[0-9a-f]{8}\.mp3|mp3batch_[0-9a-f]{8}\.mp3|ym_\d+_.+\.mp3)$"
+)
+
+
+def job_dir_of(path: Path) -> Optional[Path]:
+    """The job directory `path` is or lives in, if any."""
+    job_dir = path if path.parent == JOBS_DIR else path.parent
+    return job_dir if job_dir.parent == JOBS_DIR else None
+
+
+@dataclass
+class Claim:
+    expires: float
+    on_expire: Optional[Callable[[], None]] = None
+    # Parked files (waiting on the user) may go under disk pressure; running jobs never do
+    evictable: bool = False
+
+
+@dataclass
+class _Entry:
+    path: Path
+    mtime: float
+    size: int
+
+
+def _tree_size(path: Path) -> int:
+    if not path.is_dir():
+        return path.lstat().st_size
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def _is_ours(path: Path) -> bool:
+    if path.parent == JOBS_DIR:
+        return True
+    # DOWNLOAD_DIR may be shared: at its top level only legacy bot files are touched
+    return path.is_file() and not path.is_symlink() and LEGACY_FILE_PATTERN.match(path.name) is not None
+
+
+def _scan() -> list[_Entry]:
+    """Job directories plus legacy bot files at the top of DOWNLOAD_DIR. Blocking."""
+    entries = []
+    for parent in (config.DOWNLOAD_DIR, JOBS_DIR):
+        if not parent.is_dir():
+            continue
+        for path in parent.iterdir():
+            if path == JOBS_DIR or not _is_ours(path):
+                continue
+            try:
+                entries.append(_Entry(path, path.lstat().st_mtime, _tree_size(path)))
+            except OSError:
+                continue
+    return entries
+
+
+def _remove(paths: list[Path]) -> None:
+    for path in paths:
+        if path.is_dir() and not path.is_symlink():
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            path.unlink(missing_ok=True)
+
+
+class Janitor:
+    """
+    Job directories are claimed while in use (downloads, files parked for MP3 tools)
+    and released on cleanup. Each sweep removes expired claims, unclaimed leftovers
+    (crashes, killed processes) older than ORPHAN_TTL, and - when DOWNLOAD_DIR is over
+    budget or the disk is short on free space - the oldest evictable entries.
+    Only JOBS_DIR and legacy bot files are ever considered; other entries in
+    DOWNLOAD_DIR are left alone.
+    """
+
+    def __init__(self, interval: int, job_ttl: int, orphan_ttl: int, max_bytes: int, min_free: int):
+        self.interval = interval
+        self.job_ttl = job_ttl
+        self.orphan_ttl = orphan_ttl
+        self.max_bytes = max_bytes
+        self.min_free = min_free
+        self._claims: dict[Path, Claim] = {}
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.sweeps = 0
+        self.reclaimed_bytes = 0
+        self.reclaimed_entries = 0
+        self.expired_claims = 0
+        self.pressure_evictions = 0
+        self.dir_bytes = 0
+
+    def claim(
+        self,
+        path: Path,
+        ttl: Optional[int] = None,
+        on_expire: Optional[Callable[[], None]] = None,
+        evictable: bool = False
+    ) -> None:
+        """Protect the job directory holding `path` for `ttl` seconds; re-claiming replaces the claim."""
+        job_dir = job_dir_of(path)
+        if job_dir:
+            self._claims[job_dir] = Claim(time.monotonic() + (ttl or self.job_ttl), on_expire, evictable)
+
+    def release(self, path: Path) -> None:
+        job_dir = job_dir_of(path)
+        if job_dir:
+            self._claims.pop(job_dir, None)
+
+    def low_on_space(self) -> bool:
+        try:
+            return bool(self.min_free) and shutil.disk_usage(config.DOWNLOAD_DIR).free < self.min_free
+        except OSError:
+            return False
+
+    def wake(self) -> None:
+        """Run a sweep now instead of waiting for the next interval."""
+        self._wakeup.set()
+
+    async def sweep(self) -> int:
+        """One pass over DOWNLOAD_DIR. Returns bytes reclaimed."""
+        entries = await asyncio.to_thread(_scan)
+        now = time.monotonic()
+        now_wall = time.time()
+
+        victims: list[_Entry] = []
+        kept: list[_Entry] = []
+        for entry in entries:
+            claim = self._claims.get(entry.path)
+            if claim is None:
+                expired = now_wall - entry.mtime > self.orphan_ttl
+            else:
+                expired = claim.expires < now
+                self.expired_claims += expired
+            (victims if expired else kept).append(entry)
+
+        # Over budget: evict oldest first, skipping jobs that are running
+        need = 0
+        if self.max_bytes:
+            need = sum(e.size for e in kept) - self.max_bytes
+        if self.min_free:
+            free = (await asyncio.to_thread(shutil.disk_usage, config.DOWNLOAD_DIR)).free
+            need = max(need, self.min_free - free - sum(e.size for e in victims))
+        if need > 0:
+            for entry in sorted(kept, key=lambda e: e.mtime):
+                claim = self._claims.get(entry.path)
+                if claim and not claim.evictable:
+                    continue
+                victims.append(entry)
+                self.pressure_evictions += 1
+                need -= entry.size
+                if need <= 0:
+                    break
+            if need > 0:
+                logger.warning(f"Janitor: still {need // MB} MB over the disk budget, only running jobs left")
+
+        for entry in victims:
+            claim = self._claims.pop(entry.path, None)
+            if claim and claim.on_expire:
+                try:
+                    claim.on_expire()
+                except Exception as e:
+                    logger.warning(f"Janitor: expiry callback for {entry.path.name} failed: {e}")
+        await asyncio.to_thread(_remove, [e.path for e in victims])
+
+        reclaimed = sum(e.size for e in victims)
+        victim_paths = {e.path for e in victims}
+        self.dir_bytes = sum(e.size for e in entries if e.path not in victim_paths)
+        self.sweeps += 1
+        self.reclaimed_bytes += reclaimed
+        self.reclaimed_entries += len(victims)
+        if victims:
+            logger.info(f"Janitor: removed {len(victims)} entries, {reclaimed // 1024} KB reclaimed")
+        return reclaimed
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.error(f"Janitor sweep failed: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "claimed": len(self._claims),
+            "dir_mb": round(self.dir_bytes / MB, 1),
+            "sweeps": self.sweeps,
+            "reclaimed_mb": round(self.reclaimed_bytes / MB, 1),
+            "reclaimed_entries": self.reclaimed_entries,
+            "expired_claims": self.expired_claims,
+            "pressure_evictions": self.pressure_evictions,
+        }
+
+
+janitor = Janitor(
+    interval=config.JANITOR_INTERVAL,
+    job_ttl=config.JOB_TTL,
+    orphan_ttl=config.ORPHAN_TTL,
+    max_bytes=config.DOWNLOAD_DIR_MAX_MB * MB,
+    min_free=config.DISK_MIN_FREE_MB * MB
+)
@@ -0,0 +1,39 @@
+"""Recent request latencies per backend, for adaptive hedging delays and timeouts."""
+from collections import deque
+from typing import Optional
+
+# Too few samples make percentiles noise; callers fall back to their default
+MIN_SAMPLES = 5
+
+
+class LatencyTracker:
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples: dict[str, deque[float]] = {}
+
+    def record(self, backend: str, seconds: float) -> None:
+        samples = self._samples.get(backend)
+        if samples is None:
+            samples = self._samples[backend] = deque(maxlen=self.window)
+        samples.append(seconds)
+
+    def percentile(self, backend: str, q: float, default: Optional[float] = None) -> Optional[float]:
+        """q-th quantile (0..1) of the recent latencies, or `default` while there is too little data."""
+        samples = self._samples.get(backend)
+        if not samples or len(samples) < MIN_SAMPLES:
+            return default
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def stats(self) -> dict:
+        return {
+            backend: {
+                "samples": len(samples),
+                "p50": round(self.percentile(backend, 0.5, 0), 3),
+                "p90": round(self.percentile(backend, 0.9, 0), 3),
+            }
+            for backend, samples in self._samples.items()
+        }
+
+
+latency = LatencyTracker()
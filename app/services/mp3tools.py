@@ -1,12 +1,15 @@
+import asyncio
+import logging
 from pathlib import Path
 from typing import Optional
 from dataclasses import dataclass
-import asyncio
-from io import BytesIO
 
-from mutagen.mp3 import MP3
 from mutagen.id3 import ID3, TIT2, TPE1, TALB, TCON, TDRC, TRCK, APIC, ID3NoHeaderError
-from PIL import Image
+
+from app.services.executor import cpu_executor
+from app.services.thumbnails import get_thumbnail
+
+logger = logging.getLogger(__name__)
 
 
 @dataclass
@@ -19,155 +22,234 @@ class MP3Tags:
     track: Optional[str] = None
 
 
+# Frame IDs for MP3Tags fields
+TAG_FRAMES = {
+    "title": TIT2,
+    "artist": TPE1,
+    "album": TALB,
+    "genre": TCON,
+    "date": TDRC,
+    "track": TRCK,
+}
+
+
+def _padding(info) -> int:
+    """
+    Padding strategy for ID3 saves: never shrink existing padding (that would rewrite
+    the audio), and when the tag grows reserve room for later edits to fit in place.
+    """
+    if info.padding >= 0:
+        return info.padding
+    return 64 * 1024
+
+
+class MP3EditSession:
+    """
+    ID3 tag of one MP3, parsed once. Tag and art edits stay in memory until
+    `commit()`, which writes everything with a single padding-aware save.
+    Methods are synchronous and cheap except `load()` and `commit()`.
+    """
+    
+    def __init__(self, file_path: Path, id3: ID3):
+        self.file_path = file_path
+        self._id3 = id3
+        self.dirty = False
+    
+    @classmethod
+    def load(cls, file_path: Path) -> "MP3EditSession":
+        try:
+            id3 = ID3(file_path)
+        except ID3NoHeaderError:
+            id3 = ID3()
+        return cls(file_path, id3)
+    
+    def get_tags(self) -> MP3Tags:
+        return MP3Tags(**{
+            field: str(self._id3.get(frame.__name__, "")) or None
+            for field, frame in TAG_FRAMES.items()
+        })
+    
+    def set_tags(self, tags: MP3Tags) -> None:
+        """Set the non-empty fields of `tags`; other frames are kept."""
+        for field, frame in TAG_FRAMES.items():
+            value = getattr(tags, field)
+            if value:
+                self._id3[frame.__name__] = frame(encoding=3, text=value)
+                self.dirty = True
+    
+    def get_album_art(self) -> Optional[bytes]:
+        frames = self._id3.getall("APIC")
+        return frames[0].data if frames else None
+    
+    def set_album_art(self, image_data: bytes, mime_type: str = "image/jpeg") -> None:
+        self._id3.delall("APIC")
+        self._id3.add(APIC(
+            encoding=3,
+            mime=mime_type,
+            type=3,  # Front cover
+            desc="Cover",
+            data=image_data
+        ))
+        self.dirty = True
+    
+    def delete_album_art(self) -> None:
+        if self._id3.getall("APIC"):
+            self._id3.delall("APIC")
+            self.dirty = True
+    
+    def commit(self) -> None:
+        """Write pending changes (no-op if nothing changed)."""
+        if not self.dirty:
+            return
+        self._id3.save(self.file_path, v2_version=3, padding=_padding)
+        self.dirty = False
+
+
 class MP3ToolsService:
     """Service for editing MP3 tags and album art."""
     
+    @staticmethod
+    async def open_session(file_path: Path) -> MP3EditSession:
+        """Parse the file's ID3 tag once for a series of edits."""
+        return await cpu_executor.run(MP3EditSession.load, file_path)
+    
+    @staticmethod
+    async def commit(session: MP3EditSession) -> bool:
+        """Write all pending edits of a session in one save."""
+        try:
+            await cpu_executor.run(session.commit)
+            return True
+        except Exception as e:
+            logger.warning(f"Saving tags to {session.file_path.name} failed: {e}")
+            return False
+    
     @staticmethod
     async def get_tags(file_path: Path) -> MP3Tags:
         """Extract tags from MP3 file."""
-        def _get_tags():
-            try:
-                audio = MP3(file_path)
-                tags = audio.tags
-                if not tags:
-                    return MP3Tags()
-                
-                return MP3Tags(
-                    title=str(tags.get("TIT2", "")) or None,
-                    artist=str(tags.get("TPE1", "")) or None,
-                    album=str(tags.get("TALB", "")) or None,
-                    genre=str(tags.get("TCON", "")) or None,
-                    date=str(tags.get("TDRC", "")) or None,
-                    track=str(tags.get("TRCK", "")) or None,
-                )
-            except Exception:
-                return MP3Tags()
-        
-        return await asyncio.to_thread(_get_tags)
+        try:
+            session = await MP3ToolsService.open_session(file_path)
+            return session.get_tags()
+        except Exception:
+            return MP3Tags()
     
     @staticmethod
     async def set_tags(file_path: Path, tags: MP3Tags) -> bool:
         """Set tags on MP3 file."""
         def _set_tags():
-            try:
-                try:
-                    audio = ID3(file_path)
-                except ID3NoHeaderError:
-                    audio = ID3()
-                
-                if tags.title:
-                    audio["TIT2"] = TIT2(encoding=3, text=tags.title)
-                if tags.artist:
-                    audio["TPE1"] = TPE1(encoding=3, text=tags.artist)
-                if tags.album:
-                    audio["TALB"] = TALB(encoding=3, text=tags.album)
-                if tags.genre:
-                    audio["TCON"] = TCON(encoding=3, text=tags.genre)
-                if tags.date:
-                    audio["TDRC"] = TDRC(encoding=3, text=tags.date)
-                if tags.track:
-                    audio["TRCK"] = TRCK(encoding=3, text=tags.track)
-                
-                audio.save(file_path)
-                return True
-            except Exception:
-                return False
+            session = MP3EditSession.load(file_path)
+            session.set_tags(tags)
+            session.commit()
         
-        return await asyncio.to_thread(_set_tags)
+        try:
+            await cpu_executor.run(_set_tags)
+            return True
+        except Exception:
+            return False
     
     @staticmethod
     async def get_album_art(file_path: Path) -> Optional[bytes]:
         """Extract album art from MP3 file."""
-        def _get_art():
-            try:
-                audio = MP3(file_path)
-                tags = audio.tags
-                if not tags:
-                    return None
-                
-                for key in tags.keys():
-                    if key.startswith("APIC"):
-                        return tags[key].data
-                return None
-            except Exception:
-                return None
-        
-        return await asyncio.to_thread(_get_art)
+        try:
+            session = await MP3ToolsService.open_session(file_path)
+            return session.get_album_art()
+        except Exception:
+            return None
     
     @staticmethod
     async def set_album_art(file_path: Path, image_data: bytes, mime_type: str = "image/jpeg") -> bool:
         """Set album art on MP3 file."""
         def _set_art():
-            try:
-                from mutagen.mp3 import MP3
-                
-                # Ensure file has ID3 tags
-                audio_file = MP3(file_path)
-                if audio_file.tags is None:
-                    audio_file.add_tags()
-                    audio_file.save()
-                
-                # Now load ID3 and add artwork
-                audio = ID3(file_path)
-                
-                # Remove existing album art
-                audio.delall("APIC")
-                
-                # Add new album art
-                audio["APIC"] = APIC(
-                    encoding=3,
-                    mime=mime_type,
-                    type=3,  # Front cover
-                    desc="Cover",
-                    data=image_data
-                )
-                
-                audio.save(file_path, v2_version=3)
-                return True
-            except Exception as e:
-                print(f"Error setting album art: {e}")
-                return False
+            session = MP3EditSession.load(file_path)
+            session.set_album_art(image_data, mime_type)
+            session.commit()
         
-        return await asyncio.to_thread(_set_art)
+        try:
+            await cpu_executor.run(_set_art)
+            return True
+        except Exception as e:
+            logger.warning(f"Setting album art on {file_path.name} failed: {e}")
+            return False
     
     @staticmethod
     async def delete_album_art(file_path: Path) -> bool:
         """Delete album art from MP3 file."""
         def _delete_art():
-            try:
-                audio = ID3(file_path)
-                audio.delall("APIC")
-                audio.save(file_path)
-                return True
-            except Exception:
-                return False
+            session = MP3EditSession.load(file_path)
+            session.delete_album_art()
+            session.commit()
         
-        return await asyncio.to_thread(_delete_art)
+        try:
+            await cpu_executor.run(_delete_art)
+            return True
+        except Exception:
+            return False
     
     @staticmethod
     async def get_thumbnail_for_telegram(file_path: Path) -> Optional[bytes]:
         """Get album art resized for Telegram (320x320 JPEG)."""
-        def _get_thumb():
-            try:
-                audio = ID3(file_path)
-                for key in audio.keys():
-                    if key.startswith("APIC"):
-                        img_data = audio[key].data
-                        
-                        # Open and resize image
-                        img = Image.open(BytesIO(img_data))
-                        img = img.convert("RGB")  # Ensure RGB for JPEG
-                        img.thumbnail((320, 320), Image.Resampling.LANCZOS)
-                        
-                        # Save as JPEG
-                        output = BytesIO()
-                        img.save(output, format="JPEG", quality=85)
-                        return output.getvalue()
-                return None
-            except Exception:
-                return None
+        art = await MP3ToolsService.get_album_art(file_path)
+        if not art:
+            return None
+        return await get_thumbnail(art)
+    
+    @staticmethod
+    async def get_session_thumbnail(session: MP3EditSession) -> Optional[bytes]:
+        """Telegram thumbnail from a session's (possibly uncommitted) cover."""
+        art = session.get_album_art()
+        if not art:
+            return None
+        return await get_thumbnail(art)
+    
+    @staticmethod
+    def _apply_edits(
+        file_path: Path,
+        tags: MP3Tags,
+        cover: Optional[bytes],
+        default_title: Optional[str]
+    ) -> MP3Tags:
+        """Load, edit and save one file in a single pass. Blocking."""
+        session = MP3EditSession.load(file_path)
+        if default_title and not session.get_tags().title:
+            session.set_tags(MP3Tags(title=default_title))
+        session.set_tags(tags)
+        if cover:
+            session.set_album_art(cover)
+        session.commit()
+        return session.get_tags()
+    
+    @staticmethod
+    async def tag_many(
+        items: list[tuple[Path, MP3Tags, Optional[str]]],
+        cover: Optional[bytes] = None
+    ) -> list[Optional[MP3Tags]]:
+        """
+        Apply (file_path, tags, default_title) edits to many files in parallel on the CPU pool.
+        Returns the resulting tags per file, None where the edit failed.
+        """
+        results = await asyncio.gather(
+            *(
+                cpu_executor.run(MP3ToolsService._apply_edits, file_path, tags, cover, default_title)
+                for file_path, tags, default_title in items
+            ),
+            return_exceptions=True
+        )
+        return [None if isinstance(r, BaseException) else r for r in results]
+    
+    @staticmethod
+    def parse_tags_template(text: str) -> MP3Tags:
+        """Parse "key: value" lines (title, artist, album, genre, date, track)."""
+        tags = MP3Tags()
+        for line in text.strip().split("\n"):
+            if ":" not in line:
+                continue
+            key, value = line.split(":", 1)
+            key = key.strip().lower()
+            value = value.strip()
+            
+            if key in TAG_FRAMES:
+                setattr(tags, key, value)
         
-        return await asyncio.to_thread(_get_thumb)
+        return tags
     
     @staticmethod
     def parse_tags_input(text: str) -> MP3Tags:
@@ -185,28 +267,7 @@ class MP3ToolsService:
             return MP3Tags(title=parts[0].strip(), artist=parts[1].strip())
         
         # Advanced format
-        tags = MP3Tags()
-        for line in lines:
-            if ":" not in line:
-                continue
-            key, value = line.split(":", 1)
-            key = key.strip().lower()
-            value = value.strip()
-            
-            if key == "title":
-                tags.title = value
-            elif key == "artist":
-                tags.artist = value
-            elif key == "album":
-                tags.album = value
-            elif key == "genre":
-                tags.genre = value
-            elif key == "date":
-                tags.date = value
-            elif key == "track":
-                tags.track = value
-        
-        return tags
+        return MP3ToolsService.parse_tags_template(text)
 
 
 mp3tools = MP3ToolsService()
@@ -0,0 +1,73 @@
+"""Remembers URLs that failed permanently so repeats skip yt-dlp and the network."""
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from app.config import config
+from app.database import canonicalize_url
+from app.services.base import PRIVATE_ERROR, NOT_FOUND_ERROR, LOGIN_ERROR
+
+# Error class -> seconds to remember it. Login walls and privacy settings change
+# more often than deletions, so they expire sooner.
+NEGATIVE_TTLS = {
+    PRIVATE_ERROR: config.NEGATIVE_TTL_PRIVATE,
+    NOT_FOUND_ERROR: config.NEGATIVE_TTL_NOT_FOUND,
+    LOGIN_ERROR: config.NEGATIVE_TTL_LOGIN,
+}
+
+
+class NegativeCache:
+    def __init__(self, ttls: dict[str, int], max_entries: int):
+        self.ttls = ttls
+        self.max_entries = max_entries
+        # canonical url -> (expires, error)
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self.hits = 0
+        self.stored = 0
+        self.purged = 0
+
+    def get(self, url: str) -> Optional[str]:
+        """Cached error for URL, if it is still fresh."""
+        key = canonicalize_url(url)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, error = entry
+        if expires < time.monotonic():
+            del self._entries[key]
+            return None
+        self.hits += 1
+        return error
+
+    def put(self, url: str, error: Optional[str]) -> None:
+        """Remember the failure if its error class is permanent."""
+        ttl = self.ttls.get(error or "")
+        if not ttl:
+            return
+        key = canonicalize_url(url)
+        self._entries[key] = (time.monotonic() + ttl, error)
+        self._entries.move_to_end(key)
+        self.stored += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def purge(self, url: Optional[str] = None) -> int:
+        """Drop one URL, or everything when url is None. Returns entries removed."""
+        if url is None:
+            removed = len(self._entries)
+            self._entries.clear()
+        else:
+            removed = 1 if self._entries.pop(canonicalize_url(url), None) else 0
+        self.purged += removed
+        return removed
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "stored": self.stored,
+            "purged": self.purged,
+        }
+
+
+negative_cache = NegativeCache(NEGATIVE_TTLS, config.NEGATIVE_CACHE_SIZE)
@@ -0,0 +1,50 @@
+"""Media URLs extracted from Pinterest pin pages, by pin ID, so repeat pins skip the page fetch."""
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from app.config import config
+
+
+@dataclass
+class PinMedia:
+    image_url: Optional[str]
+    video_url: Optional[str]
+    title: str
+
+
+class PinCache:
+    def __init__(self, ttl: int, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # pin id -> (expires, media)
+        self._entries: OrderedDict[str, tuple[float, PinMedia]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, pin_id: str) -> Optional[PinMedia]:
+        entry = self._entries.get(pin_id)
+        if entry is None or entry[0] < time.monotonic():
+            self._entries.pop(pin_id, None)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(pin_id)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, pin_id: str, media: PinMedia) -> None:
+        self._entries[pin_id] = (time.monotonic() + self.ttl, media)
+        self._entries.move_to_end(pin_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+pin_cache = PinCache(config.PINTEREST_CACHE_TTL, config.PINTEREST_CACHE_SIZE)
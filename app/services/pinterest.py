@@ -1,17 +1,119 @@
 import asyncio
+import codecs
+import json
 import re
-import uuid
+import time
 import aiohttp
-from pathlib import Path
-from typing import Optional
+from typing import AsyncIterator, Optional
 
-from app.services.base import BaseDownloader, MediaResult
+from app.services.base import (
+    BaseDownloader, MediaResult, ProgressCallback, CHUNK_SIZE, NOT_FOUND_ERROR, new_job_dir, remove_job_files
+)
+from app.services.http import get_session
+from app.services.pin_cache import PinMedia, pin_cache
+from app.services.resilience import resilience
 from app.config import config
 
+PINTEREST_BASE = "https://www.pinterest.com"
+PINTEREST_DOMAINS = r"pinterest\.(?:com|co\.uk|de|fr|es|it|ca|au|jp|kr|se|nz|at|ch|pt|ie|co|cl|mx|dk|no|be|fi|nl|pl|cz)"
+
+PIN_ID_PATTERN = re.compile(r"/pin/([\w-]+)")
+# pinterest.com/<user>/<board>/ - top-level paths that are not usernames and profile
+# tabs that are not boards are excluded; the URL may be followed by punctuation
+BOARD_PATTERN = (
+    r"https?://(?:[a-z]{2}\.)?(?:www\.)?" + PINTEREST_DOMAINS +
+    r"/(?!(?:pin|search|ideas|today|explore|settings|business|_)/)[\w.-]+"
+    r"/(?!(?:_saved|_created|pins|boards|followers|following)(?![\w%-]))[\w%-]+/?(?=$|[\s?#.,;:!)\]'\"])"
+)
+BOARD_PATH_PATTERN = re.compile(r"\.[a-z.]+/([\w.-]+)/([\w%-]+)")
+
+BOARD_PAGE_SIZE = 25
+
+TITLE_PATTERN = re.compile(r'<title>([^<]+)</title>')
+# Videos are preferred over images
+VIDEO_PATTERN = re.compile(r'https://v[^"\s]*\.pinimg\.com/[^"\s]+\.mp4')
+# Pin image candidates, best first: originals, then 1200x / 736x, then any pinimg in JSON
+IMAGE_PATTERNS = (
+    re.compile(r'"url":"(https://i\.pinimg\.com/originals/[^"]+)"'),
+    re.compile(r'"url":"(https://i\.pinimg\.com/(?:1200x|736x)/[^"]+)"'),
+    re.compile(r'"url":"(https://i\.pinimg\.com/[^"]+\.(?:jpg|png|gif|webp))"'),
+)
+
+# Carried over between chunks so matches spanning a chunk boundary are still found
+SCAN_OVERLAP = 4096
+# A pin's own video sits near its image in the page JSON; an .mp4 further on
+# belongs to a related pin, so stop looking this far past the originals image
+VIDEO_LOOKAHEAD = 256 * 1024
+MAX_PAGE_BYTES = 4 * 1024 * 1024
+
+
+class _PageScanner:
+    """Incremental scan of a pin page: each chunk is searched once, plus a short overlap."""
+    
+    def __init__(self):
+        self.title: Optional[str] = None
+        self.video_url: Optional[str] = None
+        self.images: list[Optional[str]] = [None] * len(IMAGE_PATTERNS)
+        self.scanned = 0
+        self._tail = ""
+        self._originals_at: Optional[int] = None
+    
+    def feed(self, text: str) -> None:
+        window = self._tail + text
+        if self.title is None:
+            match = TITLE_PATTERN.search(window)
+            if match:
+                self.title = match.group(1)
+        if self.video_url is None:
+            match = VIDEO_PATTERN.search(window)
+            if match:
+                self.video_url = match.group(0)
+        for i, pattern in enumerate(IMAGE_PATTERNS):
+            if self.images[i] is None:
+                match = pattern.search(window)
+                if match:
+                    self.images[i] = match.group(1)
+                    if i == 0:
+                        self._originals_at = self.scanned
+        self.scanned += len(text)
+        self._tail = window[-SCAN_OVERLAP:]
+    
+    @property
+    def done(self) -> bool:
+        if self.video_url:
+            return True
+        return self._originals_at is not None and self.scanned - self._originals_at > VIDEO_LOOKAHEAD
+    
+    def result(self) -> PinMedia:
+        title = re.sub(r'\s*[-|]\s*Pinterest.*$', '', self.title or "Pinterest").strip()
+        image_url = next((url for url in self.images if url), None)
+        return PinMedia(image_url, self.video_url, title[:80])
+
+
+def pin_url(pin_id: str) -> str:
+    return f"{PINTEREST_BASE}/pin/{pin_id}/"
+
+
+def _pin_media(pin: dict) -> PinMedia:
+    """Media of a pin object from the resource API (same shape the pin page embeds)."""
+    video_url = None
+    videos = ((pin.get("videos") or {}).get("video_list") or {})
+    # Progressive MP4 only (the HLS variants need yt-dlp); widest first
+    mp4s = [v for v in videos.values() if (v.get("url") or "").endswith(".mp4")]
+    if mp4s:
+        video_url = max(mp4s, key=lambda v: v.get("width") or 0)["url"]
+    images = pin.get("images") or {}
+    image = images.get("orig") or images.get("736x") or {}
+    title = pin.get("title") or pin.get("grid_title") or (pin.get("description") or "").strip() or "Pinterest"
+    return PinMedia(image.get("url"), video_url, title[:80])
+
 
 class PinterestDownloader(BaseDownloader):
     PLATFORM = "pinterest"
-    URL_PATTERN = r"https?://(?:[a-z]{2}\.)?(?:www\.)?(?:pinterest\.(?:com|co\.uk|de|fr|es|it|ca|au|jp|kr|se|nz|at|ch|pt|ie|co|cl|mx|dk|no|be|fi|nl|pl|cz)/pin/[\w-]+|pin\.it/[\w]+)"
+    URL_PATTERN = (
+        r"https?://(?:[a-z]{2}\.)?(?:www\.)?(?:" + PINTEREST_DOMAINS + r"/pin/[\w-]+|pin\.it/[\w]+)"
+        r"|" + BOARD_PATTERN
+    )
     
     HEADERS = {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
@@ -19,106 +121,222 @@ class PinterestDownloader(BaseDownloader):
         "Accept-Language": "en-US,en;q=0.5",
     }
     
+    API_HEADERS = {
+        "User-Agent": HEADERS["User-Agent"],
+        "Accept": "application/json, text/javascript, */*, q=0.01",
+        "Accept-Language": "en-US,en;q=0.5",
+        "X-Requested-With": "XMLHttpRequest",
+        "X-Pinterest-AppState": "active",
+    }
+    
+    @staticmethod
+    def is_board(url: str) -> bool:
+        return re.match(BOARD_PATTERN, url) is not None
+    
     async def _resolve_short_url(self, url: str) -> Optional[str]:
         """Resolve pin.it short URL to full Pinterest URL."""
         if "pin.it" in url:
             try:
-                async with aiohttp.ClientSession() as session:
-                    async with session.head(url, headers=self.HEADERS, allow_redirects=True, timeout=10) as resp:
-                        return str(resp.url)
+                async with get_session().head(url, headers=self.HEADERS, allow_redirects=True, timeout=10) as resp:
+                    return str(resp.url)
             except Exception:
                 pass
         return url
     
-    async def _extract_media(self, url: str) -> tuple[Optional[str], Optional[str], str]:
+    async def _scan_page(self, url: str) -> Optional[PinMedia]:
         """
-        Extract media URL from Pinterest page.
-        Returns: (image_url, video_url, title)
+        Stream the pin page through _PageScanner and stop reading as soon as the
+        media is known, instead of loading 1-2 MB of HTML and regex-scanning it whole.
         """
+        start = time.monotonic()
+        scanner = _PageScanner()
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        timeout = aiohttp.ClientTimeout(total=resilience.timeout("pinterest_page", 15))
+        async with get_session().get(url, headers=self.HEADERS, timeout=timeout) as resp:
+            if resp.status != 200:
+                return None
+            read = 0
+            async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+                read += len(chunk)
+                scanner.feed(decoder.decode(chunk))
+                if scanner.done or read >= MAX_PAGE_BYTES:
+                    break
+        resilience.record("pinterest_page", time.monotonic() - start)
+        return scanner.result()
+    
+    async def _extract_media(self, url: str) -> Optional[PinMedia]:
+        """Media URLs and title of a pin, from the cache or its page."""
         try:
             resolved_url = await self._resolve_short_url(url)
+            match = PIN_ID_PATTERN.search(resolved_url)
+            pin_id = match.group(1) if match else None
             
-            async with aiohttp.ClientSession() as session:
-                async with session.get(resolved_url, headers=self.HEADERS, timeout=15) as resp:
-                    if resp.status != 200:
-                        return None, None, ""
-                    
-                    html = await resp.text()
-                    
-                    # Extract title
-                    title_match = re.search(r'<title>([^<]+)</title>', html)
-                    title = title_match.group(1) if title_match else "Pinterest"
-                    title = re.sub(r'\s*[-|]\s*Pinterest.*$', '', title).strip()
-                    
-                    # Find video URLs (check first - videos are preferred)
-                    videos = re.findall(r'https://v[^\"\s]*\.pinimg\.com/[^\"\s]+\.mp4', html)
-                    video_url = videos[0] if videos else None
-                    
-                    # Find main pin image - search in JSON context first
-                    image_url = None
-                    
-                    # Method 1: Look for originals URL in JSON (most reliable)
-                    json_orig = re.search(r'"url":"(https://i\.pinimg\.com/originals/[^"]+)"', html)
-                    if json_orig:
-                        image_url = json_orig.group(1)
-                    
-                    # Method 2: Fallback to 1200x or 736x in JSON
-                    if not image_url:
-                        json_large = re.search(r'"url":"(https://i\.pinimg\.com/(?:1200x|736x)/[^"]+)"', html)
-                        if json_large:
-                            image_url = json_large.group(1)
-                    
-                    # Method 3: Any pinimg in JSON as last resort
-                    if not image_url:
-                        json_any = re.search(r'"url":"(https://i\.pinimg\.com/[^"]+\.(?:jpg|png|gif|webp))"', html)
-                        if json_any:
-                            image_url = json_any.group(1)
-                    
-                    return image_url, video_url, title[:80]
-                    
+            media = pin_cache.get(pin_id) if pin_id else None
+            if media:
+                return media
+            
+            media = await self._scan_page(resolved_url)
+            if media and pin_id and (media.image_url or media.video_url):
+                pin_cache.put(pin_id, media)
+            return media
         except Exception:
-            return None, None, ""
+            return None
+    
+    async def _resource(self, name: str, source_url: str, options: dict) -> dict:
+        """One call to Pinterest's resource API (what the web app itself uses, no auth)."""
+        params = {
+            "source_url": source_url,
+            "data": json.dumps({"options": options, "context": {}}),
+        }
+        timeout = aiohttp.ClientTimeout(total=resilience.timeout("pinterest_api", 15))
+        start = time.monotonic()
+        async with get_session().get(
+            f"{PINTEREST_BASE}/resource/{name}/get/",
+            params=params,
+            headers=self.API_HEADERS,
+            timeout=timeout
+        ) as resp:
+            if resp.status == 404:
+                raise LookupError(NOT_FOUND_ERROR)
+            if resp.status != 200:
+                raise RuntimeError(f"{name}: HTTP {resp.status}")
+            data = await resp.json(content_type=None)
+        resilience.record("pinterest_api", time.monotonic() - start)
+        return data.get("resource_response") or {}
     
-    async def download(self, url: str, media_type: str = "auto") -> MediaResult:
-        image_url, video_url, title = await self._extract_media(url)
+    async def board_pins(self, url: str) -> tuple[list[tuple[str, PinMedia]], str, str]:
+        """
+        Pins of a board, page by page, up to PINTEREST_BOARD_MAX_PINS. Their media
+        comes with the listing, so every pin is also put in pin_cache.
+        Returns: (pins as (pin_id, media), board_name, error_message)
+        """
+        match = BOARD_PATH_PATTERN.search(url)
+        if not match:
+            return [], "", "Not a Pinterest board URL"
+        username, slug = match.groups()
+        source_url = f"/{username}/{slug}/"
         
-        if not image_url and not video_url:
-            return MediaResult(success=False, error="Could not extract media from Pinterest")
+        try:
+            board = (await self._resource(
+                "BoardResource", source_url, {"username": username, "slug": slug, "field_set_key": "detailed"}
+            )).get("data") or {}
+            if not board.get("id"):
+                return [], "", NOT_FOUND_ERROR
+            
+            pins: list[tuple[str, PinMedia]] = []
+            seen: set[str] = set()
+            bookmark = None
+            while len(pins) < config.PINTEREST_BOARD_MAX_PINS:
+                options = {"board_id": board["id"], "page_size": BOARD_PAGE_SIZE}
+                if bookmark:
+                    options["bookmarks"] = [bookmark]
+                page = await self._resource("BoardFeedResource", source_url, options)
+                for pin in page.get("data") or []:
+                    # The feed also carries ads and section stories
+                    if pin.get("type") != "pin" or not pin.get("id") or pin["id"] in seen:
+                        continue
+                    seen.add(pin["id"])
+                    media = _pin_media(pin)
+                    if media.image_url or media.video_url:
+                        pin_cache.put(pin["id"], media)
+                        pins.append((pin["id"], media))
+                bookmark = page.get("bookmark")
+                if not bookmark or bookmark == "-end-" or not page.get("data"):
+                    break
+        except LookupError:
+            return [], "", NOT_FOUND_ERROR
+        except Exception as e:
+            return [], "", f"Board listing failed: {str(e)[:150]}"
+        
+        if not pins:
+            return [], "", "Board has no downloadable pins"
+        return pins[:config.PINTEREST_BOARD_MAX_PINS], board.get("name") or slug, ""
+    
+    async def download_pins(
+        self,
+        pins: list[tuple[str, PinMedia]]
+    ) -> AsyncIterator[tuple[str, MediaResult]]:
+        """
+        Fetch pins concurrently (PINTEREST_BOARD_CONCURRENCY at a time) and yield
+        (pin_id, result) as each one completes. Closing the iterator early cancels
+        the rest and removes any files nobody will see.
+        """
+        limit = asyncio.Semaphore(config.PINTEREST_BOARD_CONCURRENCY)
         
-        # Determine what to download
-        media_url = video_url if video_url else image_url
-        is_video = video_url is not None
+        async def fetch(pin_id: str, media: PinMedia) -> tuple[str, MediaResult]:
+            async with limit:
+                return pin_id, await self._fetch_media(media)
+        
+        tasks = [asyncio.create_task(fetch(pin_id, media)) for pin_id, media in pins]
+        delivered: set[str] = set()
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                pin_id, result = await next_done
+                delivered.add(pin_id)
+                yield pin_id, result
+        finally:
+            for task in tasks:
+                task.cancel()
+            for outcome in await asyncio.gather(*tasks, return_exceptions=True):
+                if isinstance(outcome, tuple) and outcome[0] not in delivered and outcome[1].success:
+                    remove_job_files(outcome[1].file_path)
+    
+    async def download(
+        self,
+        url: str,
+        media_type: str = "auto",
+        progress: Optional[ProgressCallback] = None
+    ) -> MediaResult:
+        if self.is_board(url):
+            return MediaResult(success=False, error="Boards are downloaded pin by pin, see board_pins()")
+        
+        media = await self._extract_media(url)
+        
+        if not media or not (media.image_url or media.video_url):
+            return MediaResult(success=False, error="Could not extract media from Pinterest")
+        return await self._fetch_media(media, progress)
+    
+    async def _fetch_media(self, media: PinMedia, progress: Optional[ProgressCallback] = None) -> MediaResult:
+        """Download a pin's video, or its image when it has none."""
+        media_url = media.video_url or media.image_url
+        is_video = media.video_url is not None
+        title = media.title
+        file_path = None
         
         try:
-            output_dir = config.DOWNLOAD_DIR
-            output_dir.mkdir(parents=True, exist_ok=True)
-            
-            unique_id = uuid.uuid4().hex[:8]
             safe_title = re.sub(r'[^\w\s-]', '', title)[:50] or "pinterest"
             ext = ".mp4" if is_video else ".jpg"
-            file_path = output_dir / f"{unique_id}_{safe_title}{ext}"
+            file_path = new_job_dir() / f"{safe_title}{ext}"
+            start = time.monotonic()
             
-            async with aiohttp.ClientSession() as session:
-                async with session.get(media_url, headers=self.HEADERS, timeout=aiohttp.ClientTimeout(total=60)) as resp:
-                    if resp.status != 200:
-                        return MediaResult(success=False, error=f"Download failed: {resp.status}")
-                    
-                    content = await resp.read()
-                    
-                    if len(content) > config.MAX_FILE_SIZE:
-                        return MediaResult(success=False, error="File exceeds 50 MB limit")
-                    
-                    file_path.write_bytes(content)
-                    
-                    return MediaResult(
-                        success=True,
-                        file_path=file_path,
-                        title=title or "Pinterest",
-                        author="Pinterest",
-                        media_type="video" if is_video else "photo"
-                    )
-                    
+            # Total stays fixed (size varies); only a stalled server is caught early
+            timeout = aiohttp.ClientTimeout(total=60, sock_read=resilience.timeout("pinterest_media", 15))
+            async with get_session().get(media_url, headers=self.HEADERS, timeout=timeout) as resp:
+                resilience.record("pinterest_media", time.monotonic() - start)
+                if resp.status != 200:
+                    remove_job_files(file_path)
+                    return MediaResult(success=False, error=f"Download failed: {resp.status}")
+                
+                error = await self.stream_to_file(resp, file_path, progress)
+                if error:
+                    remove_job_files(file_path)
+                    return MediaResult(success=False, error=error)
+                
+                return MediaResult(
+                    success=True,
+                    file_path=file_path,
+                    title=title or "Pinterest",
+                    author="Pinterest",
+                    media_type="video" if is_video else "photo"
+                )
+                
+        except asyncio.CancelledError:
+            # A closed board download cancels pins mid-fetch
+            remove_job_files(file_path)
+            raise
         except asyncio.TimeoutError:
+            remove_job_files(file_path)
             return MediaResult(success=False, error="Download timed out")
         except Exception as e:
+            remove_job_files(file_path)
             return MediaResult(success=False, error=str(e)[:200])
@@ -0,0 +1,164 @@
+"""Supervisor for yt-dlp / ffmpeg children: process groups, resource limits, guaranteed kill and reap."""
+import asyncio
+import logging
+import os
+import signal
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Optional
+
+from app.config import config
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+POSIX = os.name == "posix"
+WATCH_INTERVAL = 2.0
+MB = 1024 * 1024
+
+PIPE = asyncio.subprocess.PIPE
+DEVNULL = asyncio.subprocess.DEVNULL
+
+
+@dataclass
+class Child:
+    proc: asyncio.subprocess.Process
+    name: str
+    started_at: float = field(default_factory=time.monotonic)
+    reason: Optional[str] = None  # Set when the supervisor killed it for a limit
+
+    @property
+    def limit_error(self) -> Optional[str]:
+        """Why the process died, if it was a resource limit rather than its own failure."""
+        if self.reason:
+            return self.reason
+        sigxcpu = getattr(signal, "SIGXCPU", None)
+        if sigxcpu and self.proc.returncode == -sigxcpu:
+            return "CPU time limit exceeded"
+        return None
+
+
+def _limit_cpu(pid: int, seconds: int) -> None:
+    """
+    Cap a running child's CPU time from the parent (preexec_fn is not safe with
+    threads). Whatever it spawns afterwards, such as yt-dlp's ffmpeg, inherits the cap.
+    """
+    try:
+        # SIGXCPU at the soft limit, SIGKILL at the hard one
+        resource.prlimit(pid, resource.RLIMIT_CPU, (seconds, seconds + 5))
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def _group_rss(pgids: set[int]) -> dict[int, int]:
+    """Resident bytes per process group (yt-dlp plus the ffmpeg it spawns), from /proc. Blocking."""
+    page = os.sysconf("SC_PAGE_SIZE")
+    totals = dict.fromkeys(pgids, 0)
+    for entry in os.scandir("/proc"):
+        if not entry.name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry.name}/stat", "rb") as f:
+                # comm may contain spaces: fields start after the last ")"
+                fields = f.read().rsplit(b")", 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        pgrp = int(fields[2])
+        if pgrp in totals:
+            totals[pgrp] += int(fields[21]) * page
+    return totals
+
+
+class ProcessSupervisor:
+    """
+    Tracks every child process. Each runs in its own session so the whole group
+    (yt-dlp and its ffmpeg) can be killed at once; a child still running when its
+    `spawn` block exits - timeout, cancellation or error - is killed and reaped.
+    CPU time is capped with RLIMIT_CPU (Linux prlimit), memory by a /proc RSS watchdog.
+    """
+
+    def __init__(self, max_rss: int, cpu_seconds: int):
+        self.max_rss = max_rss
+        self.cpu_seconds = cpu_seconds
+        self._children: dict[int, Child] = {}
+        self._watchdog: Optional[asyncio.Task] = None
+        self.started = 0
+        self.killed = 0
+        self.rss_killed = 0
+
+    @asynccontextmanager
+    async def spawn(self, *cmd: str, name: str, stdout=PIPE, stderr=PIPE) -> AsyncIterator[Child]:
+        kwargs = {"start_new_session": True} if POSIX else {}
+
+        proc = await asyncio.create_subprocess_exec(
+            *cmd, stdin=DEVNULL, stdout=stdout, stderr=stderr, **kwargs
+        )
+        if self.cpu_seconds and hasattr(resource, "prlimit"):
+            _limit_cpu(proc.pid, self.cpu_seconds)
+        child = Child(proc, name)
+        self._children[proc.pid] = child
+        self.started += 1
+        self._ensure_watchdog()
+        try:
+            yield child
+        finally:
+            if proc.returncode is None:
+                self.killed += 1
+                self._kill_group(proc.pid)
+                # Reap: no zombies, and the pipes get closed
+                await proc.wait()
+            self._children.pop(proc.pid, None)
+
+    @staticmethod
+    def _kill_group(pid: int) -> None:
+        try:
+            if POSIX:
+                os.killpg(pid, signal.SIGKILL)
+            else:
+                os.kill(pid, signal.SIGTERM)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    def _ensure_watchdog(self) -> None:
+        if not self.max_rss or not os.path.isdir("/proc"):
+            return
+        if self._watchdog is None or self._watchdog.done():
+            self._watchdog = asyncio.create_task(self._watch())
+
+    async def _watch(self) -> None:
+        while self._children:
+            await asyncio.sleep(WATCH_INTERVAL)
+            live = {
+                pid: child for pid, child in self._children.items()
+                if child.proc.returncode is None and child.reason is None
+            }
+            if not live:
+                continue
+            usage = await asyncio.to_thread(_group_rss, set(live))
+            for pid, rss in usage.items():
+                if rss > self.max_rss:
+                    child = live[pid]
+                    logger.warning(f"Killing {child.name} (pid {pid}): RSS {rss // MB} MB over the limit")
+                    child.reason = f"Memory limit exceeded ({self.max_rss // MB} MB)"
+                    self.rss_killed += 1
+                    self._kill_group(pid)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "running": len(self._children),
+            "by_name": dict(Counter(child.name for child in self._children.values())),
+            "oldest_seconds": int(max((now - c.started_at for c in self._children.values()), default=0)),
+            "started": self.started,
+            "killed": self.killed,
+            "rss_killed": self.rss_killed,
+        }
+
+
+process_supervisor = ProcessSupervisor(config.PROCESS_MAX_RSS_MB * MB, config.PROCESS_CPU_SECONDS)
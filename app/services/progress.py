@@ -0,0 +1,85 @@
+"""Throttled, coalesced download progress reporting into a Telegram status message."""
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from aiogram.types import Message
+
+from app.config import config
+from app.services.uploader import uploader
+
+logger = logging.getLogger(__name__)
+
+
+def render_progress(header: str, downloaded: int, total: Optional[int]) -> str:
+    if total:
+        percent = min(100, int(downloaded * 100 / total))
+        filled = percent // 10
+        bar = "▓" * filled + "░" * (10 - filled)
+        return f"{header}\n\n{bar} {percent}%"
+    if downloaded:
+        return f"{header}\n\n{downloaded / (1024 * 1024):.1f} MB"
+    return f"{header}\n\n░░░░░░░░░░ 0%"
+
+
+class ProgressReporter:
+    """
+    Collects byte progress from a downloader (it is a `ProgressCallback`) and
+    mirrors it into `message`, which must already show `render_progress(header, 0, None)`.
+
+    Updates are coalesced: at most one edit per `interval` seconds, only the latest
+    state is rendered, and edits that would not change the text are skipped.
+    """
+
+    def __init__(self, message: Message, header: str, interval: Optional[float] = None):
+        self._message = message
+        self._header = header
+        self._interval = config.PROGRESS_UPDATE_INTERVAL if interval is None else interval
+        self._state: tuple[int, Optional[int]] = (0, None)
+        self._last_text = render_progress(header, 0, None)
+        self._last_edit = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+
+    def __call__(self, downloaded: int, total: Optional[int]) -> None:
+        self.update(downloaded, total)
+
+    def update(self, downloaded: int, total: Optional[int]) -> None:
+        if self._closed:
+            return
+        self._state = (downloaded, total)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        delay = self._last_edit + self._interval - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self._closed:
+            return
+
+        text = render_progress(self._header, *self._state)
+        if text == self._last_text:
+            return
+
+        self._last_text = text
+        self._last_edit = time.monotonic()
+        try:
+            await uploader.send(
+                self._message.chat.id,
+                lambda: self._message.edit_text(text, parse_mode="HTML"),
+                idempotent=True
+            )
+        except Exception as e:
+            logger.debug(f"Progress edit skipped: {e}")
+
+    async def close(self) -> None:
+        """Stop reporting; pending edits are dropped so they can't race the final message."""
+        self._closed = True
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
@@ -0,0 +1,149 @@
+"""Per-backend circuit breakers and latency-based adaptive timeouts."""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+from app.config import config
+from app.services.latency import LatencyTracker, latency
+
+# Default floor for adaptive timeouts, as a share of the built-in one
+MIN_TIMEOUT_FRACTION = 0.25
+
+
+class BackendUnavailable(Exception):
+    def __init__(self, backend: str, retry_in: int):
+        super().__init__(f"{backend} is unavailable, retry in {retry_in}s")
+        self.backend = backend
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """
+    Closed: calls pass, consecutive failures are counted. Open: calls fail fast
+    for `reset_timeout` seconds. Half-open: one probe call is let through; its
+    success closes the breaker, its failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, threshold: int, reset_timeout: float):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self.trips = 0
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                self.rejected += 1
+                return False
+            self.state = self.HALF_OPEN
+            self._probing = False
+        if self._probing:
+            self.rejected += 1
+            return False
+        self._probing = True
+        return True
+
+    def record_success(self) -> None:
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probing = False
+        if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+            if self.state != self.OPEN:
+                self.trips += 1
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def release(self) -> None:
+        """The call ended without a verdict (cancelled): let another probe through."""
+        self._probing = False
+
+    def retry_in(self) -> int:
+        if self.state != self.OPEN:
+            return 0
+        return max(1, int(self.reset_timeout - (time.monotonic() - self.opened_at)))
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "trips": self.trips,
+            "rejected": self.rejected,
+            "retry_in": self.retry_in(),
+        }
+
+
+class Resilience:
+    def __init__(self, tracker: LatencyTracker, threshold: int, reset_timeout: float, multiplier: float):
+        self.tracker = tracker
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.multiplier = multiplier
+        self._breakers: dict[str, CircuitBreaker] = {}
+        self._timeouts: dict[str, float] = {}
+
+    def breaker(self, backend: str) -> CircuitBreaker:
+        breaker = self._breakers.get(backend)
+        if breaker is None:
+            breaker = self._breakers[backend] = CircuitBreaker(self.threshold, self.reset_timeout)
+        return breaker
+
+    def timeout(self, backend: str, default: float, floor: Optional[float] = None) -> float:
+        """
+        p99 of recent successful calls times TIMEOUT_MULTIPLIER, capped at `default`
+        (the old fixed timeout) and floored at `floor` (a quarter of it). `default` until there is data.
+        """
+        p99 = self.tracker.percentile(backend, 0.99)
+        floor = default * MIN_TIMEOUT_FRACTION if floor is None else floor
+        value = default if p99 is None else min(default, max(floor, p99 * self.multiplier))
+        self._timeouts[backend] = value
+        return value
+
+    def record(self, backend: str, seconds: float) -> None:
+        self.tracker.record(backend, seconds)
+
+    @asynccontextmanager
+    async def guard(self, backend: str, default_timeout: float) -> AsyncIterator[float]:
+        """
+        Breaker and adaptive timeout around one call; yields the timeout to apply.
+        Raises BackendUnavailable without running the block while the breaker is open.
+        An exception from the block counts as a failure, a normal exit records the latency.
+        """
+        breaker = self.breaker(backend)
+        if not breaker.allow():
+            raise BackendUnavailable(backend, breaker.retry_in())
+        timeout = self.timeout(backend, default_timeout)
+        start = time.monotonic()
+        try:
+            yield timeout
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+        except Exception:
+            breaker.record_failure()
+            raise
+        self.record(backend, time.monotonic() - start)
+        breaker.record_success()
+
+    def stats(self) -> dict:
+        return {
+            "breakers": {name: breaker.stats() for name, breaker in self._breakers.items()},
+            "timeouts": {name: round(value, 1) for name, value in self._timeouts.items()},
+        }
+
+
+resilience = Resilience(latency, config.BREAKER_FAILURES, config.BREAKER_RESET, config.TIMEOUT_MULTIPLIER)
@@ -1,11 +1,18 @@
+import asyncio
+import logging
 from typing import Optional
 
-from app.services.base import BaseDownloader, MediaResult
+from app.services.base import BaseDownloader, MediaResult, ProgressCallback, is_content_error
+from app.services.negative_cache import negative_cache
+from app.services.resilience import CircuitBreaker, resilience
 from app.services.soundcloud import SoundCloudDownloader
 from app.services.tiktok import TikTokDownloader
 from app.services.pinterest import PinterestDownloader
+from app.services.pin_cache import PinMedia
 from app.services.yandex_music import YandexMusicDownloader
 
+logger = logging.getLogger(__name__)
+
 
 DOWNLOADERS: list[type[BaseDownloader]] = [
     SoundCloudDownloader,
@@ -33,11 +40,88 @@ class DownloadRouter:
                 return cls.PLATFORM
         return None
     
-    async def download(self, url: str, media_type: str = "audio") -> MediaResult:
+    async def download(
+        self,
+        url: str,
+        media_type: str = "audio",
+        progress: Optional[ProgressCallback] = None
+    ) -> MediaResult:
         downloader = self.get_downloader(url)
         if not downloader:
             return MediaResult(success=False, error="Unsupported platform")
-        return await downloader.download(url, media_type)
-
+        
+        # Known private / deleted / login-walled: answer without spawning anything
+        error = negative_cache.get(url)
+        if error:
+            return MediaResult(success=False, error=error, negative_cached=True)
+        
+        # Platform failing repeatedly: fail fast instead of waiting out its timeouts
+        breaker = resilience.breaker(downloader.PLATFORM)
+        if not breaker.allow():
+            return self._unavailable(downloader.PLATFORM, breaker)
+        
+        try:
+            result = await downloader.download(url, media_type, progress=progress)
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+        except Exception:
+            # Also ends a half-open probe, so the breaker can't stay stuck
+            breaker.record_failure()
+            raise
+        
+        self._record(downloader.PLATFORM, breaker, None if result.success else result.error)
+        if not result.success:
+            negative_cache.put(url, result.error)
+        return result
+    
+    async def board_pins(self, url: str) -> tuple[list[tuple[str, PinMedia]], str, Optional[MediaResult]]:
+        """
+        Pins of a Pinterest board, behind the same negative cache and breaker as download().
+        Returns: (pins as (pin_id, media), board_name, failure)
+        """
+        error = negative_cache.get(url)
+        if error:
+            return [], "", MediaResult(success=False, error=error, negative_cached=True)
+        
+        breaker = resilience.breaker(PinterestDownloader.PLATFORM)
+        if not breaker.allow():
+            return [], "", self._unavailable(PinterestDownloader.PLATFORM, breaker)
+        
+        downloader = self.get_downloader(url)
+        try:
+            pins, board_name, error = await downloader.board_pins(url)
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+        except Exception:
+            # Also ends a half-open probe, so the breaker can't stay stuck
+            breaker.record_failure()
+            raise
+        
+        self._record(PinterestDownloader.PLATFORM, breaker, error or None)
+        if error:
+            negative_cache.put(url, error)
+            return [], "", MediaResult(success=False, error=error)
+        return pins, board_name, None
+    
+    @staticmethod
+    def _unavailable(platform: str, breaker: CircuitBreaker) -> MediaResult:
+        name = platform.replace("_", " ").title()
+        return MediaResult(
+            success=False,
+            error=f"{name} is temporarily unavailable, try again in {breaker.retry_in()} s",
+            unavailable=True
+        )
+    
+    @staticmethod
+    def _record(platform: str, breaker: CircuitBreaker, error: Optional[str]) -> None:
+        """Content errors mean the platform answered: only other failures count against it."""
+        if error is None or is_content_error(error):
+            breaker.record_success()
+        else:
+            breaker.record_failure()
+            if breaker.state == CircuitBreaker.OPEN:
+                logger.warning(f"Circuit breaker for {platform} is open: {error}")
 
 router = DownloadRouter()
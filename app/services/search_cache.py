@@ -0,0 +1,145 @@
+"""Search result cache: TTL + LRU, single-flight coalescing and prefix reuse."""
+import asyncio
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional
+
+from app.config import config
+
+SearchFetch = Callable[[str, int], Awaitable[list[dict]]]
+
+# Failed or empty searches are often transient (timeouts), keep them briefly
+EMPTY_TTL = 30
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+def _matches(result: dict, tokens: list[str]) -> bool:
+    """Every query token is a prefix of some word in the title or uploader."""
+    words = re.findall(r"\w+", f"{result.get('title', '')} {result.get('uploader', '')}".lower())
+    return all(any(word.startswith(token) for word in words) for token in tokens)
+
+
+@dataclass
+class _Entry:
+    expires: float
+    limit: int
+    results: list[dict]
+
+    def covers(self, limit: int) -> bool:
+        # Fewer results than asked for means the source was exhausted
+        return self.limit >= limit or len(self.results) < self.limit
+
+
+@dataclass
+class _Flight:
+    task: asyncio.Task
+    waiters: int = 0
+
+
+class SearchCache:
+    def __init__(self, ttl: int, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._inflight: dict[tuple[str, int], _Flight] = {}
+        self.hits = 0
+        self.prefix_hits = 0
+        self.coalesced = 0
+        self.misses = 0
+
+    def _get(self, key: str, limit: int) -> Optional[list[dict]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires < time.monotonic():
+            del self._entries[key]
+            return None
+        if not entry.covers(limit):
+            return None
+        self._entries.move_to_end(key)
+        return entry.results[:limit]
+
+    def _get_by_prefix(self, key: str, limit: int) -> Optional[list[dict]]:
+        """
+        Answer from a cached query that extends this one or is extended by it
+        ("daft pun" <-> "daft punk"), keeping only results that match every token.
+        """
+        tokens = key.split()
+        now = time.monotonic()
+        for other, entry in reversed(self._entries.items()):
+            if entry.expires < now or not entry.results:
+                continue
+            if not (other.startswith(key) or key.startswith(other)):
+                continue
+            results = [r for r in entry.results if _matches(r, tokens)]
+            exhausted = len(entry.results) < entry.limit
+            if results and (exhausted or len(results) >= max(1, limit // 2)):
+                return results[:limit]
+        return None
+
+    def _put(self, key: str, limit: int, results: list[dict]) -> None:
+        ttl = self.ttl if results else EMPTY_TTL
+        self._entries[key] = _Entry(time.monotonic() + ttl, limit, results)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_or_fetch(self, query: str, limit: int, fetch: SearchFetch) -> list[dict]:
+        """
+        Cached results for `query`, else one shared `fetch` for all concurrent
+        identical queries. When every waiter is cancelled the fetch is cancelled too.
+        """
+        key = normalize_query(query)
+
+        results = self._get(key, limit)
+        if results is not None:
+            self.hits += 1
+            return results
+
+        results = self._get_by_prefix(key, limit)
+        if results is not None:
+            self.prefix_hits += 1
+            return results
+
+        flight_key = (key, limit)
+        flight = self._inflight.get(flight_key)
+        if flight is None:
+            self.misses += 1
+            flight = _Flight(asyncio.create_task(fetch(query, limit)))
+            self._inflight[flight_key] = flight
+            flight.task.add_done_callback(lambda task: self._finish(flight_key, task))
+        else:
+            self.coalesced += 1
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+
+    def _finish(self, flight_key: tuple[str, int], task: asyncio.Task) -> None:
+        self._inflight.pop(flight_key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        key, limit = flight_key
+        self._put(key, limit, task.result())
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "in_flight": len(self._inflight),
+            "hits": self.hits,
+            "prefix_hits": self.prefix_hits,
+            "coalesced": self.coalesced,
+            "misses": self.misses,
+        }
+
+
+search_cache = SearchCache(config.SEARCH_CACHE_TTL, config.SEARCH_CACHE_SIZE)
@@ -1,11 +1,16 @@
 import asyncio
 import aiohttp
 import logging
+import time
 from typing import Optional
 
-from app.services.base import BaseDownloader, MediaResult
+from app.services.base import BaseDownloader, MediaResult, ProgressCallback, SIZE_LIMIT_ERROR
 from app.services.ytdlp_wrapper import run_ytdlp, extract_title_from_path, get_ytdlp_path
 from app.services.mp3tools import mp3tools
+from app.services.transcode import plan_audio_profile, fit_audio
+from app.services.thumbnails import get_thumbnail
+from app.services.processes import process_supervisor
+from app.services.resilience import resilience
 from app.config import config
 
 logger = logging.getLogger(__name__)
@@ -25,17 +30,18 @@ class SoundCloudDownloader(BaseDownloader):
             url.strip()
         ]
         
+        start = time.monotonic()
         try:
-            proc = await asyncio.create_subprocess_exec(
-                *cmd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=20)
+            async with process_supervisor.spawn(*cmd, name="yt-dlp metadata") as child:
+                stdout, stderr = await asyncio.wait_for(
+                    child.proc.communicate(),
+                    timeout=resilience.timeout("soundcloud_metadata", 20)
+                )
             
-            if proc.returncode == 0 and stdout:
+            if child.proc.returncode == 0 and stdout:
                 import json
                 data = json.loads(stdout.decode())
+                resilience.record("soundcloud_metadata", time.monotonic() - start)
                 logger.warning(f"Got metadata: uploader={data.get('uploader')}")
                 return data
             else:
@@ -58,22 +64,42 @@ class SoundCloudDownloader(BaseDownloader):
             pass
         return None
     
-    async def download(self, url: str, media_type: str = "audio") -> MediaResult:
+    async def download(
+        self,
+        url: str,
+        media_type: str = "audio",
+        progress: Optional[ProgressCallback] = None
+    ) -> MediaResult:
         # Get metadata first (for artwork and artist)
         metadata = await self.get_metadata(url)
+        duration = metadata.get("duration")
+        
+        # Encode once at the best bitrate that fits instead of failing long sets
+        profile = plan_audio_profile(duration)
+        if profile is None:
+            return MediaResult(success=False, error=SIZE_LIMIT_ERROR)
         
         success, file_path, error = await run_ytdlp(
             url=url,
-            output_dir=config.DOWNLOAD_DIR,
             extract_audio=True,
-            audio_format="mp3"
+            audio_format="mp3",
+            audio_quality=profile.ytdlp_quality,
+            progress=progress,
+            info=metadata or None,
+            max_size=config.MAX_SOURCE_SIZE,
+            max_source_size=config.MAX_SOURCE_SIZE,
+            backend="soundcloud_ytdlp"
         )
         
         if not success:
             return MediaResult(success=False, error=error)
         
-        unique_id = file_path.name.split("_")[0]
-        raw_title = metadata.get("title") or extract_title_from_path(file_path, unique_id)
+        profile, error = await fit_audio(file_path, profile, duration)
+        if profile is None:
+            await self.cleanup(file_path)
+            return MediaResult(success=False, error=error)
+        
+        raw_title = metadata.get("title") or extract_title_from_path(file_path)
         
         # Get uploader (channel name) - try multiple fields
         uploader = (
@@ -87,18 +113,16 @@ class SoundCloudDownloader(BaseDownloader):
         
         logger.info(f"Metadata: title={raw_title}, uploader={uploader}, keys={list(metadata.keys())[:10]}")
         
+        # Parse the embedded tags once: artist fallback and artwork share it
+        session = None
+        try:
+            session = await mp3tools.open_session(file_path)
+        except Exception:
+            pass
+        
         # Also try to read artist from MP3 tags (yt-dlp embeds this)
-        if not uploader:
-            try:
-                from mutagen.mp3 import MP3
-                from mutagen.id3 import ID3
-                audio = MP3(file_path, ID3=ID3)
-                if audio.tags:
-                    # TPE1 = artist tag
-                    if 'TPE1' in audio.tags:
-                        uploader = str(audio.tags['TPE1'].text[0])
-            except Exception:
-                pass
+        if not uploader and session:
+            uploader = session.get_tags().artist or ""
         
         # Parse "Artist — Track" or "Artist - Track" format from title
         artist = None
@@ -114,17 +138,24 @@ class SoundCloudDownloader(BaseDownloader):
         if not artist or artist == "Unknown":
             artist = uploader if uploader else "Unknown"
         
-        # Download and embed artwork
+        # Download and embed artwork; the Telegram thumbnail is made while it's in memory
+        thumbnail = None
         artwork_url = metadata.get("thumbnail")
         if artwork_url:
             artwork_data = await self.download_artwork(artwork_url)
             if artwork_data:
-                await mp3tools.set_album_art(file_path, artwork_data)
+                thumbnail = await get_thumbnail(artwork_data)
+                if session:
+                    session.set_album_art(artwork_data)
+                    await mp3tools.commit(session)
         
         return MediaResult(
             success=True,
             file_path=file_path,
             title=title,
             author=artist,
-            media_type="audio"
+            duration=int(duration) if duration else None,
+            media_type="audio",
+            audio_profile=profile.label,
+            thumbnail=thumbnail
         )
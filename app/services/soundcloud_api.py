@@ -0,0 +1,134 @@
+"""Native async SoundCloud search over the public api-v2 endpoint."""
+import asyncio
+import logging
+import re
+import time
+from typing import Optional
+
+import aiohttp
+
+from app.config import config
+from app.services.http import get_session
+
+logger = logging.getLogger(__name__)
+
+
+class SoundCloudAPIError(Exception):
+    pass
+
+
+class SoundCloudAPI:
+    """
+    Searches tracks without spawning yt-dlp. The web client's public client_id
+    is scraped from soundcloud.com's JS bundles and cached until it is rejected.
+    Base URLs are overridable so a local fixture server can stand in for SoundCloud.
+    """
+
+    SCRIPT_PATTERN = re.compile(r'<script[^>]+src="([^"]+/assets/[^"]+\.js)"')
+    CLIENT_ID_PATTERN = re.compile(r'client_id\s*[:=]\s*"([0-9a-zA-Z]{32})"')
+    CLIENT_ID_TTL = 6 * 3600
+    PAGE_SIZE = 20
+
+    HEADERS = {
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+        "Accept": "application/json, text/javascript, */*; q=0.1",
+    }
+
+    def __init__(self, api_url: str = "https://api-v2.soundcloud.com", site_url: str = "https://soundcloud.com"):
+        self.api_url = api_url.rstrip("/")
+        self.site_url = site_url.rstrip("/")
+        self._client_id: Optional[str] = config.SOUNDCLOUD_CLIENT_ID or None
+        self._client_id_at = time.monotonic() if self._client_id else 0.0
+        self._lock = asyncio.Lock()
+
+    async def _fetch_text(self, url: str, timeout: float) -> str:
+        async with get_session().get(url, headers=self.HEADERS, timeout=aiohttp.ClientTimeout(total=timeout)) as resp:
+            if resp.status != 200:
+                raise SoundCloudAPIError(f"{url}: HTTP {resp.status}")
+            return await resp.text()
+
+    async def get_client_id(self, refresh: bool = False, timeout: float = 10) -> str:
+        fresh = time.monotonic() - self._client_id_at < self.CLIENT_ID_TTL
+        if self._client_id and fresh and not refresh:
+            return self._client_id
+
+        async with self._lock:
+            # Another request may have refreshed it while we waited
+            if self._client_id and not refresh and time.monotonic() - self._client_id_at < self.CLIENT_ID_TTL:
+                return self._client_id
+
+            html = await self._fetch_text(self.site_url, timeout)
+            scripts = self.SCRIPT_PATTERN.findall(html)
+            # The id lives in one of the last bundles
+            for script_url in reversed(scripts):
+                if script_url.startswith("/"):
+                    script_url = self.site_url + script_url
+                try:
+                    match = self.CLIENT_ID_PATTERN.search(await self._fetch_text(script_url, timeout))
+                except SoundCloudAPIError:
+                    continue
+                if match:
+                    self._client_id = match.group(1)
+                    self._client_id_at = time.monotonic()
+                    logger.info("SoundCloud client_id refreshed")
+                    return self._client_id
+
+        raise SoundCloudAPIError("client_id not found")
+
+    @staticmethod
+    def _to_result(item: dict) -> Optional[dict]:
+        url = item.get("permalink_url")
+        if item.get("kind") != "track" or not url:
+            return None
+        duration_ms = item.get("full_duration") or item.get("duration") or 0
+        return {
+            "title": item.get("title") or "Unknown",
+            "url": url,
+            "uploader": (item.get("user") or {}).get("username") or "Unknown",
+            "duration": int(duration_ms / 1000),
+        }
+
+    async def search(self, query: str, limit: int = 10, offset: int = 0, timeout: float = 10) -> list[dict]:
+        """Track search, paginated until `limit` results; same dict shape as the yt-dlp search."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        client_id = await self.get_client_id(timeout=timeout)
+        retried = False
+
+        results: list[dict] = []
+        url: Optional[str] = f"{self.api_url}/search/tracks"
+        params: Optional[dict] = {"q": query, "limit": min(limit, self.PAGE_SIZE), "offset": offset}
+
+        while url and len(results) < limit:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            request_params = dict(params or {}, client_id=client_id)
+            async with get_session().get(
+                url,
+                params=request_params,
+                headers=self.HEADERS,
+                timeout=aiohttp.ClientTimeout(total=remaining)
+            ) as resp:
+                if resp.status in (401, 403) and not retried:
+                    # Rotated client_id: scrape a new one and retry the page
+                    retried = True
+                    client_id = await self.get_client_id(refresh=True, timeout=timeout)
+                    continue
+                if resp.status != 200:
+                    raise SoundCloudAPIError(f"search: HTTP {resp.status}")
+                data = await resp.json(content_type=None)
+
+            for item in data.get("collection") or []:
+                result = self._to_result(item)
+                if result:
+                    results.append(result)
+
+            # next_href carries its own query string (minus client_id)
+            url = data.get("next_href")
+            params = None
+
+        return results[:limit]
+
+
+soundcloud_api = SoundCloudAPI()
@@ -0,0 +1,78 @@
+"""Telegram cover thumbnails (320x320 JPEG) with a size-bounded LRU cache."""
+import hashlib
+from collections import OrderedDict
+from io import BytesIO
+from typing import Optional
+
+from PIL import Image
+
+from app.config import config
+from app.services.executor import cpu_executor
+
+THUMB_SIZE = (320, 320)
+
+
+class ThumbnailCache:
+    """LRU of rendered thumbnails keyed by a hash of the source cover bytes."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._items: OrderedDict[str, bytes] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        value = self._items.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: str, value: bytes) -> None:
+        if len(value) > self.max_bytes:
+            return
+        old = self._items.pop(key, None)
+        if old is not None:
+            self.size -= len(old)
+        self._items[key] = value
+        self.size += len(value)
+        while self.size > self.max_bytes:
+            _, evicted = self._items.popitem(last=False)
+            self.size -= len(evicted)
+
+
+thumbnail_cache = ThumbnailCache(config.THUMB_CACHE_MB * 1024 * 1024)
+
+
+def cover_key(cover: bytes) -> str:
+    return hashlib.blake2b(cover, digest_size=16).hexdigest()
+
+
+def render_thumbnail(cover: bytes) -> Optional[bytes]:
+    """Resize cover art for Telegram. Blocking."""
+    try:
+        img = Image.open(BytesIO(cover))
+        # JPEG: let the decoder downscale by 1/2..1/8 instead of decoding full size
+        img.draft("RGB", THUMB_SIZE)
+        img = img.convert("RGB")  # Ensure RGB for JPEG
+        img.thumbnail(THUMB_SIZE, Image.Resampling.LANCZOS)
+
+        output = BytesIO()
+        img.save(output, format="JPEG", quality=85)
+        return output.getvalue()
+    except Exception:
+        return None
+
+
+async def get_thumbnail(cover: bytes) -> Optional[bytes]:
+    """Cached thumbnail for cover bytes; renders off the event loop on a miss."""
+    key = cover_key(cover)
+    thumb = thumbnail_cache.get(key)
+    if thumb is None:
+        thumb = await cpu_executor.run_isolated(render_thumbnail, cover)
+        if thumb:
+            thumbnail_cache.put(key, thumb)
+    return thumb
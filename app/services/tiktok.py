@@ -1,14 +1,43 @@
 import asyncio
+import logging
 import re
-import uuid
+import time
 import aiohttp
-from pathlib import Path
-from typing import Optional
+from typing import Callable, Optional
 
-from app.services.base import BaseDownloader, MediaResult
+from app.services.base import BaseDownloader, MediaResult, ProgressCallback, new_job_dir, remove_job_files
+from app.services.http import get_session
+from app.services.latency import latency
+from app.services.resilience import resilience
 from app.services.ytdlp_wrapper import run_ytdlp, extract_title_from_path
+from app.services.transcode import BEST_PROFILE, fit_audio
 from app.config import config
 
+logger = logging.getLogger(__name__)
+
+TIKWM_BASE = "https://www.tikwm.com"
+
+
+class TikWMError(Exception):
+    pass
+
+
+def _first_reporter(progress: Optional[ProgressCallback]) -> Callable[[str], Optional[ProgressCallback]]:
+    """Per-source progress callbacks; only the first source to report is shown."""
+    owner = None
+
+    def for_source(name: str) -> Optional[ProgressCallback]:
+        if progress is None:
+            return None
+
+        def report(downloaded: int, total: Optional[int]) -> None:
+            nonlocal owner
+            owner = owner or name
+            if owner == name:
+                progress(downloaded, total)
+        return report
+    return for_source
+
 
 class TikTokDownloader(BaseDownloader):
     PLATFORM = "tiktok"
@@ -20,158 +49,228 @@ class TikTokDownloader(BaseDownloader):
         "Accept-Language": "en-US,en;q=0.5",
     }
     
-    async def _resolve_short_url(self, url: str) -> Optional[str]:
-        """Resolve vm.tiktok.com or vt.tiktok.com to full URL."""
-        if "vm.tiktok.com" in url or "vt.tiktok.com" in url:
-            try:
-                async with aiohttp.ClientSession() as session:
-                    async with session.head(url, headers=self.HEADERS, allow_redirects=True, timeout=10) as resp:
-                        return str(resp.url)
-            except Exception:
-                pass
-        return url
+    async def _tikwm_info(self, url: str) -> dict:
+        """
+        One TikWM call (free, no auth) tells video from slideshow and returns direct
+        media URLs. Short vm./vt. links are resolved by TikWM itself. Raises
+        BackendUnavailable at once while TikWM's breaker is open.
+        """
+        async with resilience.guard("tikwm", 15) as timeout:
+            async with get_session().post(
+                f"{TIKWM_BASE}/api/",
+                data={"url": url, "hd": 1},
+                headers=self.HEADERS,
+                timeout=aiohttp.ClientTimeout(total=timeout)
+            ) as resp:
+                if resp.status != 200:
+                    raise TikWMError(f"API error: {resp.status}")
+                data = await resp.json(content_type=None)
+        
+        if data.get("code") != 0:
+            raise TikWMError(data.get("msg") or "API error")
+        return data.get("data") or {}
     
-    async def _is_photo_post(self, url: str) -> bool:
-        """Check if URL is a photo slideshow post."""
-        resolved = await self._resolve_short_url(url)
-        return "/photo/" in resolved if resolved else False
+    @staticmethod
+    def _absolute(media_url: str) -> str:
+        return TIKWM_BASE + media_url if media_url.startswith("/") else media_url
     
-    async def _download_photo_slideshow(self, url: str) -> MediaResult:
-        """Download TikTok photo slideshow using TikWM API."""
+    @staticmethod
+    def _video_url(info: dict) -> Optional[str]:
+        """HD stream when it fits the upload limit, else the standard no-watermark one."""
+        hd_size = info.get("hd_size") or 0
+        if info.get("hdplay") and hd_size <= config.MAX_FILE_SIZE:
+            return info["hdplay"]
+        return info.get("play") or info.get("hdplay")
+    
+    async def _download_photo_slideshow(self, info: dict, progress: Optional[ProgressCallback] = None) -> MediaResult:
+        """Download the images of a slideshow post."""
+        output_dir = new_job_dir()
+        downloaded_images = []
+        images = info["images"][:10]  # Max 10 images
+        
         try:
-            resolved_url = await self._resolve_short_url(url)
-            
-            # Extract post ID from URL
-            match = re.search(r'/photo/(\d+)', resolved_url)
-            if not match:
-                return MediaResult(success=False, error="Cannot extract photo ID")
-            
-            post_id = match.group(1)
-            
-            # Use TikWM API (free, no auth required)
-            api_url = "https://www.tikwm.com/api/"
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    api_url,
-                    data={"url": resolved_url, "hd": 1},
-                    headers=self.HEADERS,
-                    timeout=aiohttp.ClientTimeout(total=30)
-                ) as resp:
-                    if resp.status != 200:
-                        return MediaResult(success=False, error=f"API error: {resp.status}")
-                    
-                    data = await resp.json()
-                    
-                    if data.get("code") != 0:
-                        return MediaResult(success=False, error=data.get("msg", "API error"))
-                    
-                    video_data = data.get("data", {})
-                    images = video_data.get("images", [])
-                    
-                    if not images:
-                        # Fallback: maybe it's actually a video
-                        video_url = video_data.get("play") or video_data.get("hdplay")
-                        if video_url:
-                            return await self._download_video_direct(video_url, video_data.get("title", "TikTok"))
-                        return MediaResult(success=False, error="No images found")
-                    
-                    # Download all images and create a collage or return first one
-                    output_dir = config.DOWNLOAD_DIR
-                    output_dir.mkdir(parents=True, exist_ok=True)
-                    
-                    unique_id = uuid.uuid4().hex[:8]
-                    downloaded_images = []
-                    
-                    for i, img_url in enumerate(images[:10]):  # Max 10 images
-                        try:
-                            async with session.get(img_url, timeout=aiohttp.ClientTimeout(total=15)) as img_resp:
-                                if img_resp.status == 200:
-                                    img_data = await img_resp.read()
-                                    img_path = output_dir / f"{unique_id}_photo_{i}.jpg"
-                                    img_path.write_bytes(img_data)
-                                    downloaded_images.append(img_path)
-                        except Exception:
-                            continue
-                    
-                    if not downloaded_images:
-                        return MediaResult(success=False, error="Failed to download images")
-                    
-                    title = video_data.get("title", "TikTok Slideshow")[:80]
-                    author = video_data.get("author", {}).get("nickname", "TikTok")
-                    
-                    return MediaResult(
-                        success=True,
-                        file_path=downloaded_images[0],  # Return first image, handler will send all
-                        title=title,
-                        author=author,
-                        media_type="photo",
-                        extra_files=downloaded_images[1:] if len(downloaded_images) > 1 else None
-                    )
-                    
-        except asyncio.TimeoutError:
-            return MediaResult(success=False, error="Download timed out")
-        except Exception as e:
-            return MediaResult(success=False, error=str(e)[:200])
+            for i, img_url in enumerate(images):
+                try:
+                    async with get_session().get(self._absolute(img_url), timeout=aiohttp.ClientTimeout(total=15)) as img_resp:
+                        if img_resp.status == 200:
+                            img_path = output_dir / f"photo_{i}.jpg"
+                            if await self.stream_to_file(img_resp, img_path) is None:
+                                downloaded_images.append(img_path)
+                except Exception:
+                    continue
+                if progress:
+                    # Byte totals are unknown up front; report images done instead
+                    progress(i + 1, len(images))
+        except asyncio.CancelledError:
+            remove_job_files(output_dir)
+            raise
+        
+        if not downloaded_images:
+            remove_job_files(output_dir)
+            return MediaResult(success=False, error="Failed to download images")
+        
+        return MediaResult(
+            success=True,
+            file_path=downloaded_images[0],  # Return first image, handler will send all
+            title=(info.get("title") or "TikTok Slideshow")[:80],
+            author=(info.get("author") or {}).get("nickname") or "TikTok",
+            media_type="photo",
+            extra_files=downloaded_images[1:] if len(downloaded_images) > 1 else None
+        )
     
-    async def _download_video_direct(self, video_url: str, title: str) -> MediaResult:
+    async def _download_video_direct(
+        self,
+        video_url: str,
+        info: dict,
+        progress: Optional[ProgressCallback] = None
+    ) -> MediaResult:
         """Download video directly from URL."""
+        title = info.get("title") or "TikTok"
+        file_path = None
+        succeeded = False
         try:
-            output_dir = config.DOWNLOAD_DIR
-            output_dir.mkdir(parents=True, exist_ok=True)
+            safe_title = re.sub(r'[^\w\s-]', '', title)[:50] or "tiktok"
+            file_path = new_job_dir() / f"{safe_title}.mp4"
+            start = time.monotonic()
             
-            unique_id = uuid.uuid4().hex[:8]
-            safe_title = re.sub(r'[^\w\s-]', '', title)[:50]
-            file_path = output_dir / f"{unique_id}_{safe_title}.mp4"
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.get(video_url, headers=self.HEADERS, timeout=aiohttp.ClientTimeout(total=60)) as resp:
-                    if resp.status != 200:
-                        return MediaResult(success=False, error=f"Download failed: {resp.status}")
-                    
-                    content = await resp.read()
-                    
-                    if len(content) > config.MAX_FILE_SIZE:
-                        return MediaResult(success=False, error="File exceeds 50 MB limit")
-                    
-                    file_path.write_bytes(content)
-                    
-                    return MediaResult(
-                        success=True,
-                        file_path=file_path,
-                        title=title[:80],
-                        author="TikTok",
-                        media_type="video"
-                    )
+            # Total stays fixed (size varies); only a stalled server is caught early
+            timeout = aiohttp.ClientTimeout(total=60, sock_read=resilience.timeout("tikwm_media", 15))
+            async with get_session().get(
+                self._absolute(video_url),
+                headers=self.HEADERS,
+                timeout=timeout
+            ) as resp:
+                resilience.record("tikwm_media", time.monotonic() - start)
+                if resp.status != 200:
+                    return MediaResult(success=False, error=f"Download failed: {resp.status}")
+                
+                error = await self.stream_to_file(resp, file_path, progress)
+                if error:
+                    return MediaResult(success=False, error=error)
+                
+                succeeded = True
+                return MediaResult(
+                    success=True,
+                    file_path=file_path,
+                    title=title[:80],
+                    author=(info.get("author") or {}).get("nickname") or "TikTok",
+                    duration=info.get("duration"),
+                    media_type="video"
+                )
         except Exception as e:
             return MediaResult(success=False, error=str(e)[:200])
+        finally:
+            # Covers cancellation too: the losing side of the hedge leaves nothing behind
+            if not succeeded:
+                remove_job_files(file_path)
     
-    async def download(self, url: str, media_type: str = "video") -> MediaResult:
-        # Check if it's a photo slideshow
-        if await self._is_photo_post(url):
-            return await self._download_photo_slideshow(url)
+    async def _via_tikwm(self, info_task: asyncio.Task, progress: Optional[ProgressCallback] = None) -> MediaResult:
+        try:
+            info = await info_task
+        except Exception as e:
+            return MediaResult(success=False, error=f"TikWM: {str(e)[:150]}")
         
-        # Regular video download via yt-dlp
+        if info.get("images"):
+            return await self._download_photo_slideshow(info, progress)
+        video_url = self._video_url(info)
+        if not video_url:
+            return MediaResult(success=False, error="TikWM returned no video")
+        return await self._download_video_direct(video_url, info, progress)
+    
+    async def _via_ytdlp(self, url: str, media_type: str, progress: Optional[ProgressCallback] = None) -> MediaResult:
         extract_audio = media_type == "audio"
         
         success, file_path, error = await run_ytdlp(
             url=url,
-            output_dir=config.DOWNLOAD_DIR,
             extract_audio=extract_audio,
             audio_format="mp3",
-            format_spec="best" if not extract_audio else None
+            progress=progress,
+            max_size=config.MAX_SOURCE_SIZE if extract_audio else None,
+            max_source_size=config.MAX_SOURCE_SIZE if extract_audio else None,
+            backend="tiktok_ytdlp"
         )
         
         if not success:
             return MediaResult(success=False, error=error)
         
-        unique_id = file_path.name.split("_")[0]
-        title = extract_title_from_path(file_path, unique_id)
+        profile = None
+        if extract_audio:
+            profile, error = await fit_audio(file_path, BEST_PROFILE)
+            if profile is None:
+                await self.cleanup(file_path)
+                return MediaResult(success=False, error=error)
         
         return MediaResult(
             success=True,
             file_path=file_path,
-            title=title,
+            title=extract_title_from_path(file_path),
             author="TikTok",
-            media_type=media_type
+            media_type=media_type,
+            audio_profile=profile.label if profile else None
         )
+    
+    async def _race(self, url: str, info_task: asyncio.Task, progress: Optional[ProgressCallback]) -> MediaResult:
+        """TikWM is slow to answer: start yt-dlp as well, first success wins."""
+        report_to = _first_reporter(progress)
+        racers = {
+            asyncio.create_task(self._via_tikwm(info_task, report_to("tikwm"))): "tikwm",
+            asyncio.create_task(self._via_ytdlp(url, "video", report_to("yt-dlp"))): "yt-dlp",
+        }
+        winner = None
+        failures: dict[str, MediaResult] = {}
+        try:
+            pending = set(racers)
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    result = task.result()
+                    if result.success and winner is None:
+                        winner = result
+                        logger.info(f"TikTok hedge won by {racers[task]}")
+                    elif not result.success:
+                        failures[racers[task]] = result
+            if winner:
+                return winner
+            # yt-dlp's error is classified (private / not found) for the negative cache
+            return failures.get("yt-dlp") or failures["tikwm"]
+        finally:
+            for task in racers:
+                task.cancel()
+            results = await asyncio.gather(*racers, return_exceptions=True)
+            # Both finished: drop the loser's files
+            for result in results:
+                if isinstance(result, MediaResult) and result.success and result is not winner:
+                    for path in [result.file_path] + (result.extra_files or []):
+                        await self.cleanup(path)
+    
+    async def download(
+        self,
+        url: str,
+        media_type: str = "video",
+        progress: Optional[ProgressCallback] = None
+    ) -> MediaResult:
+        if media_type == "audio":
+            return await self._via_ytdlp(url, "audio", progress)
+        
+        # Hedge after TikWM's usual answer time, within sane bounds
+        hedge_delay = latency.percentile("tikwm", 0.9, config.TIKTOK_HEDGE_DELAY)
+        hedge_delay = min(max(hedge_delay, 0.2), config.TIKTOK_HEDGE_MAX_DELAY)
+        
+        info_task = asyncio.create_task(self._tikwm_info(url))
+        try:
+            done, _ = await asyncio.wait({info_task}, timeout=hedge_delay)
+        except asyncio.CancelledError:
+            info_task.cancel()
+            raise
+        
+        if not done:
+            return await self._race(url, info_task, progress)
+        
+        if info_task.exception() is None:
+            result = await self._via_tikwm(info_task, progress)
+            if result.success or info_task.result().get("images"):
+                return result
+            logger.warning(f"TikWM direct download failed, using yt-dlp: {result.error}")
+        else:
+            logger.warning(f"TikWM failed, using yt-dlp: {info_task.exception()}")
+        return await self._via_ytdlp(url, "video", progress)
@@ -0,0 +1,122 @@
+"""Audio encoding planner: pick the best MP3 profile that fits Telegram's size limit."""
+import asyncio
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from app.config import config
+from app.services.base import SIZE_LIMIT_ERROR
+from app.services.executor import cpu_executor
+from app.services.processes import process_supervisor, DEVNULL
+
+logger = logging.getLogger(__name__)
+
+# CBR ladder, best first
+MP3_BITRATES = (320, 256, 192, 160, 128, 112, 96, 80, 64, 48, 32)
+
+# Room for ID3 tags and embedded cover art
+TAG_RESERVE = 1024 * 1024
+HEADROOM = 0.98
+
+
+@dataclass
+class AudioProfile:
+    codec: str = "mp3"
+    bitrate: Optional[int] = None  # kbps; None = best VBR (-q 0)
+
+    @property
+    def label(self) -> str:
+        return f"{self.codec} {self.bitrate}k" if self.bitrate else f"{self.codec} V0"
+
+    @property
+    def ytdlp_quality(self) -> str:
+        """Value for yt-dlp --audio-quality."""
+        return f"{self.bitrate}K" if self.bitrate else "0"
+
+
+BEST_PROFILE = AudioProfile()
+
+
+def plan_audio_profile(
+    duration: Optional[float],
+    max_size: Optional[int] = None,
+    below: Optional[int] = None
+) -> Optional[AudioProfile]:
+    """
+    Highest-quality profile whose output fits `max_size` for `duration` seconds.
+    V0 peaks at 320 kbps, so it is only chosen when 320 kbps fits.
+    `below` restricts the ladder to bitrates under an already-too-large one.
+    Returns None when even the lowest bitrate can't fit.
+    """
+    if not duration:
+        return BEST_PROFILE if below is None else None
+
+    budget_bits = (((max_size or config.MAX_FILE_SIZE) * HEADROOM) - TAG_RESERVE) * 8
+    for bitrate in MP3_BITRATES:
+        if below is not None and bitrate >= below:
+            continue
+        if bitrate * 1000 * duration <= budget_bits:
+            if bitrate == MP3_BITRATES[0] and below is None:
+                return BEST_PROFILE
+            return AudioProfile(bitrate=bitrate)
+    return None
+
+
+def _read_duration(file_path: Path) -> Optional[float]:
+    try:
+        from mutagen import File
+        audio = File(file_path)
+        return audio.info.length if audio and audio.info else None
+    except Exception:
+        return None
+
+
+async def fit_audio(
+    file_path: Path,
+    profile: AudioProfile,
+    duration: Optional[float] = None,
+    timeout: int = 600
+) -> tuple[Optional[AudioProfile], str]:
+    """
+    Ensure an encoded MP3 fits the size limit, re-encoding once with ffmpeg
+    (straight into the final file) only when it doesn't.
+    Returns: (profile actually used, error_message)
+    """
+    if file_path.stat().st_size <= config.MAX_FILE_SIZE:
+        return profile, ""
+
+    duration = duration or await cpu_executor.run(_read_duration, file_path)
+    target = plan_audio_profile(duration, below=profile.bitrate or MP3_BITRATES[0])
+    if target is None:
+        file_path.unlink(missing_ok=True)
+        return None, SIZE_LIMIT_ERROR
+
+    tmp_path = file_path.with_name(f"{file_path.stem}.fit{file_path.suffix}")
+    cmd = [
+        "ffmpeg", "-nostdin", "-v", "error", "-y",
+        "-i", str(file_path),
+        "-map", "0:a", "-map", "0:v?", "-c:v", "copy",
+        "-c:a", "libmp3lame", "-b:a", f"{target.bitrate}k",
+        "-map_metadata", "0", "-id3v2_version", "3",
+        str(tmp_path)
+    ]
+    logger.info(f"Re-encoding {file_path.name} to {target.label} to fit the size limit")
+
+    try:
+        async with process_supervisor.spawn(*cmd, name="ffmpeg", stdout=DEVNULL) as child:
+            _, stderr = await asyncio.wait_for(child.proc.communicate(), timeout=timeout)
+        if child.proc.returncode != 0:
+            tmp_path.unlink(missing_ok=True)
+            return None, child.limit_error or f"Transcoding failed: {stderr.decode().strip()[:150]}"
+        tmp_path.replace(file_path)
+    except asyncio.TimeoutError:
+        tmp_path.unlink(missing_ok=True)
+        return None, f"Transcoding timed out ({timeout}s)"
+    except FileNotFoundError:
+        return None, "ffmpeg not installed"
+
+    if file_path.stat().st_size > config.MAX_FILE_SIZE:
+        file_path.unlink(missing_ok=True)
+        return None, SIZE_LIMIT_ERROR
+    return target, ""
@@ -0,0 +1,179 @@
+"""Telegram upload pipeline: send-rate governor, bounded upload pool, flood-wait retries."""
+import asyncio
+import logging
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Optional, TypeVar, Union
+
+from aiohttp import ClientConnectorError
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+from aiogram.types import FSInputFile
+
+from app.config import config
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def input_file(path: Path, filename: Optional[str] = None) -> Union[str, FSInputFile]:
+    """
+    File reference for an upload. With a local Bot API server the server reads the
+    file from disk by `file://` URI, skipping the multipart upload entirely
+    (the stored name on disk is used, `filename` is ignored).
+    """
+    if config.TELEGRAM_API_LOCAL:
+        return path.resolve().as_uri()
+    return FSInputFile(path=path, filename=filename)
+
+
+class TokenBucket:
+    """
+    Token bucket with an optional hard block (used for flood-wait penalties).
+    Tokens may go negative: a send heavier than the capacity is charged in full.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, weight: float, now: float) -> float:
+        """Seconds until `weight` tokens are available (0 if available now)."""
+        self._refill(now)
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.tokens >= weight:
+            return 0.0
+        return (weight - self.tokens) / self.rate
+
+    def take(self, weight: float) -> None:
+        self.tokens -= weight
+
+    def block(self, seconds: float, now: float) -> None:
+        self.blocked_until = max(self.blocked_until, now + seconds)
+        self.tokens = min(self.tokens, 0.0)
+
+
+class RateGovernor:
+    """
+    Global and per-chat send limits following Telegram's guidance:
+    ~30 messages/s overall, ~1 message/s per private chat, 20 messages/min per group.
+    """
+
+    def __init__(self):
+        self._global = TokenBucket(config.TG_GLOBAL_RATE, config.TG_GLOBAL_RATE)
+        self._chats: dict[int, TokenBucket] = {}
+        self._lock = asyncio.Lock()
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if chat_id < 0:
+                # Groups and channels
+                bucket = TokenBucket(config.TG_GROUP_RATE / 60, config.TG_GROUP_RATE)
+            else:
+                bucket = TokenBucket(config.TG_CHAT_RATE, config.TG_CHAT_BURST)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    def _prune(self, now: float) -> None:
+        """Drop idle, fully refilled chat buckets."""
+        if len(self._chats) < 10_000:
+            return
+        for chat_id, bucket in list(self._chats.items()):
+            bucket._refill(now)
+            if bucket.tokens >= bucket.capacity and now >= bucket.blocked_until:
+                del self._chats[chat_id]
+
+    async def acquire(self, chat_id: int, weight: int = 1) -> None:
+        """
+        Wait until both the global and the chat budget allow `weight` messages.
+        A media group larger than a bucket waits for it to be full and is then charged
+        in full, so the sends after it wait off the excess.
+        """
+        while True:
+            async with self._lock:
+                now = time.monotonic()
+                chat = self._chat_bucket(chat_id)
+                wait = max(
+                    chat.delay(min(weight, chat.capacity), now),
+                    self._global.delay(min(weight, self._global.capacity), now)
+                )
+                if wait <= 0:
+                    chat.take(weight)
+                    self._global.take(weight)
+                    self._prune(now)
+                    return
+            await asyncio.sleep(wait)
+
+    def block(self, chat_id: int, seconds: float) -> None:
+        """Honour a flood-wait: no sends to this chat for `seconds`."""
+        self._chat_bucket(chat_id).block(seconds, time.monotonic())
+
+
+def _not_sent(error: TelegramNetworkError) -> bool:
+    """Whether the request never left: aiogram raises this while handling the connect error."""
+    return isinstance(error.__context__, ClientConnectorError)
+
+
+class Uploader:
+    """
+    Sends requests to Telegram through the rate governor and a bounded upload pool.
+
+    `request` is a factory that builds a fresh API call on every attempt, so a retry
+    never reuses a half-consumed upload. Flood-waits (`TelegramRetryAfter`) mean
+    Telegram did not accept the message and are always retried, as are network errors
+    from a connection that was never established. Server errors and other network
+    errors are only retried for idempotent calls (edits, deletes, actions), because
+    the message may already have been delivered.
+    """
+
+    def __init__(self, max_concurrent: int, max_attempts: int):
+        self.governor = RateGovernor()
+        self.max_attempts = max_attempts
+        self._pool = asyncio.Semaphore(max_concurrent)
+
+    async def send(
+        self,
+        chat_id: int,
+        request: Callable[[], Awaitable[T]],
+        weight: int = 1,
+        idempotent: bool = False,
+    ) -> T:
+        attempt = 0
+        while True:
+            attempt += 1
+            retry_in: Optional[float] = None
+
+            await self.governor.acquire(chat_id, weight)
+            try:
+                async with self._pool:
+                    return await request()
+            except TelegramRetryAfter as e:
+                self.governor.block(chat_id, e.retry_after)
+                logger.warning(f"Flood wait {e.retry_after}s for chat {chat_id} (attempt {attempt})")
+                if attempt >= self.max_attempts:
+                    raise
+            except TelegramServerError as e:
+                if not idempotent or attempt >= self.max_attempts:
+                    raise
+                retry_in = min(2 ** attempt, 30)
+                logger.warning(f"Telegram server error for chat {chat_id}: {e}, retrying in {retry_in}s")
+            except TelegramNetworkError as e:
+                if not (idempotent or _not_sent(e)) or attempt >= self.max_attempts:
+                    raise
+                retry_in = min(2 ** attempt, 30)
+                logger.warning(f"Network error for chat {chat_id}: {e}, retrying in {retry_in}s")
+
+            if retry_in:
+                await asyncio.sleep(retry_in)
+
+
+uploader = Uploader(config.UPLOAD_CONCURRENCY, config.UPLOAD_MAX_ATTEMPTS)
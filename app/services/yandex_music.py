@@ -5,8 +5,12 @@ from pathlib import Path
 from typing import Optional
 
 from app.config import config
-from app.services.base import BaseDownloader, MediaResult
+from app.services.base import (
+    BaseDownloader, MediaResult, ProgressCallback, SIZE_LIMIT_ERROR, new_job_dir, remove_job_files
+)
 from app.services.mp3tools import MP3Tags, mp3tools
+from app.services.transcode import AudioProfile, plan_audio_profile, fit_audio
+from app.services.thumbnails import get_thumbnail
 
 try:
     from yandex_music import ClientAsync
@@ -96,19 +100,26 @@ class YandexMusicDownloader(BaseDownloader):
         year = getattr(albums[0], "year", None)
         return str(year) if year else ""
 
-    async def _download_track_audio(self, track, file_path: Path) -> None:
+    async def _download_track_audio(self, track, file_path: Path, max_bitrate: Optional[int] = None) -> int:
+        """Download the best available MP3 not above max_bitrate. Returns the bitrate used."""
         last_error = None
-        for bitrate in self.BITRATE_FALLBACKS:
+        bitrates = [b for b in self.BITRATE_FALLBACKS if not max_bitrate or b <= max_bitrate]
+        for bitrate in bitrates or self.BITRATE_FALLBACKS[-1:]:
             try:
                 await track.download_async(str(file_path), codec="mp3", bitrate_in_kbps=bitrate)
-                return
+                return bitrate
             except Exception as exc:
                 last_error = exc
                 logger.warning("Yandex Music download failed for bitrate %s: %s", bitrate, exc)
 
         raise RuntimeError(str(last_error) if last_error else "Unable to download track")
 
-    async def download(self, url: str, media_type: str = "audio") -> MediaResult:
+    async def download(
+        self,
+        url: str,
+        media_type: str = "audio",
+        progress: Optional[ProgressCallback] = None
+    ) -> MediaResult:
         if media_type != "audio":
             return MediaResult(success=False, error="Yandex Music supports audio only")
 
@@ -117,6 +128,7 @@ class YandexMusicDownloader(BaseDownloader):
         except ValueError as exc:
             return MediaResult(success=False, error=str(exc))
 
+        file_path = None
         try:
             client = await self._get_client()
             tracks = await client.tracks([track_key])
@@ -135,16 +147,27 @@ class YandexMusicDownloader(BaseDownloader):
 
             safe_artist = self._safe_name(artist, "Unknown")
             safe_title = self._safe_name(title, "track")
-            file_path = config.DOWNLOAD_DIR / f"ym_{track.id}_{safe_artist} - {safe_title}.mp3"
+            file_path = new_job_dir() / f"{safe_artist} - {safe_title}.mp3"
 
-            await self._download_track_audio(track, file_path)
+            duration_ms = getattr(track, "duration_ms", None)
+            duration = int(duration_ms / 1000) if duration_ms else None
+
+            # Pick the stream bitrate up front so long tracks fit without re-encoding
+            plan = plan_audio_profile(duration)
+            if plan is None:
+                remove_job_files(file_path)
+                return MediaResult(success=False, error=SIZE_LIMIT_ERROR)
+
+            bitrate = await self._download_track_audio(track, file_path, plan.bitrate)
 
             if not file_path.exists():
+                remove_job_files(file_path)
                 return MediaResult(success=False, error="Downloaded file not found")
 
-            if file_path.stat().st_size > config.MAX_FILE_SIZE:
-                await BaseDownloader.cleanup(file_path)
-                return MediaResult(success=False, error="File exceeds 50 MB limit")
+            profile, error = await fit_audio(file_path, AudioProfile(bitrate=bitrate), duration)
+            if profile is None:
+                remove_job_files(file_path)
+                return MediaResult(success=False, error=error)
 
             cover_bytes = None
             try:
@@ -152,22 +175,22 @@ class YandexMusicDownloader(BaseDownloader):
             except Exception as exc:
                 logger.warning("Yandex Music cover download failed: %s", exc)
 
+            # Cover and tags in one ID3 write
+            thumbnail = None
+            session = await mp3tools.open_session(file_path)
             if cover_bytes:
-                await mp3tools.set_album_art(file_path, cover_bytes)
-
-            await mp3tools.set_tags(
-                file_path,
+                session.set_album_art(cover_bytes)
+                thumbnail = await get_thumbnail(cover_bytes)
+            session.set_tags(
                 MP3Tags(
                     title=title,
                     artist=artist,
                     album=self._get_album(track) or None,
                     date=self._get_year(track) or None,
                     track=self._get_track_number(track) or None,
-                ),
+                )
             )
-
-            duration_ms = getattr(track, "duration_ms", None)
-            duration = int(duration_ms / 1000) if duration_ms else None
+            await mp3tools.commit(session)
 
             return MediaResult(
                 success=True,
@@ -176,9 +199,12 @@ class YandexMusicDownloader(BaseDownloader):
                 author=artist,
                 duration=duration,
                 media_type="audio",
+                audio_profile=profile.label,
+                thumbnail=thumbnail,
             )
         except Exception as exc:
             logger.exception("Yandex Music download failed")
+            remove_job_files(file_path)
             message = str(exc)
             if "Unauthorized" in message or "token" in message.lower():
                 message = "Invalid or expired Yandex Music token"
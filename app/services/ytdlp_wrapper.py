@@ -1,10 +1,79 @@
 import asyncio
+import json
 import sys
-import uuid
+import time
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Optional
+from typing import AsyncIterator, Optional
 
 from app.config import config
+from app.services.base import (
+    ProgressCallback, PRIVATE_ERROR, NOT_FOUND_ERROR, LOGIN_ERROR, source_size_error,
+    new_job_dir, remove_job_files
+)
+from app.services.processes import process_supervisor
+from app.services.resilience import resilience
+
+PROGRESS_PREFIX = "[progress]"
+PROGRESS_TEMPLATE = (
+    "download:" + PROGRESS_PREFIX +
+    " %(progress.downloaded_bytes)s %(progress.total_bytes)s %(progress.total_bytes_estimate)s"
+)
+
+
+# Extracted audio can come out several times smaller (video, lossless sources) or
+# larger (low-bitrate Opus) than the stream it is made from, so the source is only
+# pre-filtered against this multiple of the output limit
+AUDIO_SOURCE_MARGIN = 4
+
+# Total download time allowed, raised for sources too big to fetch in it at
+# MIN_DOWNLOAD_RATE; audio extraction adds the re-encode at TRANSCODE_SPEED × realtime
+DOWNLOAD_TIMEOUT = 180
+MIN_DOWNLOAD_RATE = 1024 * 1024
+TRANSCODE_SPEED = 50
+
+# Segmented protocols, where --concurrent-fragments applies
+FRAGMENTED_PROTOCOLS = ("m3u8", "dash", "ism", "f4m")
+
+
+class FragmentBudget:
+    """Global cap on parallel fragment connections shared by all yt-dlp jobs."""
+
+    def __init__(self, total: int):
+        self.total = max(1, total)
+        self.in_use = 0
+        self.waiting = 0
+        self._cond = asyncio.Condition()
+
+    @asynccontextmanager
+    async def reserve(self, wanted: int) -> AsyncIterator[int]:
+        """
+        Grant up to `wanted` connections, at least one: a job only waits while the
+        whole budget is taken, otherwise it starts with whatever is free.
+        """
+        if wanted <= 1:
+            yield 1
+            return
+        async with self._cond:
+            self.waiting += 1
+            try:
+                await self._cond.wait_for(lambda: self.in_use < self.total)
+            finally:
+                self.waiting -= 1
+            granted = min(wanted, self.total - self.in_use)
+            self.in_use += granted
+        try:
+            yield granted
+        finally:
+            async with self._cond:
+                self.in_use -= granted
+                self._cond.notify_all()
+
+    def stats(self) -> dict:
+        return {"total": self.total, "in_use": self.in_use, "waiting": self.waiting}
+
+
+fragment_budget = FragmentBudget(config.YTDLP_FRAGMENT_CONNECTIONS)
 
 
 def get_ytdlp_path() -> str:
@@ -12,98 +81,314 @@ def get_ytdlp_path() -> str:
     return str(venv_path) if venv_path.exists() else "yt-dlp"
 
 
+def _parse_progress_line(line: str) -> Optional[tuple[int, Optional[int]]]:
+    """Parse a PROGRESS_TEMPLATE line into (downloaded, total). Missing fields are 'NA'."""
+    values = []
+    for part in line[len(PROGRESS_PREFIX):].split():
+        try:
+            values.append(int(float(part)))
+        except ValueError:
+            values.append(None)
+    if len(values) != 3 or values[0] is None:
+        return None
+    downloaded, total, estimate = values
+    return downloaded, total or estimate
+
+
+async def _read_output(stream: asyncio.StreamReader, progress: Optional[ProgressCallback]) -> list[str]:
+    """Consume yt-dlp stdout line by line, feeding progress lines to the callback."""
+    lines = []
+    async for raw in stream:
+        line = raw.decode(errors="replace").strip()
+        if line.startswith(PROGRESS_PREFIX):
+            parsed = _parse_progress_line(line)
+            if parsed and progress:
+                progress(*parsed)
+        elif line:
+            lines.append(line)
+    return lines
+
+
+def _classify_error(error: str) -> str:
+    if "private" in error.lower():
+        return PRIVATE_ERROR
+    if "404" in error or "not exist" in error.lower():
+        return NOT_FOUND_ERROR
+    if "login" in error.lower() or "sign in" in error.lower():
+        return LOGIN_ERROR
+    return error[:200] if error else "Download failed"
+
+
+async def probe(url: str, timeout: Optional[float] = None) -> tuple[Optional[dict], str]:
+    """
+    Read extractor info (formats, sizes, duration) without fetching any media.
+    Without an explicit `timeout` it adapts to recent probe latency (at most 30s).
+    Returns: (info, error_message)
+    """
+    timeout = timeout or resilience.timeout("ytdlp_probe", 30)
+    start = time.monotonic()
+    cmd = [
+        get_ytdlp_path(),
+        "--dump-json",
+        "--no-download",
+        "--no-playlist",
+        "--no-warnings",
+        "--socket-timeout", "15",
+        url.strip()
+    ]
+    try:
+        async with process_supervisor.spawn(*cmd, name="yt-dlp probe") as child:
+            stdout, stderr = await asyncio.wait_for(child.proc.communicate(), timeout=timeout)
+        if child.proc.returncode != 0 or not stdout:
+            return None, child.limit_error or _classify_error(stderr.decode().strip())
+        resilience.record("ytdlp_probe", time.monotonic() - start)
+        return json.loads(stdout.decode().splitlines()[0]), ""
+    except asyncio.TimeoutError:
+        return None, f"Probe timed out ({timeout:.0f}s)"
+    except FileNotFoundError:
+        return None, "yt-dlp not installed"
+    except Exception as e:
+        return None, str(e)
+
+
+def estimate_size(fmt: dict, duration: Optional[float]) -> Optional[int]:
+    """Expected bytes for a format: reported size, else bitrate × duration."""
+    size = fmt.get("filesize") or fmt.get("filesize_approx")
+    if size:
+        return int(size)
+    tbr = fmt.get("tbr") or ((fmt.get("abr") or 0) + (fmt.get("vbr") or 0))
+    if tbr and duration:
+        return int(tbr * 1000 / 8 * duration)
+    return None
+
+
+def select_format(info: dict, max_size: int, audio_only: bool) -> tuple[Optional[str], str]:
+    """
+    Pick the best format whose estimated size fits `max_size`.
+    Formats are ordered worst to best by yt-dlp, so the last fitting one wins;
+    formats without any size estimate are only used when nothing is known to fit.
+    Returns: (format_id, error_message); (None, "") means "let yt-dlp decide".
+    The error names `max_size` (see source_size_error).
+    """
+    formats = info.get("formats") or []
+    duration = info.get("duration")
+    
+    if audio_only:
+        candidates = [f for f in formats if f.get("acodec") != "none" and f.get("vcodec") in (None, "none")]
+        if not candidates:
+            candidates = [f for f in formats if f.get("acodec") != "none"]
+    else:
+        # Single-file formats only: we don't merge separate video and audio streams
+        candidates = [f for f in formats if f.get("acodec") != "none" and f.get("vcodec") != "none"]
+    
+    if not candidates:
+        return None, ""
+    
+    unknown = None
+    for fmt in reversed(candidates):
+        size = estimate_size(fmt, duration)
+        if size is None:
+            unknown = unknown or fmt
+        elif size <= max_size:
+            return fmt.get("format_id"), ""
+    
+    if unknown:
+        return unknown.get("format_id"), ""
+    return None, source_size_error(max_size)
+
+
+def download_timeout(info: Optional[dict], format_spec: Optional[str], extract_audio: bool) -> float:
+    """
+    Total time for a download: DOWNLOAD_TIMEOUT, or more for a large probed source.
+    Depends on the size only, never on recent latency: a long DJ set must not get
+    the limit learned from short clips.
+    """
+    if not info:
+        return DOWNLOAD_TIMEOUT
+    duration = info.get("duration")
+    fmt = next((f for f in info.get("formats") or [] if f.get("format_id") == format_spec), None)
+    size = estimate_size(fmt or info, duration) or 0
+    seconds = size / MIN_DOWNLOAD_RATE
+    if extract_audio and duration:
+        seconds += duration / TRANSCODE_SPEED
+    return max(DOWNLOAD_TIMEOUT, seconds)
+
+
+def is_fragmented(info: Optional[dict], format_spec: Optional[str]) -> bool:
+    """Whether the chosen format is segmented (HLS/DASH). Unknown counts as fragmented."""
+    if not info or not format_spec:
+        return True
+    for fmt in info.get("formats") or []:
+        if fmt.get("format_id") == format_spec:
+            protocol = fmt.get("protocol") or ""
+            return any(p in protocol for p in FRAGMENTED_PROTOCOLS)
+    return True
+
+
 async def run_ytdlp(
     url: str,
     output_dir: Optional[Path] = None,
     extract_audio: bool = True,
     audio_format: str = "mp3",
+    audio_quality: str = "0",
     format_spec: Optional[str] = None,
     extra_args: Optional[list[str]] = None,
-    timeout: int = 180
+    timeout: Optional[float] = None,
+    progress: Optional[ProgressCallback] = None,
+    info: Optional[dict] = None,
+    max_size: Optional[int] = None,
+    max_source_size: Optional[int] = None,
+    fragments: Optional[int] = None,
+    backend: str = "ytdlp"
 ) -> tuple[bool, Optional[Path], str]:
     """
     Universal yt-dlp async wrapper.
+    Probes the URL first (unless `info` from an earlier --dump-json is given) so the
+    format is chosen to fit the size limit and oversized media fails before any
+    media bytes are fetched. The download then reuses the probed info.
+    `max_size` (default MAX_FILE_SIZE) applies to the file yt-dlp produces; callers that
+    re-encode afterwards may allow more. The source is only pre-filtered, against
+    `max_source_size`: by default `max_size` as is, or AUDIO_SOURCE_MARGIN times it
+    when extracting audio.
+    Output goes to a fresh job directory (see new_job_dir) unless `output_dir` is given;
+    on failure or cancellation that directory is removed with everything yt-dlp left in it.
+    HLS/DASH formats fetch up to `fragments` (default YTDLP_CONCURRENT_FRAGMENTS)
+    segments at once, within the global fragment_budget.
+    Without an explicit `timeout` the total is sized from the probed source (see
+    download_timeout); only yt-dlp's stall timeout (--socket-timeout) adapts to how
+    long `backend` recently took to deliver the first bytes (between 10 and 30s).
     Returns: (success, file_path, error_message)
     """
-    output_dir = output_dir or config.DOWNLOAD_DIR
-    output_dir.mkdir(parents=True, exist_ok=True)
+    max_size = max_size or config.MAX_FILE_SIZE
+    max_source_size = max_source_size or (max_size * AUDIO_SOURCE_MARGIN if extract_audio else max_size)
+    
+    if info is None:
+        info, error = await probe(url)
+        if info is None and error in (PRIVATE_ERROR, NOT_FOUND_ERROR, LOGIN_ERROR):
+            return False, None, error
     
-    unique_id = uuid.uuid4().hex[:8]
-    output_template = str(output_dir / f"{unique_id}_%(title).80s.%(ext)s")
+    if info and not format_spec:
+        format_id, error = select_format(info, max_source_size, audio_only=extract_audio)
+        if error:
+            return False, None, error
+        format_spec = format_id
+    
+    owns_dir = output_dir is None
+    output_dir = output_dir or new_job_dir()
+    succeeded = False
+    
+    def _failed(error: str) -> tuple[bool, Optional[Path], str]:
+        return False, None, error
+    
+    output_template = str(output_dir / "%(title).80s.%(ext)s")
+    info_path = output_dir / ".info.json"
+    # yt-dlp reports the final path itself, so nothing has to be globbed for
+    filepath_path = output_dir / ".filepath"
     
     cmd = [
         get_ytdlp_path(),
         "--no-playlist",
         "--no-warnings",
         "--output", output_template,
+        "--print-to-file", "after_move:filepath", str(filepath_path),
+        # Skips the download when the extractor reports a larger source
+        "--max-filesize", str(max_source_size),
     ]
     
     if extract_audio:
         cmd += [
             "--extract-audio",
             "--audio-format", audio_format,
-            "--audio-quality", "0",
+            "--audio-quality", audio_quality,
         ]
+        if format_spec:
+            cmd += ["-f", format_spec]
     else:
         if format_spec:
             cmd += ["-f", format_spec]
         else:
-            cmd += ["-f", "best[filesize<50M]/best"]
+            limit = max_source_size
+            cmd += ["-f", f"best[filesize<{limit}]/best[filesize_approx<{limit}]/best"]
     
     cmd += ["--add-metadata"]
     
+    # Always on: the first progress line times the start of the transfer
+    cmd += ["--newline", "--progress-template", PROGRESS_TEMPLATE]
+    cmd += ["--socket-timeout", f"{resilience.timeout(backend, 30, floor=10):.0f}"]
+    
     if extra_args:
         cmd += extra_args
     
-    cmd.append(url.strip())
+    if info:
+        # Skip a second extraction: download straight from the probed info
+        cmd += ["--load-info-json", str(info_path)]
+    else:
+        cmd.append(url.strip())
+    
+    timeout = timeout or download_timeout(info, format_spec, extract_audio)
+    
+    wanted = fragments or config.YTDLP_CONCURRENT_FRAGMENTS
+    if not is_fragmented(info, format_spec):
+        wanted = 1
     
     try:
-        proc = await asyncio.create_subprocess_exec(
-            *cmd,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-        stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=timeout)
+        if info:
+            info_path.write_text(json.dumps(info))
+        async with fragment_budget.reserve(wanted) as granted:
+            if granted > 1:
+                cmd[1:1] = ["--concurrent-fragments", str(granted)]
+            start = time.monotonic()
+            first_bytes: Optional[float] = None
+            
+            def on_progress(downloaded: int, total: Optional[int]) -> None:
+                nonlocal first_bytes
+                if first_bytes is None:
+                    first_bytes = time.monotonic() - start
+                if progress:
+                    progress(downloaded, total)
+            
+            # Timeout or cancellation kills yt-dlp together with its ffmpeg
+            async with process_supervisor.spawn(*cmd, name="yt-dlp") as child:
+                proc = child.proc
+                output, stderr, _ = await asyncio.wait_for(
+                    asyncio.gather(_read_output(proc.stdout, on_progress), proc.stderr.read(), proc.wait()),
+                    timeout=timeout
+                )
         
         if proc.returncode != 0:
-            error = stderr.decode().strip()
-            if "private" in error.lower():
-                return False, None, "Content is private"
-            if "404" in error or "not exist" in error.lower():
-                return False, None, "Content not found"
-            if "login" in error.lower() or "sign in" in error.lower():
-                return False, None, "Login required"
-            return False, None, error[:200] if error else "Download failed"
-        
-        # Find downloaded file
-        ext = audio_format if extract_audio else "*"
-        files = list(output_dir.glob(f"{unique_id}_*.{ext}"))
-        if not files:
-            files = list(output_dir.glob(f"{unique_id}_*"))
+            return _failed(child.limit_error or _classify_error(stderr.decode().strip()))
         
-        if not files:
-            return False, None, "Downloaded file not found"
+        if any("larger than max-filesize" in line for line in output):
+            return _failed(source_size_error(max_source_size))
         
-        file_path = files[0]
+        printed = filepath_path.read_text().splitlines() if filepath_path.exists() else []
+        file_path = Path(printed[-1]) if printed else None
+        if not file_path or not file_path.exists():
+            return _failed("Downloaded file not found")
         
-        # Check Telegram size limit
-        if file_path.stat().st_size > config.MAX_FILE_SIZE:
-            file_path.unlink(missing_ok=True)
-            return False, None, "File exceeds 50 MB limit"
+        # The limit is on what we produced: the extracted MP3, not its source
+        if file_path.stat().st_size > max_size:
+            return _failed(source_size_error(max_size))
         
+        if first_bytes is not None:
+            resilience.record(backend, first_bytes)
+        succeeded = True
         return True, file_path, ""
         
     except asyncio.TimeoutError:
-        return False, None, f"Download timed out ({timeout}s)"
+        return _failed(f"Download timed out ({timeout:.0f}s)")
     except FileNotFoundError:
-        return False, None, "yt-dlp not installed"
+        return _failed("yt-dlp not installed")
     except Exception as e:
-        return False, None, str(e)
+        return _failed(str(e))
+    finally:
+        if owns_dir and not succeeded:
+            # Failure, timeout or cancellation (e.g. the losing side of a hedge)
+            remove_job_files(output_dir)
+        else:
+            info_path.unlink(missing_ok=True)
+            filepath_path.unlink(missing_ok=True)
 
 
-def extract_title_from_path(file_path: Path, unique_id: str) -> str:
-    title = file_path.stem
-    prefix = f"{unique_id}_"
-    if title.startswith(prefix):
-        title = title[len(prefix):]
-    return title or "Unknown"
+def extract_title_from_path(file_path: Path) -> str:
+    return file_path.stem or "Unknown"
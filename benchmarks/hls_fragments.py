@@ -0,0 +1,55 @@
+"""
+HLS download time by --concurrent-fragments, through run_ytdlp and the fragment budget.
+
+    python -m benchmarks.hls_fragments [--rtt 0.08] [--segments 40] [--runs 3] [--fragments 1 2 4 8]
+
+Every segment of the local fixture stream is delayed by `--rtt` seconds, so the
+time is dominated by per-segment round trips, as for a remote CDN. Without ffmpeg
+the final --add-metadata step fails; the fetch itself is still timed.
+"""
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from app.services.ytdlp_wrapper import run_ytdlp
+from tests.fixtures.hls import STATE, make_app
+from tests.fixtures.server import serve
+
+
+async def _download(url: str, fragments: int) -> float:
+    with tempfile.TemporaryDirectory(prefix="hls-bench-") as tmp:
+        start = time.perf_counter()
+        ok, _, error = await run_ytdlp(url, output_dir=Path(tmp), extract_audio=False, fragments=fragments)
+        elapsed = time.perf_counter() - start
+    if not ok and "ffmpeg not found" not in error:
+        raise RuntimeError(error)
+    return elapsed
+
+
+async def bench(rtt: float, segments: int, runs: int, fragments: list[int]) -> None:
+    app = make_app(segments=segments, latency=rtt)
+    async with serve(app) as base:
+        url = f"{base}/stream.m3u8"
+        print(f"fixture RTT {rtt * 1000:.0f} ms, {segments} segments (probe included)")
+        for wanted in fragments:
+            app[STATE]["peak"] = 0
+            samples = [await _download(url, wanted) for _ in range(runs)]
+            print(f"fragments={wanted:<3} median {statistics.median(samples) * 1000:8.1f} ms   "
+                  f"min {min(samples) * 1000:8.1f} ms   peak connections {app[STATE]['peak']}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rtt", type=float, default=0.08, help="simulated round trip per segment (s)")
+    parser.add_argument("--segments", type=int, default=40)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--fragments", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+    asyncio.run(bench(args.rtt, args.segments, args.runs, args.fragments))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+SoundCloud search: api-v2 client vs the old `yt-dlp -j scsearchN:` path.
+
+    python -m benchmarks.soundcloud_search [--rtt 0.08] [--runs 10] [--limit 10] [--live]
+
+Offline (default) the API client runs against the local fixture server with `--rtt`
+seconds added to every response. yt-dlp's SoundCloud extractor can't be pointed at
+the fixture, so for the old path only its fixed cost is measured: process start
+and extractor setup until its first request (sent to a dead proxy), a lower bound
+that excludes every network round trip. `--live` times both paths against
+soundcloud.com instead.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from app.services.soundcloud_api import SoundCloudAPI
+from app.services.http import close_session
+from app.services.ytdlp_wrapper import get_ytdlp_path
+from tests.fixtures.server import serve
+from tests.fixtures.soundcloud import make_app
+
+QUERY = "lofi hip hop"
+
+
+async def _ytdlp_search(limit: int, extra: list[str]) -> float:
+    start = time.perf_counter()
+    proc = await asyncio.create_subprocess_exec(
+        get_ytdlp_path(), "-j", "--no-download", *extra, f"scsearch{limit}:{QUERY}",
+        stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL
+    )
+    await proc.wait()
+    return time.perf_counter() - start
+
+
+async def _api_search(api: SoundCloudAPI, limit: int) -> float:
+    start = time.perf_counter()
+    results = await api.search(QUERY, limit=limit)
+    assert len(results) == limit, len(results)
+    return time.perf_counter() - start
+
+
+def _report(name: str, samples: list[float]) -> None:
+    print(f"{name:<44} median {statistics.median(samples) * 1000:8.1f} ms   "
+          f"min {min(samples) * 1000:8.1f} ms   n={len(samples)}")
+
+
+async def offline(rtt: float, runs: int, limit: int) -> None:
+    async with serve(make_app(total=500, latency=rtt)) as base:
+        # Cold: scrape page + bundles for the client_id, then search
+        cold = [await _api_search(SoundCloudAPI(api_url=base, site_url=base), limit) for _ in range(runs)]
+        api = SoundCloudAPI(api_url=base, site_url=base)
+        await api.get_client_id()
+        warm = [await _api_search(api, limit) for _ in range(runs)]
+    floor = [
+        await _ytdlp_search(limit, ["--proxy", "http://127.0.0.1:9", "--socket-timeout", "1", "--retries", "0"])
+        for _ in range(runs)
+    ]
+    print(f"fixture RTT {rtt * 1000:.0f} ms, {limit} results per search")
+    _report("api-v2 client, cold (client_id scrape)", cold)
+    _report("api-v2 client, warm", warm)
+    _report("yt-dlp scsearch, fixed cost only (no I/O)", floor)
+
+
+async def live(runs: int, limit: int) -> None:
+    api = SoundCloudAPI()
+    try:
+        await api.get_client_id()
+        warm = [await _api_search(api, limit) for _ in range(runs)]
+    finally:
+        await close_session()
+    ytdlp = [await _ytdlp_search(limit, []) for _ in range(runs)]
+    print(f"soundcloud.com, {limit} results per search")
+    _report("api-v2 client, warm", warm)
+    _report("yt-dlp scsearch", ytdlp)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rtt", type=float, default=0.08, help="simulated round trip per fixture response (s)")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--live", action="store_true", help="benchmark against soundcloud.com")
+    args = parser.parse_args()
+    asyncio.run(live(args.runs, args.limit) if args.live else offline(args.rtt, args.runs, args.limit))
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,8 @@ import sys
 
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.enums import ParseMode
 from aiogram.fsm.storage.memory import MemoryStorage
 
@@ -15,13 +17,24 @@ from app.handlers.search import router as search_router
 from app.handlers.history import router as history_router
 from app.handlers.inline import router as inline_router
 from app.healthcheck import start_healthcheck_server
+from app.services.executor import cpu_executor
+from app.services.http import close_session
+from app.services.janitor import janitor
 
 
 async def main() -> None:
     config.validate()
     
+    session = None
+    if config.TELEGRAM_API_URL:
+        session = AiohttpSession(
+            api=TelegramAPIServer.from_base(config.TELEGRAM_API_URL, is_local=config.TELEGRAM_API_LOCAL)
+        )
+        logging.info(f"Using Bot API server {config.TELEGRAM_API_URL} (local={config.TELEGRAM_API_LOCAL})")
+    
     bot = Bot(
         token=config.BOT_TOKEN,
+        session=session,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML)
     )
     
@@ -39,13 +52,19 @@ async def main() -> None:
     health_runner = await start_healthcheck_server()
     logging.info(f"Healthcheck server started on port {config.HEALTH_PORT}")
     
+    # Sweeps leftovers of previous runs right away, then periodically
+    janitor.start()
+    
     logging.info("Bot started")
     
     try:
         await dp.start_polling(bot)
     finally:
+        await janitor.stop()
         await health_runner.cleanup()
         await bot.session.close()
+        await close_session()
+        cpu_executor.shutdown()
 
 
 if __name__ == "__main__":
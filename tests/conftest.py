@@ -0,0 +1,5 @@
+"""Keep scratch files out of the real DOWNLOAD_DIR; must run before app.config is imported."""
+import os
+import tempfile
+
+os.environ.setdefault("DOWNLOAD_DIR", tempfile.mkdtemp(prefix="tg-media-tests-"))
@@ -0,0 +1,41 @@
+"""
+Local HLS stream: a media playlist of `segments` TS segments at /stream.m3u8,
+each segment delayed by `latency` seconds. Tracks how many segment requests are
+in flight at once, so tests can check the fragment budget from the server side.
+"""
+import asyncio
+
+from aiohttp import web
+
+# Mutable per-app state: request counters and the in-flight segment peak
+STATE = web.AppKey("state", dict)
+
+SEGMENT_SIZE = 188 * 64
+
+
+def make_app(segments: int = 20, latency: float = 0.0) -> web.Application:
+    app = web.Application()
+    state = app[STATE] = {"manifest": 0, "segments": 0, "in_flight": 0, "peak": 0}
+
+    async def manifest(request: web.Request) -> web.Response:
+        state["manifest"] += 1
+        lines = ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-TARGETDURATION:2", "#EXT-X-MEDIA-SEQUENCE:0"]
+        for i in range(segments):
+            lines += ["#EXTINF:2.0,", f"seg{i}.ts"]
+        lines.append("#EXT-X-ENDLIST")
+        return web.Response(text="\n".join(lines) + "\n", content_type="application/vnd.apple.mpegurl")
+
+    async def segment(request: web.Request) -> web.Response:
+        state["segments"] += 1
+        state["in_flight"] += 1
+        state["peak"] = max(state["peak"], state["in_flight"])
+        try:
+            await asyncio.sleep(latency)
+            # TS sync byte at every packet start; the payload itself is never decoded
+            return web.Response(body=(b"\x47" + bytes(187)) * (SEGMENT_SIZE // 188), content_type="video/mp2t")
+        finally:
+            state["in_flight"] -= 1
+
+    app.router.add_get("/stream.m3u8", manifest)
+    app.router.add_get("/seg{n}.ts", segment)
+    return app
@@ -0,0 +1,71 @@
+"""
+Local stand-in for Pinterest's resource API and pinimg media: BoardResource,
+BoardFeedResource with bookmark pagination, and /media/<name>.jpg images.
+Point the downloader at it by patching pinterest.PINTEREST_BASE.
+"""
+import asyncio
+import json
+from typing import Optional
+
+from aiohttp import web
+
+BOARD_ID = "1234567890"
+USERNAME = "someone"
+SLUG = "my-board"
+
+# Mutable per-app state: request counters
+STATE = web.AppKey("state", dict)
+
+
+def _pin(i: int, base: str) -> dict:
+    return {
+        "type": "pin",
+        "id": str(1000 + i),
+        "title": f"Pin {i}",
+        "images": {"orig": {"url": f"{base}/media/{i}.jpg"}},
+    }
+
+
+def make_app(total: int = 60, page_size: int = 25, media_latency: Optional[dict[int, float]] = None) -> web.Application:
+    """
+    A board with `total` pins served `page_size` per feed page. Every page but the
+    first repeats the last pin of the page before it and carries a story, a pin
+    without media and an ad, all of which the client must skip.
+    `media_latency` delays individual images by pin index (seconds).
+    """
+    app = web.Application()
+    state = app[STATE] = {"board": 0, "feed": 0, "media": 0}
+    media_latency = media_latency or {}
+
+    async def board(request: web.Request) -> web.Response:
+        state["board"] += 1
+        options = json.loads(request.query["data"])["options"]
+        if (options.get("username"), options.get("slug")) != (USERNAME, SLUG):
+            return web.json_response({"resource_response": {"error": {"http_status": 404}}}, status=404)
+        data = {"id": BOARD_ID, "name": "My Board", "pin_count": total}
+        return web.json_response({"resource_response": {"data": data}})
+
+    async def feed(request: web.Request) -> web.Response:
+        state["feed"] += 1
+        options = json.loads(request.query["data"])["options"]
+        assert options["board_id"] == BOARD_ID
+        bookmarks = options.get("bookmarks") or []
+        start = int(bookmarks[0]) if bookmarks else 0
+        end = min(start + page_size, total)
+        base = f"{request.scheme}://{request.host}"
+        items = [_pin(i, base) for i in range(start, end)]
+        if start:
+            items = [_pin(start - 1, base), {"type": "story", "id": "s1"}, {"type": "pin", "id": f"bare{start}"},
+                     {"type": "pin", "id": "", "is_promoted": True}] + items
+        bookmark = str(end) if end < total else "-end-"
+        return web.json_response({"resource_response": {"data": items, "bookmark": bookmark}})
+
+    async def media(request: web.Request) -> web.Response:
+        state["media"] += 1
+        await asyncio.sleep(media_latency.get(int(request.match_info["n"]), 0))
+        return web.Response(body=b"\xff\xd8\xff\xe0" + bytes(1024), content_type="image/jpeg")
+
+    app.router.add_get("/resource/BoardResource/get/", board)
+    app.router.add_get("/resource/BoardFeedResource/get/", feed)
+    app.router.add_get("/media/{n}.jpg", media)
+    return app
@@ -0,0 +1,20 @@
+"""Run an aiohttp app on a free local port for the duration of a test or benchmark."""
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from app.services.http import close_session
+
+
+@asynccontextmanager
+async def serve(app: web.Application) -> AsyncIterator[str]:
+    """Yields the base URL. The shared client session is closed on exit: it is bound to this loop."""
+    server = TestServer(app)
+    await server.start_server()
+    try:
+        yield str(server.make_url("")).rstrip("/")
+    finally:
+        await close_session()
+        await server.close()
@@ -0,0 +1,86 @@
+"""
+Local stand-in for soundcloud.com and api-v2: the web page, JS bundles (one holding
+the client_id) and /search/tracks with next_href pagination. Serve both from one
+app and point SoundCloudAPI(api_url=..., site_url=...) at it.
+"""
+import asyncio
+from urllib.parse import urlencode
+
+from aiohttp import web
+
+CLIENT_ID = "Fx1cLientId0000000000000000000aB"
+
+# Mutable per-app state: "client_id" (set it to rotate the id) and request counters
+STATE = web.AppKey("state", dict)
+
+
+def _track(i: int) -> dict:
+    return {
+        "kind": "track",
+        "id": i,
+        "title": f"Track {i}",
+        "permalink_url": f"https://soundcloud.com/artist-{i}/track-{i}",
+        "full_duration": 180_000 + i * 1000,
+        "user": {"username": f"Artist {i}"},
+    }
+
+
+def _origin(request: web.Request) -> str:
+    return f"{request.scheme}://{request.host}"
+
+
+def make_app(total: int = 60, latency: float = 0.0, client_id: str = CLIENT_ID) -> web.Application:
+    """
+    `total` search hits; every response is delayed by `latency` seconds (simulated RTT).
+    Each result page also carries one playlist, which the client must skip.
+    Counters and the active client_id are in app[STATE].
+    """
+    app = web.Application()
+    state = app[STATE] = {"client_id": client_id, "site": 0, "bundle": 0, "search": 0, "rejected": 0}
+
+    async def delay() -> None:
+        if latency:
+            await asyncio.sleep(latency)
+
+    async def site(request: web.Request) -> web.Response:
+        await delay()
+        state["site"] += 1
+        # Absolute bundle URLs, as served from the sndcdn.com CDN
+        origin = _origin(request)
+        html = (
+            f'<html><head><script crossorigin src="{origin}/assets/vendor-1a2b.js"></script>'
+            f'<script crossorigin src="{origin}/assets/app-3c4d.js"></script></head><body></body></html>'
+        )
+        return web.Response(text=html, content_type="text/html")
+
+    async def bundle(request: web.Request) -> web.Response:
+        await delay()
+        state["bundle"] += 1
+        if request.match_info["name"] == "app-3c4d":
+            body = f'!function(){{var e={{client_id:"{state["client_id"]}",env:"production"}}}}();'
+        else:
+            body = "!function(){var vendor=1}();"
+        return web.Response(text=body, content_type="application/javascript")
+
+    async def search(request: web.Request) -> web.Response:
+        await delay()
+        state["search"] += 1
+        if request.query.get("client_id") != state["client_id"]:
+            state["rejected"] += 1
+            return web.json_response({"error": "unauthorized"}, status=401)
+        offset = int(request.query.get("offset", 0))
+        limit = int(request.query.get("limit", 10))
+        end = min(offset + limit, total)
+        collection = [{"kind": "playlist", "permalink_url": "https://soundcloud.com/x/sets/y"}]
+        collection += [_track(i) for i in range(offset, end)]
+        next_href = None
+        if end < total:
+            # Like the real API: absolute, with its own query string but without client_id
+            query = urlencode({"q": request.query.get("q", ""), "offset": end, "limit": limit})
+            next_href = f"{_origin(request)}{request.path}?{query}"
+        return web.json_response({"collection": collection, "next_href": next_href})
+
+    app.router.add_get("/", site)
+    app.router.add_get("/assets/{name}.js", bundle)
+    app.router.add_get("/search/tracks", search)
+    return app
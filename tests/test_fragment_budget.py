@@ -0,0 +1,114 @@
+import asyncio
+import shutil
+from pathlib import Path
+
+import pytest
+
+from app.services import ytdlp_wrapper
+from app.services.ytdlp_wrapper import FragmentBudget, get_ytdlp_path, run_ytdlp
+from tests.fixtures.hls import STATE, make_app
+from tests.fixtures.server import serve
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_reserve_never_grants_more_than_the_total():
+    budget = FragmentBudget(6)
+    peak = 0
+
+    async def job(wanted: int) -> int:
+        nonlocal peak
+        async with budget.reserve(wanted) as granted:
+            peak = max(peak, budget.in_use)
+            assert 1 <= granted <= wanted
+            await asyncio.sleep(0.01)
+            return granted
+
+    async def main():
+        return await asyncio.gather(*(job(4) for _ in range(10)))
+
+    grants = run(main())
+    assert peak <= 6
+    assert budget.in_use == 0 and budget.waiting == 0
+    # The first job gets all it asked for, the second only what is left
+    assert grants[:2] == [4, 2]
+
+
+def test_reserve_waits_only_while_the_budget_is_exhausted():
+    budget = FragmentBudget(2)
+    events = []
+
+    async def holder():
+        async with budget.reserve(2):
+            events.append("held")
+            await asyncio.sleep(0.05)
+        events.append("released")
+
+    async def waiter():
+        await asyncio.sleep(0.01)
+        async with budget.reserve(2) as granted:
+            events.append(("granted", granted))
+
+    async def main():
+        await asyncio.gather(holder(), waiter())
+
+    run(main())
+    assert events == ["held", "released", ("granted", 2)]
+
+
+def test_single_connection_jobs_bypass_the_budget():
+    budget = FragmentBudget(1)
+
+    async def main():
+        async with budget.reserve(4):
+            async with budget.reserve(1) as granted:
+                return granted, budget.in_use
+
+    assert run(main()) == (1, 1)
+
+
+def test_cancelled_waiter_leaves_no_reservation():
+    budget = FragmentBudget(2)
+
+    async def main():
+        async with budget.reserve(2):
+            waiter = asyncio.create_task(budget.reserve(2).__aenter__())
+            await asyncio.sleep(0.01)
+            assert budget.waiting == 1
+            waiter.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiter
+        return budget.stats()
+
+    assert run(main()) == {"total": 2, "in_use": 0, "waiting": 0}
+
+
+def _has_ytdlp() -> bool:
+    path = get_ytdlp_path()
+    return Path(path).exists() or shutil.which(path) is not None
+
+
+@pytest.mark.skipif(not _has_ytdlp(), reason="yt-dlp is not installed")
+def test_concurrent_ytdlp_jobs_share_the_fragment_budget(monkeypatch, tmp_path):
+    """Three HLS downloads asking for 4 fragments each stay within a budget of 4 connections."""
+    monkeypatch.setattr(ytdlp_wrapper, "fragment_budget", FragmentBudget(4))
+
+    async def main():
+        app = make_app(segments=12, latency=0.05)
+        async with serve(app) as base:
+            results = await asyncio.gather(*(
+                run_ytdlp(f"{base}/stream.m3u8", output_dir=tmp_path / str(i), extract_audio=False, fragments=4)
+                for i in range(3)
+            ))
+        return app[STATE], results
+
+    for i in range(3):
+        (tmp_path / str(i)).mkdir()
+    state, results = run(main())
+    # --add-metadata needs ffmpeg; without it only the post-processing step fails
+    assert all(ok or "ffmpeg not found" in error for ok, _, error in results), results
+    assert state["segments"] == 36
+    # Fragments did run in parallel, but never beyond the shared budget
+    assert 1 < state["peak"] <= 4
@@ -0,0 +1,167 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.handlers import mp3tools as handler
+from app.handlers.mp3tools import BatchJob, handle_batch_file, handle_batch_template, run_batch
+from app.services.mp3tools import MP3Tags
+
+USER = 7
+
+
+class FakeMessage(SimpleNamespace):
+    def __init__(self, message_id: int = 1, audio=None, document=None, text=None, replies=None):
+        super().__init__(
+            message_id=message_id, audio=audio, document=document, text=text, bot=None,
+            from_user=SimpleNamespace(id=USER), chat=SimpleNamespace(id=USER),
+            replies=[] if replies is None else replies,
+        )
+
+    async def answer(self, text, **kwargs):
+        self.replies.append(text)
+        return SimpleNamespace(edit_text=self._edit, delete=self._delete)
+
+    async def _edit(self, text, **kwargs):
+        self.replies.append(text)
+
+    async def _delete(self):
+        pass
+
+
+class FakeState:
+    async def clear(self):
+        pass
+
+
+def _audio(n: int) -> SimpleNamespace:
+    return SimpleNamespace(file_id=f"f{n}", file_size=1000, title=f"Song {n}", file_name=None, mime_type="audio/mpeg")
+
+
+def _document(name: str, mime_type: str) -> SimpleNamespace:
+    return SimpleNamespace(file_id=name, file_size=1000, file_name=name, mime_type=mime_type)
+
+
+@pytest.fixture
+def batch(monkeypatch):
+    """A fresh batch for USER; downloads block until `gate` is set. Yields (job, gate, sent weights)."""
+    gate = asyncio.Event()
+    sent = []
+
+    async def fetch(bot, file_id, file_size, destination):
+        await gate.wait()
+        destination.write_bytes(b"ID3")
+        return True
+
+    async def tag_many(items, cover=None):
+        return [tags for _, tags, _ in items]
+
+    async def send(chat_id, request, weight=1, idempotent=False):
+        sent.append(weight)
+
+    monkeypatch.setattr(handler, "fetch_telegram_file", fetch)
+    monkeypatch.setattr(handler.mp3tools, "tag_many", tag_many)
+    monkeypatch.setattr(handler.uploader, "send", send)
+    job = handler._batches[USER] = BatchJob()
+    yield job, gate, sent
+    handler.discard_batch(USER)
+
+
+def test_run_batch_waits_for_files_still_downloading(batch):
+    job, gate, sent = batch
+
+    async def main():
+        uploads = [asyncio.create_task(handle_batch_file(FakeMessage(i, audio=_audio(i)))) for i in range(3)]
+        await asyncio.sleep(0)
+        assert job.pending == 3
+        processing = asyncio.create_task(run_batch(FakeMessage(10), FakeState(), MP3Tags(album="A")))
+        await asyncio.sleep(0.01)
+        assert not processing.done()
+        gate.set()
+        await asyncio.gather(*uploads, processing)
+        return [path for _, path, _ in job.files]
+
+    paths = asyncio.run(main())
+    assert sent == [3]
+    assert len(paths) == 3
+    assert USER not in handler._batches
+    # Sent files are cleaned up afterwards
+    assert not any(path.exists() for path in paths)
+
+
+def test_file_finishing_after_cancel_is_dropped(batch):
+    job, gate, _ = batch
+
+    async def main():
+        upload = asyncio.create_task(handle_batch_file(FakeMessage(1, audio=_audio(1))))
+        await asyncio.sleep(0)
+        handler.discard_batch(USER)
+        gate.set()
+        await upload
+
+    asyncio.run(main())
+    assert job.files == []
+    assert job.pending == 0
+
+
+def test_pending_downloads_count_against_the_limit(batch, monkeypatch):
+    monkeypatch.setattr(handler, "MAX_BATCH_FILES", 2)
+    job, gate, _ = batch
+    replies = []
+
+    async def main():
+        uploads = [
+            asyncio.create_task(handle_batch_file(FakeMessage(i, audio=_audio(i), replies=replies)))
+            for i in range(3)
+        ]
+        await asyncio.sleep(0)
+        gate.set()
+        await asyncio.gather(*uploads)
+
+    asyncio.run(main())
+    assert len(job.files) == 2
+    assert replies == [handler.t(USER, "batch_too_many")]
+
+
+def test_mp3_documents_are_collected(batch):
+    job, gate, _ = batch
+    gate.set()
+    replies = []
+
+    async def main():
+        await handle_batch_file(FakeMessage(1, document=_document("Intro.MP3", "application/octet-stream")))
+        await handle_batch_file(FakeMessage(2, document=_document("cover.png", "image/png"), replies=replies))
+
+    asyncio.run(main())
+    assert [(message_id, title) for message_id, _, title in job.files] == [(1, "Intro")]
+    assert replies == [handler.t(USER, "mp3tools_send_file")]
+
+
+def test_template_track_is_rejected(batch):
+    job, _, sent = batch
+    replies = []
+
+    asyncio.run(handle_batch_template(FakeMessage(text="album: A\ntrack: 1", replies=replies), FakeState()))
+    assert replies == [handler.t(USER, "batch_no_track")]
+    assert handler._batches[USER] is job
+    assert sent == []
+
+
+def test_files_that_fail_tagging_are_reported(batch, monkeypatch):
+    job, gate, sent = batch
+    gate.set()
+    replies = []
+
+    async def tag_many(items, cover=None):
+        return [None if i == 1 else tags for i, (_, tags, _) in enumerate(items)]
+
+    monkeypatch.setattr(handler.mp3tools, "tag_many", tag_many)
+
+    async def main():
+        for i in range(3):
+            await handle_batch_file(FakeMessage(i, audio=_audio(i)))
+        await run_batch(FakeMessage(10, replies=replies), FakeState(), MP3Tags())
+
+    asyncio.run(main())
+    assert sent == [2]
+    assert replies[-1] == f"{handler.t(USER, 'batch_untagged')}: 1/3"
@@ -0,0 +1,142 @@
+import asyncio
+import re
+import time
+from contextlib import aclosing
+
+import pytest
+
+from app.config import config
+from app.handlers.download import URL_PATTERN
+from app.services import pinterest
+from app.services.janitor import JOBS_DIR
+from app.services.pin_cache import PinMedia, pin_cache
+from app.services.pinterest import PinterestDownloader
+from tests.fixtures.pinterest import SLUG, STATE, USERNAME, make_app
+from tests.fixtures.server import serve
+
+BOARD_URL = f"https://www.pinterest.com/{USERNAME}/{SLUG}/"
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def _extract(text: str):
+    """The URL the download handler picks out of a message, if it is a board."""
+    match = re.search(URL_PATTERN, text)
+    if not match or not PinterestDownloader.is_board(match.group(0)):
+        return None
+    return match.group(0)
+
+
+@pytest.mark.parametrize("text, url", [
+    ("https://www.pinterest.com/someone/my-board/", "https://www.pinterest.com/someone/my-board/"),
+    ("https://pinterest.co.uk/some.one/my-board", "https://pinterest.co.uk/some.one/my-board"),
+    ("look: https://pinterest.com/someone/my-board/.", "https://pinterest.com/someone/my-board/"),
+    ("https://pinterest.com/someone/my-board, nice", "https://pinterest.com/someone/my-board"),
+    ("(https://pinterest.com/someone/my-board)", "https://pinterest.com/someone/my-board"),
+    ("https://pinterest.com/someone/my-board/?invite_code=x", "https://pinterest.com/someone/my-board/"),
+    ("https://pinterest.com/someone/pinspiration/", "https://pinterest.com/someone/pinspiration/"),
+    ("https://pinterest.com/someone/followers-of-art/", "https://pinterest.com/someone/followers-of-art/"),
+])
+def test_board_urls_are_recognised(text, url):
+    assert _extract(text) == url
+
+
+@pytest.mark.parametrize("text", [
+    "https://pinterest.com/someone/_saved/",
+    "https://pinterest.com/someone/_created",
+    "https://pinterest.com/someone/pins/",
+    "https://pinterest.com/someone/boards/.",
+    "https://pinterest.com/someone/followers/",
+    "https://pinterest.com/someone/following",
+    "https://pinterest.com/search/pins/?q=cats",
+    "https://pinterest.com/ideas/cats/123/",
+    "https://pinterest.com/someone/my-board/section/",
+])
+def test_non_board_urls_are_rejected(text):
+    assert _extract(text) is None
+
+
+def test_pin_urls_are_not_boards():
+    assert re.search(URL_PATTERN, "https://pinterest.com/pin/123456/")
+    assert not PinterestDownloader.is_board("https://pinterest.com/pin/123456/")
+
+
+def test_board_pins_follows_bookmarks_and_skips_duplicates(monkeypatch):
+    async def main():
+        app = make_app(total=60, page_size=25)
+        async with serve(app) as base:
+            monkeypatch.setattr(pinterest, "PINTEREST_BASE", base)
+            result = await PinterestDownloader().board_pins(BOARD_URL)
+        return app[STATE], result
+
+    state, (pins, name, error) = run(main())
+    assert error == ""
+    assert name == "My Board"
+    # Three pages; repeated pins, stories, ads and pins without media are dropped
+    assert state["feed"] == 3
+    assert [pin_id for pin_id, _ in pins] == [str(1000 + i) for i in range(60)]
+    assert pins[0][1].title == "Pin 0"
+    assert pin_cache.get("1059") == pins[-1][1]
+
+
+def test_board_pins_stops_at_the_pin_limit(monkeypatch):
+    monkeypatch.setattr(config, "PINTEREST_BOARD_MAX_PINS", 30)
+
+    async def main():
+        app = make_app(total=200, page_size=25)
+        async with serve(app) as base:
+            monkeypatch.setattr(pinterest, "PINTEREST_BASE", base)
+            result = await PinterestDownloader().board_pins(BOARD_URL)
+        return app[STATE], result
+
+    state, (pins, _, error) = run(main())
+    assert error == ""
+    assert len(pins) == 30
+    assert state["feed"] == 2
+
+
+def test_unknown_board_is_not_found(monkeypatch):
+    async def main():
+        async with serve(make_app()) as base:
+            monkeypatch.setattr(pinterest, "PINTEREST_BASE", base)
+            return await PinterestDownloader().board_pins(f"https://www.pinterest.com/{USERNAME}/other/")
+
+    pins, _, error = run(main())
+    assert pins == [] and error == pinterest.NOT_FOUND_ERROR
+
+
+def _job_dirs() -> set:
+    return set(JOBS_DIR.iterdir()) if JOBS_DIR.exists() else set()
+
+
+def test_download_pins_closed_early_cancels_and_cleans_up(monkeypatch):
+    monkeypatch.setattr(config, "PINTEREST_BOARD_CONCURRENCY", 4)
+    # Pin 0 is instant, 1-2 finish while nobody is reading, the rest never do
+    latency = {0: 0.0, 1: 0.05, 2: 0.05, **{i: 30.0 for i in range(3, 8)}}
+
+    async def main():
+        app = make_app(media_latency=latency)
+        before = _job_dirs()
+        async with serve(app) as base:
+            pins = [(str(i), PinMedia(f"{base}/media/{i}.jpg", None, f"Pin {i}")) for i in range(8)]
+            start = time.monotonic()
+            async with aclosing(PinterestDownloader().download_pins(pins)) as results:
+                async for pin_id, result in results:
+                    delivered = (pin_id, result)
+                    await asyncio.sleep(0.3)
+                    break
+            elapsed = time.monotonic() - start
+            left = _job_dirs() - before
+        return app[STATE], delivered, elapsed, left
+
+    state, (pin_id, result), elapsed, left = run(main())
+    assert pin_id == "0" and result.success
+    # At most four at a time: the eighth never started, and closing did not wait for 3-6
+    assert state["media"] == 7
+    assert elapsed < 5
+    # The delivered file is the caller's; the finished but undelivered ones are gone
+    assert left == {result.file_path.parent}
+    result.file_path.unlink()
+    result.file_path.parent.rmdir()
@@ -0,0 +1,94 @@
+from app.services.pinterest import VIDEO_LOOKAHEAD, _PageScanner
+
+ORIGINAL = "https://i.pinimg.com/originals/ab/cd/ef/abcdef0123456789.jpg"
+THUMB = "https://i.pinimg.com/736x/ab/cd/ef/abcdef0123456789.jpg"
+VIDEO = "https://v1.pinimg.com/videos/mc/720p/ab/cd/ef/abcdef0123456789.mp4"
+RELATED_VIDEO = "https://v1.pinimg.com/videos/mc/720p/99/99/99/related.mp4"
+
+
+def _image(url: str) -> str:
+    return f'{{"url":"{url}","width":1200}}'
+
+
+def _page(*parts: str) -> str:
+    return "<html><head><title>Sunset over the bay | Pinterest</title></head><body>" + "".join(parts)
+
+
+def _filler(size: int) -> str:
+    return ('{"node":"' + "x" * 90 + '"},') * (size // 100 + 1)
+
+
+def _chunks(text: str, size: int) -> list[str]:
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def _scan(chunks: list[str]) -> tuple[_PageScanner, int]:
+    """Feed chunks the way _scan_page does; returns the scanner and the characters consumed."""
+    scanner = _PageScanner()
+    for chunk in chunks:
+        scanner.feed(chunk)
+        if scanner.done:
+            break
+    return scanner, scanner.scanned
+
+
+def test_matches_split_across_a_chunk_boundary_are_found():
+    page = _page(_filler(1000), _image(THUMB), _filler(1000), _image(ORIGINAL), _filler(1000))
+    start = page.index(ORIGINAL)
+    # Cut the page inside the originals URL at every offset, and inside the title
+    for cut in list(range(start - 8, start + len(ORIGINAL) + 8)) + [20, 30, 40]:
+        scanner = _PageScanner()
+        scanner.feed(page[:cut])
+        scanner.feed(page[cut:])
+        media = scanner.result()
+        assert media.image_url == ORIGINAL, cut
+        assert media.title == "Sunset over the bay", cut
+
+
+def test_small_chunks_still_match():
+    page = _page(_filler(500), _image(ORIGINAL), VIDEO, _filler(500))
+    for size in (1, 7, 64, 1000):
+        media = _scan(_chunks(page, size))[0].result()
+        assert (media.image_url, media.video_url) == (ORIGINAL, VIDEO), size
+
+
+def test_video_before_image_stops_at_once():
+    page = _page(VIDEO, _filler(50_000), _image(ORIGINAL), _filler(500_000))
+    scanner, consumed = _scan(_chunks(page, 16 * 1024))
+    media = scanner.result()
+    assert media.video_url == VIDEO
+    assert media.image_url is None
+    assert consumed == 16 * 1024
+
+
+def test_scan_stops_after_the_lookahead_past_the_originals_image():
+    page = _page(_image(ORIGINAL), _filler(VIDEO_LOOKAHEAD + 64 * 1024), RELATED_VIDEO, _filler(1024 * 1024))
+    chunk_size = 16 * 1024
+    scanner, consumed = _scan(_chunks(page, chunk_size))
+    media = scanner.result()
+    # An .mp4 beyond the lookahead belongs to a related pin
+    assert media.image_url == ORIGINAL
+    assert media.video_url is None
+    assert VIDEO_LOOKAHEAD < consumed <= VIDEO_LOOKAHEAD + 2 * chunk_size
+    assert consumed < page.index(RELATED_VIDEO)
+
+
+def test_video_within_the_lookahead_is_the_pins_own():
+    page = _page(_image(ORIGINAL), _filler(100 * 1024), VIDEO, _filler(1024 * 1024))
+    scanner, consumed = _scan(_chunks(page, 16 * 1024))
+    assert scanner.result().video_url == VIDEO
+    assert consumed < 200 * 1024
+
+
+def test_no_originals_reads_the_whole_page_and_falls_back():
+    page = _page(_filler(10_000), _image(THUMB), _filler(400_000))
+    scanner, consumed = _scan(_chunks(page, 16 * 1024))
+    assert not scanner.done
+    assert consumed == len(page)
+    assert scanner.result().image_url == THUMB
+
+
+def test_missing_title_defaults_to_pinterest():
+    scanner = _PageScanner()
+    scanner.feed("<html>" + _image(ORIGINAL))
+    assert scanner.result().title == "Pinterest"
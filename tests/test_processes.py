@@ -0,0 +1,57 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+from app.services.processes import DEVNULL, ProcessSupervisor
+
+linux_only = pytest.mark.skipif(not sys.platform.startswith("linux"), reason="prlimit and /proc are Linux-only")
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def _cpu_limit(pid: int) -> str:
+    with open(f"/proc/{pid}/limits") as f:
+        line = next(line for line in f if line.startswith("Max cpu time"))
+    return " ".join(line.split()[3:5])
+
+
+@linux_only
+def test_cpu_limit_is_applied_to_the_child_and_what_it_spawns():
+    async def main():
+        supervisor = ProcessSupervisor(max_rss=0, cpu_seconds=30)
+        # The shell forks the sleep after the limit was set on the shell
+        async with supervisor.spawn("sh", "-c", "sleep 0.2; sleep 5 & echo $!; wait", name="sh", stderr=DEVNULL) as child:
+            grandchild = int(await child.proc.stdout.readline())
+            return _cpu_limit(child.proc.pid), _cpu_limit(grandchild), os.getpid()
+
+    child_limit, grandchild_limit, parent = run(main())
+    assert child_limit == grandchild_limit == "30 35"
+    # The bot's own limit is untouched
+    assert _cpu_limit(parent) != "30 35"
+
+
+@linux_only
+def test_cpu_hog_is_stopped_and_reported():
+    async def main():
+        supervisor = ProcessSupervisor(max_rss=0, cpu_seconds=1)
+        async with supervisor.spawn("sh", "-c", "while :; do :; done", name="sh", stdout=DEVNULL) as child:
+            await asyncio.wait_for(child.proc.wait(), timeout=20)
+            return child.limit_error
+
+    assert run(main()) == "CPU time limit exceeded"
+
+
+def test_child_still_running_at_exit_is_killed_and_reaped():
+    async def main():
+        supervisor = ProcessSupervisor(max_rss=0, cpu_seconds=0)
+        async with supervisor.spawn("sleep", "30", name="sleep", stdout=DEVNULL) as child:
+            proc = child.proc
+        return proc.returncode, supervisor.stats()
+
+    returncode, stats = run(main())
+    assert returncode is not None
+    assert stats["running"] == 0 and stats["killed"] == 1
@@ -0,0 +1,69 @@
+import asyncio
+
+from app.services.soundcloud_api import SoundCloudAPI
+from tests.fixtures.server import serve
+from tests.fixtures.soundcloud import CLIENT_ID, STATE, make_app
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_search_paginates_and_returns_ytdlp_shape():
+    async def main():
+        app = make_app(total=60)
+        async with serve(app) as base:
+            api = SoundCloudAPI(api_url=base, site_url=base)
+            results = await api.search("lofi", limit=45)
+        return app, results
+
+    app, results = run(main())
+    assert len(results) == 45
+    assert results[0] == {
+        "title": "Track 0",
+        "url": "https://soundcloud.com/artist-0/track-0",
+        "uploader": "Artist 0",
+        "duration": 180,
+    }
+    # Playlists are skipped and pages follow on from each other without gaps
+    assert [r["title"] for r in results] == [f"Track {i}" for i in range(45)]
+    assert app[STATE]["search"] == 3
+
+
+def test_client_id_is_scraped_once_and_cached():
+    async def main():
+        app = make_app()
+        async with serve(app) as base:
+            api = SoundCloudAPI(api_url=base, site_url=base)
+            await api.search("a", limit=5)
+            await api.search("b", limit=5)
+            client_id = await api.get_client_id()
+        return app, client_id
+
+    app, client_id = run(main())
+    assert client_id == CLIENT_ID
+    assert app[STATE]["site"] == 1
+
+
+def test_rotated_client_id_is_rescraped_and_the_page_retried():
+    async def main():
+        app = make_app()
+        async with serve(app) as base:
+            api = SoundCloudAPI(api_url=base, site_url=base)
+            await api.search("a", limit=5)
+            app[STATE]["client_id"] = "R" * 32
+            results = await api.search("b", limit=5)
+        return app, results
+
+    app, results = run(main())
+    assert len(results) == 5
+    assert app[STATE]["rejected"] == 1
+    assert app[STATE]["site"] == 2
+
+
+def test_short_result_set_stops_at_the_last_page():
+    async def main():
+        async with serve(make_app(total=7)) as base:
+            return await SoundCloudAPI(api_url=base, site_url=base).search("rare", limit=20)
+
+    assert len(run(main())) == 7
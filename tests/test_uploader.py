@@ -0,0 +1,124 @@
+import asyncio
+import socket
+import time
+
+import pytest
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+
+from app.services import uploader as uploader_module
+from app.services.uploader import RateGovernor, TokenBucket, Uploader
+
+TOKEN = "42:TEST"
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    """Skip retry backoff sleeps; returns the delays that were asked for."""
+    delays = []
+    real_sleep = asyncio.sleep
+
+    async def sleep(seconds, *args, **kwargs):
+        delays.append(seconds)
+        await real_sleep(0)
+
+    monkeypatch.setattr(uploader_module.asyncio, "sleep", sleep)
+    return delays
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_oversized_group_is_charged_in_full():
+    bucket = TokenBucket(rate=1, capacity=3)
+    now = time.monotonic()
+    # Passes once the bucket is full, then the excess is waited off by the next send
+    assert bucket.delay(3, now) == 0
+    bucket.take(10)
+    assert bucket.delay(1, now) == pytest.approx(8)
+
+
+def test_governor_charges_albums_against_the_chat_budget():
+    async def main():
+        governor = RateGovernor()
+        await governor.acquire(1, weight=10)
+        return governor._chat_bucket(1).delay(1, time.monotonic())
+
+    assert run(main()) > 5
+
+
+def test_flood_wait_does_not_forgive_debt():
+    bucket = TokenBucket(rate=1, capacity=3)
+    now = time.monotonic()
+    bucket.take(10)
+    bucket.block(2, now)
+    assert bucket.delay(1, now + 2) == pytest.approx(6)
+
+
+def _failing(error: Exception, calls: list):
+    async def request():
+        calls.append(1)
+        raise error
+    return request
+
+
+@pytest.mark.parametrize("idempotent, attempts", [(False, 1), (True, 3)])
+def test_server_errors_are_retried_only_when_idempotent(no_backoff, idempotent, attempts):
+    calls = []
+    error = TelegramServerError(method=None, message="Bad Gateway")
+    with pytest.raises(TelegramServerError):
+        run(Uploader(4, 3).send(1, _failing(error, calls), idempotent=idempotent))
+    assert len(calls) == attempts
+
+
+@pytest.mark.parametrize("idempotent, attempts", [(False, 1), (True, 3)])
+def test_timeouts_are_retried_only_when_idempotent(no_backoff, idempotent, attempts):
+    calls = []
+    error = TelegramNetworkError(method=None, message="Request timeout error")
+    with pytest.raises(TelegramNetworkError):
+        run(Uploader(4, 3).send(1, _failing(error, calls), idempotent=idempotent))
+    assert len(calls) == attempts
+
+
+def test_connection_refused_is_retried_for_uploads(no_backoff):
+    """A request that never reached Telegram is safe to send again."""
+    calls = []
+
+    async def main():
+        session = AiohttpSession(api=TelegramAPIServer.from_base(f"http://127.0.0.1:{_free_port()}"))
+        bot = Bot(TOKEN, session=session)
+        try:
+            async def request():
+                calls.append(1)
+                return await bot.send_message(1, "hi")
+            await Uploader(4, 3).send(1, request)
+        finally:
+            await session.close()
+
+    with pytest.raises(TelegramNetworkError):
+        run(main())
+    assert len(calls) == 3
+
+
+def test_flood_wait_is_honoured_and_retried():
+    calls = []
+
+    async def request():
+        calls.append(1)
+        if len(calls) == 1:
+            raise TelegramRetryAfter(method=None, message="Too Many Requests", retry_after=1)
+        return "sent"
+
+    start = time.monotonic()
+    assert run(Uploader(4, 3).send(1, request)) == "sent"
+    assert len(calls) == 2
+    assert time.monotonic() - start >= 1
@@ -0,0 +1,74 @@
+import asyncio
+import stat
+
+from app.config import config
+from app.services import ytdlp_wrapper
+from app.services.base import SIZE_LIMIT_ERROR, is_content_error
+from app.services.resilience import resilience
+from app.services.ytdlp_wrapper import DOWNLOAD_TIMEOUT, MIN_DOWNLOAD_RATE, download_timeout, run_ytdlp, select_format
+
+MB = 1024 * 1024
+BACKEND = "test_ytdlp_timeouts"
+
+DJ_SET = {
+    "duration": 4 * 3600,
+    "formats": [
+        {"format_id": "128", "acodec": "mp3", "vcodec": "none", "filesize": 100 * MB},
+        {"format_id": "wav", "acodec": "pcm", "vcodec": "none", "filesize": 2400 * MB},
+    ],
+}
+
+
+def _seed_fast_backend() -> None:
+    """Recent history of short clips: the adaptive timeout for BACKEND sits at its floor."""
+    for _ in range(50):
+        resilience.record(BACKEND, 0.05)
+
+
+def test_large_source_gets_more_than_the_fixed_timeout():
+    _seed_fast_backend()
+    timeout = download_timeout(DJ_SET, "wav", extract_audio=True)
+    assert timeout >= 2400 * MB / MIN_DOWNLOAD_RATE + 4 * 3600 / ytdlp_wrapper.TRANSCODE_SPEED
+    # The chosen format decides, not the largest one
+    assert download_timeout(DJ_SET, "128", extract_audio=False) == DOWNLOAD_TIMEOUT
+
+
+def test_unknown_size_gets_the_fixed_timeout():
+    _seed_fast_backend()
+    assert download_timeout(None, None, extract_audio=True) == DOWNLOAD_TIMEOUT
+    assert download_timeout({"formats": [{"format_id": "a"}]}, "a", extract_audio=False) == DOWNLOAD_TIMEOUT
+
+
+def test_run_ytdlp_sizes_the_total_from_the_probe_and_adapts_only_the_stall_timeout(monkeypatch, tmp_path):
+    """A fake yt-dlp that takes 1s: killed under the fixed budget, left alone for a big source."""
+    args_file = tmp_path / "args"
+    script = tmp_path / "yt-dlp"
+    script.write_text(f'#!/bin/sh\necho "$@" > {args_file}\nsleep 1\n')
+    script.chmod(script.stat().st_mode | stat.S_IXUSR)
+    monkeypatch.setattr(ytdlp_wrapper, "get_ytdlp_path", lambda: str(script))
+    monkeypatch.setattr(ytdlp_wrapper, "DOWNLOAD_TIMEOUT", 0.3)
+    _seed_fast_backend()
+
+    small = {"formats": [{"format_id": "a", "acodec": "mp3", "vcodec": "none", "filesize": MB // 10}]}
+    big = {"formats": [{"format_id": "a", "acodec": "mp3", "vcodec": "none", "filesize": 40 * MB}]}
+
+    async def download(info: dict) -> str:
+        out = tmp_path / str(info["formats"][0]["filesize"])
+        out.mkdir()
+        _, _, error = await run_ytdlp(
+            "https://example.com/set", output_dir=out, info=info, backend=BACKEND, max_size=100 * MB
+        )
+        return error
+
+    assert asyncio.run(download(small)).startswith("Download timed out")
+    # 40 MB at MIN_DOWNLOAD_RATE is 40s: the 1s run completes (and finds no file, being fake)
+    assert asyncio.run(download(big)) == "Downloaded file not found"
+    assert "--socket-timeout 10" in args_file.read_text()
+
+
+def test_oversized_source_names_the_source_limit():
+    _, error = select_format(DJ_SET, 80 * MB, audio_only=True)
+    assert error == "Source exceeds 80 MB limit"
+    assert is_content_error(error)
+    # At the upload limit itself the usual message stays
+    assert select_format(DJ_SET, config.MAX_FILE_SIZE, audio_only=True)[1] == SIZE_LIMIT_ERROR